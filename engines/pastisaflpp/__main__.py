@@ -39,8 +39,9 @@ def cli():
 @click.option('-h', '--host', type=str, default='localhost', help='Host to connect to')
 @click.option('-p', '--port', type=int, default=5555, help='Port to connect to')
 @click.option('-tf', '--telemetry-frequency', type=int, default=30, help='Frequency at which send telemetry (in sec)')
-def online(host: str, port: int, telemetry_frequency: int):
-    agent = ClientAgent()
+@click.option('--pull-seeds', type=bool, is_flag=True, default=False, help='Receive seed digests and only pull unknown seeds')
+def online(host: str, port: int, telemetry_frequency: int, pull_seeds: bool):
+    agent = ClientAgent(seed_announce=pull_seeds)
 
     try:
         aflpp = AFLPPDriver(agent, telemetry_frequency=telemetry_frequency)
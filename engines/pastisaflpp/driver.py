@@ -111,8 +111,9 @@ class AFLPPDriver:
     def started(self):
         return self._started
 
-    def add_seed(self, seed: bytes):
-        seed_path = self.workspace.dynamic_input_dir / f"seed-{hashlib.md5(seed).hexdigest()}"
+    def add_seed(self, seed: bytes, h: str = None):
+        h = self.hash_seed(seed) if h is None else h  # digest already computed by the caller (if any)
+        seed_path = self.workspace.dynamic_input_dir / f"seed-{h}"
         seed_path.write_bytes(seed)
 
     def init_agent(self, remote: str = "localhost", port: int = 5555):
@@ -247,7 +248,7 @@ class AFLPPDriver:
 
         # Retrieve package out of the binary received
         try:
-            package = BinaryPackage.from_binary(fname, binary, self.workspace.target_dir)
+            package = self._agent.package_cache.extract(fname, binary, self.workspace.target_dir, self._agent.package_digest)
         except FileNotFoundError:
             logging.error("Invalid package received")
             return
@@ -267,7 +268,7 @@ class AFLPPDriver:
         h = self.hash_seed(seed)
         logging.info(f"[SEED] received  {h} ({typ.name})")
         self._seed_recvs.add(h)
-        self.add_seed(seed)
+        self.add_seed(seed, h)
 
     def __stop_received(self):
         logging.info(f"[STOP]")
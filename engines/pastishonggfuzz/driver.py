@@ -112,8 +112,9 @@ class HonggfuzzDriver:
     def started(self):
         return self._started
 
-    def add_seed(self, seed: bytes):
-        seed_path = self.workspace.dynamic_input_dir / f"seed-{hashlib.md5(seed).hexdigest()}"
+    def add_seed(self, seed: bytes, h: str = None):
+        h = self.hash_seed(seed) if h is None else h  # digest already computed by the caller (if any)
+        seed_path = self.workspace.dynamic_input_dir / f"seed-{h}"
         seed_path.write_bytes(seed)
 
     def init_agent(self, remote: str = "localhost", port: int = 5555):
@@ -245,7 +246,7 @@ class HonggfuzzDriver:
 
         # Retrieve package out of the binary received
         try:
-            package = BinaryPackage.from_binary(fname, binary, self.workspace.target_dir)
+            package = self._agent.package_cache.extract(fname, binary, self.workspace.target_dir, self._agent.package_digest)
         except FileNotFoundError:
             logging.error("Invalid package received")
             return
@@ -267,8 +268,9 @@ class HonggfuzzDriver:
         if len(seed) > 1024*8: # HF_INPUT_DEFAULT_SIZE
             logging.debug(f"crop seed {h} received to fit 8Kb")
             seed = seed[:1024*8]
+            h = None  # the digest of the cropped seed differs
 
-        self.add_seed(seed)
+        self.add_seed(seed, h)
 
     def __stop_received(self):
         logging.info(f"[STOP]")
@@ -58,7 +58,8 @@ def cli():
 @click.option('-p', '--port', type=int, default=5555, help='Port to connect to')
 @click.option('--debug', type=bool,  is_flag=True, show_default=True, default=False, help='Enable debug logs')
 @click.option('--probe', type=str, help="Probe to load as a python module (should contain a ProbeInterface)", multiple=True)
-def online(host: str, port: int, debug: bool, probe: Tuple[str]):
+@click.option('--pull-seeds', type=bool, is_flag=True, default=False, help='Receive seed digests and only pull unknown seeds')
+def online(host: str, port: int, debug: bool, probe: Tuple[str], pull_seeds: bool):
     """
     This is the online mode of the pastis-tritondse exploration. With this mode,
     the client (pastis-tritondse) will try to connect to the broker. Then, the broker
@@ -68,12 +69,13 @@ def online(host: str, port: int, debug: bool, probe: Tuple[str]):
     :param port: The remote host's port to connect
     :param debug: Configure debugging logs
     :param probe: Probes to enable (Python modules imported with importlib)
+    :param pull_seeds: Receive seed digests and only pull unknown seeds
     """
 
     configure_logs(logging.DEBUG if debug else logging.INFO)
 
     # Create the network agent and connect to the broker
-    agent = ClientAgent()
+    agent = ClientAgent(seed_window=TritonDSEDriver.SEED_WINDOW, auto_credit=False, seed_announce=pull_seeds)
 
     # Instanciate the pastis that will register the appropriate callbacks
     pastis = TritonDSEDriver(agent)
@@ -20,7 +20,7 @@ from tritondse            import Config, Program, CleLoader, CoverageStrategy, S
                                  Workspace, Seed, CompositeData, SeedFormat, QuokkaProgram
 from tritondse.sanitizers import FormatStringSanitizer, NullDerefSanitizer, UAFSanitizer, IntegerOverflowSanitizer, mk_new_crashing_seed
 from tritondse.types      import Addr, Edge, SymExType, Architecture, Platform
-from libpastis import ClientAgent, BinaryPackage, SASTReport
+from libpastis import ClientAgent, BinaryPackage, SASTReport, ReplayCache
 from libpastis.types      import SeedType, FuzzingEngineInfo, ExecMode, CoverageMode, SeedInjectLoc, CheckMode, LogLevel, AlertData, FuzzMode
 from tritondse.trace      import QBDITrace, TraceException
 from tritondse.seed_scheduler import FreshSeedPrioritizerWorklist, WorklistAddressToSet
@@ -46,6 +46,8 @@ class TritonDSEDriver(object):
     TMP_SEED = "seed.seed"
     TMP_TRACE = "result.trace"
 
+    SEED_WINDOW = 16  # seeds the broker can send ahead (each one may take a full replay to process)
+
     def __init__(self, agent: ClientAgent):
         self.agent = agent
         self._init_callbacks()  # register callbacks on the given agent
@@ -64,6 +66,14 @@ class TritonDSEDriver(object):
         self._seedloc = None
         self._program_slice = None
         self._tracing_enabled = False
+        self._target_digest = None
+
+        # Traces of seeds already replayed (shared by the user's agents on the host, kept across restarts)
+        try:
+            self.replay_cache = ReplayCache()
+        except OSError as e:
+            logging.warning(f"replay cache disabled: {e}")
+            self.replay_cache = None
 
         # local attributes for telemetry
         self.nb_to, self.nb_crash = 0, 0
@@ -127,6 +137,7 @@ class TritonDSEDriver(object):
         self._cur_cov_count = 0
         self._last_cov_update = time.time()
         self._tracing_enabled = False
+        self._target_digest = None
         self._sending_count = 0
         self.seeds_merged = 0
         self.seeds_rejected = 0
@@ -245,6 +256,7 @@ class TritonDSEDriver(object):
         while not self._seed_queue.empty() and not self._stop:
             seed, typ = self._seed_queue.get()
             self._process_seed_received(typ, seed)
+            self.agent.grant_seed_credits()
 
     def cb_telemetry(self, dse: SymbolicExplorator):
         """
@@ -368,7 +380,7 @@ class TritonDSEDriver(object):
         workspace.initialize(flush=False)
 
         try:
-            pkg = BinaryPackage.from_binary(fname, binary, workspace.get_binary_directory())
+            pkg = self.agent.package_cache.extract(fname, binary, workspace.get_binary_directory(), self.agent.package_digest)
         except FileNotFoundError:
             logging.error("Invalid package data")
             return
@@ -394,6 +406,8 @@ class TritonDSEDriver(object):
         # Enable local tracing if the binary is compatible with local architecture
         self._tracing_enabled = self.is_compatible_with_local(self.program)
         logging.info(f"Local arch and program arch matching: {self._tracing_enabled}")
+        if self._tracing_enabled:
+            self._target_digest = ReplayCache.target_digest(self.program.path)
 
         # Update the coverage strategy in the current config (it overrides the config file one)
         try:
@@ -505,6 +519,7 @@ class TritonDSEDriver(object):
 
         if seed in self._seed_received:
             logging.warning(f"receiving seed already known: {to_h(seed)} (dropped)")
+            self.agent.grant_seed_credits()
             return
         else:
             self._seed_queue.put((seed, typ))
@@ -527,7 +542,8 @@ class TritonDSEDriver(object):
             else:  # Try running the seed to know whether to keep it
                 # NOTE: re-run the seed regardless of its status
                 coverage = None
-                logging.info(f"process seed received {to_h(seed)} (pool: {self._seed_queue.qsize()})")
+                h = to_h(seed)  # hashed once for all the logs below
+                logging.info(f"process seed received {h} (pool: {self._seed_queue.qsize()})")
 
                 data = seed.content.files[self.INPUT_FILE_NAME] if seed.is_composite() else seed.bytes()
                 self.replay_seed_file.write_bytes(data)
@@ -547,9 +563,14 @@ class TritonDSEDriver(object):
                         return
 
                 t0 = time.time()
+                key = ReplayCache.key(self._target_digest, self.config.program_argv, self._seedloc, md5(data).hexdigest(),
+                                      f"qbdi-trace:{self.config.coverage_strategy.name}")
                 try:
+                    if self.replay_cache is not None and (trace := self.replay_cache.get(key)) is not None:  # seed already replayed
+                        self.replay_trace_file.write_bytes(trace)
+                        coverage = QBDITrace.from_file(str(self.replay_trace_file)).coverage
                     # Run the seed and determine whether it improves our current coverage.
-                    if QBDITrace.run(self.config.coverage_strategy,
+                    elif QBDITrace.run(self.config.coverage_strategy,
                                           str(self.program.path.resolve()),
                                           argv[1:] if len(argv) > 1 else [],
                                           output_path=str(self.replay_trace_file),
@@ -557,6 +578,8 @@ class TritonDSEDriver(object):
                                           cwd=Path(self.program.path).parent,
                                           timeout=60):
                         coverage = QBDITrace.from_file(str(self.replay_trace_file)).coverage
+                        if self.replay_cache is not None:
+                            self.replay_cache.put(key, self.replay_trace_file.read_bytes())
                     else:
                         logging.warning("Cannot load the coverage file generated (maybe had crashed?)")
                         coverage = None
@@ -565,11 +588,11 @@ class TritonDSEDriver(object):
                 except TraceException:
                     logging.warning('There was an error while trying to re-run the seed')
                 replay_time = time.time() - t0
-                logging.info(f'replay time for seed {to_h(seed)}: {int(replay_time)}s')
+                logging.info(f'replay time for seed {h}: {int(replay_time)}s')
                 self._replay_acc += replay_time  # Save time spent replaying inputs
 
                 if not coverage:
-                    logging.warning(f"coverage not found after replaying: {to_h(seed)} [{typ.name}] (add it anyway)")
+                    logging.warning(f"coverage not found after replaying: {h} [{typ.name}] (add it anyway)")
                     # Add the seed anyway, if it was not possible to re-run the seed.
                     # TODO Set seed.coverage_objectives as "empty" (use ellipsis
                     # object). Modify WorklistAddressToSet to support it.
@@ -578,7 +601,7 @@ class TritonDSEDriver(object):
                 else:
                     # Check whether the seed improves the current coverage.
                     if self.dse.coverage.improve_coverage(coverage):
-                        logging.info(f"seed added {to_h(seed)} [{typ.name}] (coverage merged)")
+                        logging.info(f"seed added {h} [{typ.name}] (coverage merged)")
                         self.seeds_merged += 1
                         self.dse.coverage.merge(coverage)
                         self.dse.seeds_manager.worklist.update_worklist(coverage)
@@ -586,7 +609,7 @@ class TritonDSEDriver(object):
                         seed.coverage_objectives = self.dse.coverage.new_items_to_cover(coverage)
                         self.dse.add_input_seed(seed)
                     else:
-                        logging.info(f"seed archived {to_h(seed)} [{typ.name}] (NOT merging coverage)")
+                        logging.info(f"seed archived {h} [{typ.name}] (NOT merging coverage)")
                         self.seeds_rejected += 1
                         #self.dse.seeds_manager.archive_seed(seed)
                         # logging.info(f"seed archived {seed.hash} [{typ.name}]")
@@ -624,7 +647,8 @@ class TritonDSEDriver(object):
             "replay_time": self._replay_acc,
             "seed_accepted": self.seeds_merged,
             "seed_rejected": self.seeds_rejected,
-            "seed_received": self.seeds_merged + self.seeds_rejected
+            "seed_received": self.seeds_merged + self.seeds_rejected,
+            "replay_cache": self.replay_cache.stats if self.replay_cache is not None else None
         }
         stat_file.write_text(json.dumps(data))
 
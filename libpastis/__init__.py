@@ -1,6 +1,7 @@
 from .agent import FileAgent, BrokerAgent, ClientAgent
 from .enginedesc import EngineConfiguration, FuzzingEngineDescriptor
-from .package import BinaryPackage
+from .package import BinaryPackage, PackageCache
+from .replay_cache import ReplayCache
 from .sast import SASTAlert, SASTReport
 
 __version__ = "1.0.0"
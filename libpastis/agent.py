@@ -1,6 +1,10 @@
 # built-ins
 import time
-from typing import Callable, Tuple, List, Union
+import heapq
+import itertools
+from hashlib import md5
+from collections import deque, OrderedDict
+from typing import Callable, Dict, Tuple, List, Union, Optional
 from enum import Enum
 import logging
 import threading
@@ -9,16 +13,23 @@ import socket
 
 # third-party libs
 import zmq
+from zmq.utils.monitor import recv_monitor_message
 import psutil
 
 # local imports
 from libpastis.proto import InputSeedMsg, StartMsg, StopMsg, HelloMsg, LogMsg, \
-                            TelemetryMsg, StopCoverageCriteria, DataMsg, EnvelopeMsg
+                            TelemetryMsg, StopCoverageCriteria, DataMsg, EnvelopeMsg, InputSeedBatchMsg, \
+                            PackageRequestMsg, SeedCreditMsg, SeedAnnounceMsg, SeedPullMsg, HeartbeatMsg
 from libpastis.types import SeedType, Arch, FuzzingEngineInfo, PathLike, ExecMode, CheckMode, CoverageMode, SeedInjectLoc, \
-                            LogLevel, State, AlertData, Platform, FuzzMode
+                            LogLevel, State, AlertData, Platform, FuzzMode, Compression
 from libpastis.utils import get_local_architecture, get_local_platform
+from libpastis.compression import available_compressions, negotiate_compression, compress, decompress
+from libpastis.package import PackageCache
+from libpastis.dispatch import Dispatcher, DispatchPolicy
+from libpastis.backlog import SeedBacklog
 
-Message = Union[InputSeedMsg, StartMsg, StopMsg, HelloMsg, LogMsg, TelemetryMsg, StopCoverageCriteria, DataMsg]
+Message = Union[InputSeedMsg, StartMsg, StopMsg, HelloMsg, LogMsg, TelemetryMsg, StopCoverageCriteria, DataMsg,
+                InputSeedBatchMsg, PackageRequestMsg, SeedCreditMsg, SeedAnnounceMsg, SeedPullMsg, HeartbeatMsg]
 
 
 class MessageType(Enum):  # Topics in the ZMQ terminology
@@ -34,6 +45,12 @@ class MessageType(Enum):  # Topics in the ZMQ terminology
     STOP_COVERAGE_DONE = 'stop_crit_msg'
     STOP = "stop_msg"
     DATA = "data_msg"
+    INPUT_SEED_BATCH = "input_batch_msg"
+    PACKAGE_REQUEST = "package_req_msg"
+    SEED_CREDIT = "seed_credit_msg"
+    SEED_ANNOUNCE = "seed_announce_msg"
+    SEED_PULL = "seed_pull_msg"
+    HEARTBEAT = "heartbeat_msg"
 
 
 class AgentMode(Enum):
@@ -48,8 +65,54 @@ class AgentMode(Enum):
 class NetworkAgent(object):
     """
     Base class for network-based PASTIS agents (both clients and servers)
+
+    Seeds can be coalesced in :py:obj:`InputSeedBatchMsg` to reduce the number of
+    frames sent on the wire. A batch is flushed when it reaches ``seed_batch_size``
+    seeds or when its oldest seed waited more than ``seed_batch_latency`` seconds.
+    A batch size of 1 (default) disables batching.
+
+    Payloads (START binaries and seeds) are compressed with the codec negotiated
+    with the peer through the HELLO (codecs supported) and START (codec selected)
+    messages, and transparently decompressed before the callbacks are called.
+
+    The receiving loop is driven by a :py:obj:`zmq.Poller` watching both the network
+    socket and an internal wake-up socket pair. The later is used to wake the loop up
+    (stop, new timer, outgoing message) so that it never spins while idle. As ZMQ
+    sockets are not thread-safe, messages sent from other threads while the loop
+    is running are pushed in a queue (without taking any lock) and sent by the loop
+    thread. The depth of this queue is available with :py:attr:`send_queue_depth`
+    and :py:attr:`send_queue_peak`. If the peer cannot keep up
+    (high water mark reached), messages are kept in this queue instead of being
+    silently dropped, and sending is retried shortly after. Timers registered with
+    :py:meth:`call_later` are also run by the loop thread.
+
+    By default callbacks are run by the receiving thread. With ``dispatch_workers``
+    they are run by a :py:class:`Dispatcher` instead, so that a slow callback does
+    not stall the reception of other peers messages. Messages of a given peer are
+    still handled in order. With the ``DROP`` policy, telemetry and log messages
+    are dropped when the queue of the worker is full.
+
+    :param seed_batch_size: maximum number of seeds in a batch
+    :param seed_batch_latency: maximum time (in seconds) a seed can wait in a batch
+    :param dispatch_workers: number of threads running callbacks (0 to run them in the receiving thread)
+    :param dispatch_queue_size: maximum number of pending messages per dispatch worker
+    :param dispatch_policy: policy to apply when the queue of a dispatch worker is full
     """
-    def __init__(self):
+
+    DROPPABLE_TYPES = {MessageType.TELEMETRY, MessageType.LOG}
+    #: message types that can be dropped with the ``DROP`` dispatch policy
+
+    ZERO_COPY_RECV = True
+    #: receive frames without copying them in Python bytes (envelopes are parsed from the ZMQ buffer)
+
+    SEND_RETRY_DELAY = 1
+    #: delay (in ms) before retrying to send messages when the socket is full
+
+    COMPRESSION_LEVELS = {MessageType.START: 10, MessageType.INPUT_SEED: 3}
+    #: compression level used for each message type carrying a payload
+
+    def __init__(self, seed_batch_size: int = 1, seed_batch_latency: float = 0.05, dispatch_workers: int = 0,
+                 dispatch_queue_size: int = 1000, dispatch_policy: DispatchPolicy = DispatchPolicy.BLOCK):
         self.mode = None
         self.ctx = zmq.Context()
         self.socket = None
@@ -57,6 +120,124 @@ class NetworkAgent(object):
         self._th = None
         self._cbs = {x: [] for x in MessageType}
 
+        # Wake-up sockets (to wake up the receiving loop), send queue and timers
+        self._wake_recv = None  # created in bind() / connect()
+        self._wake_send = None
+        self._wake_pending = False  # a wake-up is already on its way (coalesce them)
+        self._monitor = None  # socket receiving the connection events (if monitored)
+        self._timers = []  # heap of (deadline, seq, callback)
+        self._timer_seq = itertools.count()
+        self._timer_lock = threading.Lock()
+        self._loop_thread = None  # thread running the receiving loop
+        self._outbox = deque()  # frames to send by the loop thread
+        self._outbox_peak = 0
+
+        # Seed batching
+        self._batch_size = max(1, seed_batch_size)
+        self._batch_latency = seed_batch_latency
+        self._batches = {}  # dest id -> (deadline, List[InputSeedMsg])  (dest is None as client)
+        self._batch_lock = threading.Lock()
+
+        # Payload compression
+        self._codecs = {}  # peer id -> Compression negotiated (peer is None as client)
+
+        # Package caching
+        self._package_peers = set()  # ids of clients keeping a package cache
+
+        # Liveness
+        self._last_seen = {}  # peer id -> time of its last message (only peers sending heartbeats)
+
+        # Callbacks dispatch
+        self._dispatch_args = (dispatch_workers, dispatch_queue_size, dispatch_policy)
+        self._dispatcher = None  # created in start()
+
+    @property
+    def is_batching(self) -> bool:
+        """
+        Whether seeds are coalesced in batches before being sent.
+        """
+        return self._batch_size > 1
+
+    @property
+    def dispatch_queue_depth(self) -> int:
+        """
+        Number of messages waiting to be handled by the dispatch workers.
+        """
+        return self._dispatcher.depth if self._dispatcher else 0
+
+    @property
+    def dispatch_dropped(self) -> int:
+        """
+        Number of messages dropped because dispatch workers were overloaded.
+        """
+        return self._dispatcher.dropped if self._dispatcher else 0
+
+    @property
+    def send_queue_depth(self) -> int:
+        """
+        Number of messages waiting in the send queue to be sent by the loop thread.
+        """
+        return len(self._outbox)
+
+    @property
+    def send_queue_peak(self) -> int:
+        """
+        Highest depth of the send queue observed by the loop thread.
+        """
+        return self._outbox_peak
+
+    def _setup_wakeup_socket(self) -> None:
+        # A plain socket pair is used because writing on it is thread-safe (unlike ZMQ sockets)
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+
+    def _wakeup(self) -> None:
+        """
+        Wake up the receiving loop. Can be called from any thread, it
+        never blocks nor takes a lock. Wake-ups are coalesced until the
+        loop handles them.
+        """
+        if self._wake_send is None or self._wake_pending:  # loop not running yet, or already notified
+            return
+        self._wake_pending = True
+        try:
+            self._wake_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # the loop already has pending wake-ups (or is closed)
+
+    def call_later(self, delay: float, callback: Callable) -> None:
+        """
+        Schedule a callback to be run by the receiving loop thread
+        after ``delay`` seconds. Can be called from any thread.
+
+        :param delay: delay in seconds
+        :param callback: function taking no parameter
+        """
+        with self._timer_lock:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_seq), callback))
+        self._wakeup()
+
+    def _run_timers(self) -> Optional[int]:
+        """
+        Run all the expired timers.
+
+        :return: milliseconds until the next timer (None if no timer)
+        """
+        while True:
+            with self._timer_lock:
+                if not self._timers:
+                    return None
+                deadline, _, cb = self._timers[0]
+                now = time.monotonic()
+                if deadline > now:
+                    return max(1, int((deadline - now) * 1000))
+                heapq.heappop(self._timers)
+            try:
+                cb()
+            except Exception as e:
+                logging.error(f"timer callback {cb} failed: {e}")
+
     def register_callback(self, typ: MessageType, callback: Callable) -> None:
         """
         Register a callback function on a given message type.
@@ -76,8 +257,9 @@ class NetworkAgent(object):
         :return: None
         """
         self.socket = self.ctx.socket(zmq.ROUTER)
-        self.socket.RCVTIMEO = 500  # 500 milliseconds
+        self.socket.setsockopt(zmq.ROUTER_MANDATORY, 1)  # report full or unknown peers instead of dropping
         self.socket.bind(f"tcp://{ip}:{port}")
+        self._setup_wakeup_socket()
         self.mode = AgentMode.BROKER
 
     def connect(self, remote: str = "localhost", port: int = 5555) -> bool:
@@ -89,8 +271,8 @@ class NetworkAgent(object):
         :return: Always true
         """
         self.socket = self.ctx.socket(zmq.DEALER)
-        self.socket.RCVTIMEO = 500  # 500 milliseconds
         self.socket.connect(f"tcp://{remote}:{port}")
+        self._setup_wakeup_socket()
         self.mode = AgentMode.CLIENT
         return True
 
@@ -98,6 +280,7 @@ class NetworkAgent(object):
         """
         Start the listening thread.
         """
+        self._start_dispatcher()
         self._th = threading.Thread(name="[LIBPASTIS]", target=self._recv_loop, daemon=True)
         self._th.start()
 
@@ -105,34 +288,147 @@ class NetworkAgent(object):
         """
         Run receiving loop in a blocking manner.
         """
+        self._start_dispatcher()
         self._recv_loop()
 
+    def _start_dispatcher(self) -> None:
+        workers, queue_size, policy = self._dispatch_args
+        if workers > 0 and self._dispatcher is None:
+            self._dispatcher = Dispatcher(workers, queue_size, policy)
+
     def stop(self) -> None:
         """
-        Stop the listening thread.
+        Stop the listening thread. The loop is woken up, thus the
+        function returns as soon as the current callback (if any) returns.
         """
+        self.flush_seeds()
         self._stop = True
-        if self._th:
+        if self._dispatcher:
+            self._dispatcher.close()  # unblock the loop if waiting for a worker
+        self._wake_pending = False  # make sure the stop wakes the loop up
+        self._wakeup()
+        if self._th and self._th is not threading.current_thread():  # can't join from a callback
             self._th.join()
+        if self._dispatcher:
+            self._dispatcher.join()  # let workers handle messages already received
+            self._dispatcher = None
 
     def _recv_loop(self):
-        #flags = 0 if blocking else zmq.DONTWAIT
-        while 1:
-            if self._stop:
-                return
-            try:
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        poller.register(self._wake_recv, zmq.POLLIN)
+        if self._monitor is not None:
+            poller.register(self._monitor, zmq.POLLIN)
+        self._loop_thread = threading.current_thread()
+        try:
+            timeout = self._run_timers()
+            while not self._stop:
+                events = dict(poller.poll(timeout))  # block until a message, a wake-up or the next timer
+
+                if self._wake_recv.fileno() in events:  # plain sockets are reported by fd
+                    self._drain_wakeup()
+
+                if self._monitor is not None and self._monitor in events:
+                    self._drain_monitor()  # before the outbox, to send first what reconnections require
+
+                blocked = not self._drain_outbox()
+
+                if self.socket in events:
+                    self._drain_socket()
+
+                timeout = self._run_timers()
+                if blocked:  # socket full, retry shortly
+                    timeout = self.SEND_RETRY_DELAY if timeout is None else min(timeout, self.SEND_RETRY_DELAY)
+        finally:
+            self._loop_thread = None
+            self._drain_outbox()  # do not lose messages queued while stopping
+
+    def _send_frames(self, frames: List[bytes]) -> None:
+        """
+        Send frames on the socket. If the receiving loop runs in another
+        thread, frames are queued and sent by the loop thread.
+
+        :param frames: frames of the message
+        """
+        loop_th = self._loop_thread
+        if loop_th is None:
+            self._socket_send(frames)
+        elif loop_th is threading.current_thread():
+            self._outbox.append(frames)  # keep ordering with messages already queued
+            self._drain_outbox()
+        else:
+            self._outbox.append(frames)
+            self._wakeup()
+
+    def _socket_send(self, frames: List[bytes], flags: int = 0) -> bool:
+        try:
+            self.socket.send_multipart(frames, flags)
+        except zmq.Again:
+            return False
+        except zmq.ZMQError as e:
+            if e.errno != zmq.EHOSTUNREACH:
+                raise
+            logging.warning(f"peer {frames[0]} unreachable, drop message")
+        return True
+
+    def _drain_outbox(self) -> bool:
+        """
+        Send queued messages until the queue is empty or the socket is full.
+        Only called by the loop thread.
+
+        :return: True if the queue has been emptied
+        """
+        self._outbox_peak = max(self._outbox_peak, len(self._outbox))
+        while self._outbox:
+            if not self._socket_send(self._outbox[0], zmq.NOBLOCK):
+                return False
+            self._outbox.popleft()
+        return True
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        # Reset once the pair is empty (a wake-up sent while reading would be swallowed otherwise). The
+        # outbox is drained right after, so messages queued by wake-ups coalesced meanwhile are not missed.
+        self._wake_pending = False
+
+    def _drain_monitor(self) -> None:
+        try:
+            while True:
+                event = recv_monitor_message(self._monitor, zmq.NOBLOCK)
+                self._connection_event(event["event"])
+        except zmq.error.Again:
+            pass
+
+    def _connection_event(self, event: int) -> None:
+        """
+        Called by the loop thread on the events of a monitored socket.
+
+        :param event: ZMQ socket event (e.g: ``zmq.EVENT_CONNECTED``)
+        """
+        pass
+
+    def _drain_socket(self) -> None:
+        try:
+            while not self._stop:
                 if self.mode == AgentMode.BROKER:
-                    result = self.socket.recv_multipart()
+                    result = self.socket.recv_multipart(zmq.NOBLOCK, copy=not self.ZERO_COPY_RECV)
                     try:
                         uid, data = result  # try unpacking the result
-                        self.__broker_transfer_to_callback(uid, data)
                     except ValueError:  # means we can't unpack uid, data
-                        logging.error(f"cannot unpack the message: {result}")
+                        logging.error(f"cannot unpack the message: {[bytes(x) for x in result]}")
+                        continue
+                    if self.ZERO_COPY_RECV:
+                        uid, data = uid.bytes, data.buffer  # id is small (and used as dict key)
+                    self.__broker_transfer_to_callback(uid, data)
                 else:
-                    data = self.socket.recv()
-                    self.__client_transfer_to_callback(data)
-            except zmq.error.Again:
-                pass
+                    data = self.socket.recv(zmq.NOBLOCK, copy=not self.ZERO_COPY_RECV)
+                    self.__client_transfer_to_callback(data.buffer if self.ZERO_COPY_RECV else data)
+        except zmq.error.Again:
+            pass
 
     def send_to(self, id: bytes, msg: Message, msg_type: MessageType = None) -> None:
         """
@@ -150,7 +446,7 @@ class NetworkAgent(object):
             msg_type = self.msg_to_type(msg)
         final_msg = EnvelopeMsg()
         getattr(final_msg, msg_type.value).MergeFrom(msg)
-        self.socket.send_multipart([id, final_msg.SerializeToString()])
+        self._send_frames([id, final_msg.SerializeToString()])
 
     def send(self, msg: Message, msg_type: MessageType = None) -> None:
         """
@@ -167,7 +463,63 @@ class NetworkAgent(object):
             msg_type = self.msg_to_type(msg)
         final_msg = EnvelopeMsg()
         getattr(final_msg, msg_type.value).CopyFrom(msg)
-        self.socket.send(final_msg.SerializeToString())
+        self._send_frames([final_msg.SerializeToString()])
+
+    def _compress(self, id: Optional[bytes], data: bytes, msg_type: MessageType) -> Tuple[bytes, Compression]:
+        """
+        Compress a payload for the peer ``id`` with the codec negotiated with it.
+
+        :param id: raw id of the client (None when running as a client)
+        :param data: payload to compress
+        :param msg_type: type of the message (to select the compression level)
+        :return: payload and the codec effectively applied
+        """
+        return compress(data, self._codecs.get(id, Compression.RAW), self.COMPRESSION_LEVELS[msg_type])
+
+    def _push_seed(self, id: Optional[bytes], msg: InputSeedMsg) -> None:
+        """
+        Send the seed right away or append it to the pending batch of ``id``
+        and flush that batch when full.
+
+        :param id: raw id of the client (None when running as a client)
+        :param msg: seed message to send
+        """
+        if not self.is_batching:
+            self._send_seed_msgs(id, [msg])
+            return
+        with self._batch_lock:
+            new_batch = id not in self._batches
+            _, seeds = self._batches.setdefault(id, (time.monotonic() + self._batch_latency, []))
+            seeds.append(msg)
+            if len(seeds) < self._batch_size:
+                if new_batch:  # make sure the batch will be sent in time
+                    self.call_later(self._batch_latency, lambda: self.flush_seeds(expired_only=True))
+                return
+            self._batches.pop(id)
+        self._send_seed_msgs(id, seeds)
+
+    def flush_seeds(self, expired_only: bool = False) -> None:
+        """
+        Send all the pending seed batches.
+
+        :param expired_only: only flush batches which reached their latency deadline
+        """
+        now = time.monotonic()
+        with self._batch_lock:
+            ids = [k for k, (dl, _) in self._batches.items() if not expired_only or dl <= now]
+            to_send = [(k, self._batches.pop(k)[1]) for k in ids]
+        for id, seeds in to_send:
+            self._send_seed_msgs(id, seeds)
+
+    def _send_seed_msgs(self, id: Optional[bytes], seeds: List[InputSeedMsg]) -> None:
+        if len(seeds) == 1:
+            msg, typ = seeds[0], MessageType.INPUT_SEED
+        else:
+            msg, typ = InputSeedBatchMsg(seeds=seeds), MessageType.INPUT_SEED_BATCH
+        if id is None:
+            self.send(msg, msg_type=typ)
+        else:
+            self.send_to(id, msg, msg_type=typ)
 
     @staticmethod
     def msg_to_type(msg: Message) -> MessageType:
@@ -193,10 +545,22 @@ class NetworkAgent(object):
             return MessageType.START
         elif isinstance(msg, DataMsg):
             return MessageType.DATA
+        elif isinstance(msg, InputSeedBatchMsg):
+            return MessageType.INPUT_SEED_BATCH
+        elif isinstance(msg, PackageRequestMsg):
+            return MessageType.PACKAGE_REQUEST
+        elif isinstance(msg, SeedCreditMsg):
+            return MessageType.SEED_CREDIT
+        elif isinstance(msg, SeedAnnounceMsg):
+            return MessageType.SEED_ANNOUNCE
+        elif isinstance(msg, SeedPullMsg):
+            return MessageType.SEED_PULL
+        elif isinstance(msg, HeartbeatMsg):
+            return MessageType.HEARTBEAT
         else:
             logging.error(f"invalid message type: {type(msg)} (cannot find associated topic)")
 
-    def __broker_transfer_to_callback(self, id: bytes, message: bytes):
+    def __broker_transfer_to_callback(self, id: bytes, message: Union[bytes, memoryview]):
         try:
             msg = EnvelopeMsg()
             msg.ParseFromString(message)
@@ -204,33 +568,83 @@ class NetworkAgent(object):
             logging.error(f"can't parse message from {id} (len:{len(message)})")
             return
         if msg.WhichOneof('msg') is None:
-            logging.error(f"Failed at parsing incoming message from {repr(id)}: {repr(message)}")
+            logging.error(f"Failed at parsing incoming message from {repr(id)}: {repr(bytes(message))}")
             return
+        if id in self._last_seen:  # any message proves the peer is alive
+            self._last_seen[id] = time.monotonic()
         message, topic = self._unpack_message(msg)
         if topic in [MessageType.START]:
             logging.error(f"Invalid message of type {topic.name} received")
-        if not self._cbs[topic]:
-            logging.warning(f"[broker] message of type {topic.name} (but no callback)")
-        args = self._message_args(topic, message)
-        for cb in self._cbs[topic]:
-            cb(id, *args)
+        if topic == MessageType.HELLO:
+            self._hello_received(id, message)
+        elif topic == MessageType.PACKAGE_REQUEST:  # handled internally (no callback)
+            self._package_requested(id, message.digest)
+            return
+        elif topic == MessageType.SEED_CREDIT:  # handled internally (no callback)
+            self._seed_credits_received(id, message.credits)
+            return
+        elif topic == MessageType.SEED_PULL:  # handled internally (no callback)
+            self._seeds_pulled(id, list(message.digests))
+            return
+        elif topic == MessageType.HEARTBEAT:  # nothing more to do than updating liveness
+            return
+        for message, topic in self._iter_unbatched(message, topic):
+            if not self._cbs[topic]:
+                logging.warning(f"[broker] message of type {topic.name} (but no callback)")
+            self._dispatch(id, topic, message)
 
-    def __client_transfer_to_callback(self, message: bytes):
+    def __client_transfer_to_callback(self, message: Union[bytes, memoryview]):
         try:
             msg = EnvelopeMsg()
             msg.ParseFromString(message)
         except:
-            logging.error(f"can't parse message from broker (len:{repr(message)})")
+            logging.error(f"can't parse message from broker (len:{len(message)})")
             return
         if msg.WhichOneof('msg') is None:
-            logging.error(f"Failed at parsing incoming message from broker: {repr(message)}")
+            logging.error(f"Failed at parsing incoming message from broker: {repr(bytes(message))}")
             return
         message, topic = self._unpack_message(msg)
         if topic in [MessageType.HELLO, MessageType.TELEMETRY, MessageType.LOG, MessageType.STOP_COVERAGE_DONE]:
             logging.error(f"Invalid message of type {topic.name} received")
-        if not self._cbs[topic]:
-            logging.warning(f"[agent] message of type {topic.name} (but no callback)")
-        args = self._message_args(topic, message)
+        payload = None
+        if topic == MessageType.START:
+            codec = Compression._value2member_map_.get(message.seed_compression, Compression.RAW)
+            self._codecs[None] = codec if codec in available_compressions() else Compression.RAW
+            try:
+                payload = self._resolve_package(message)
+                if payload is None:
+                    return  # package requested to the broker, wait for the START with its content
+            except ValueError as e:
+                logging.error(f"can't decode {topic.name} payload from broker: {e}")
+                return
+        elif topic == MessageType.SEED_ANNOUNCE:  # handled internally (no callback)
+            self._seeds_announced(message)
+            return
+        for message, topic in self._iter_unbatched(message, topic):
+            if not self._cbs[topic]:
+                logging.warning(f"[agent] message of type {topic.name} (but no callback)")
+            self._dispatch(None, topic, message, payload)
+
+    def _dispatch(self, id: Optional[bytes], topic: MessageType, message: Message, payload: bytes = None) -> None:
+        if self._dispatcher is None:
+            self._run_callbacks(id, topic, message, payload)
+        else:
+            self._dispatcher.submit(id, self._run_callbacks, id, topic, message, payload,
+                                    droppable=topic in self.DROPPABLE_TYPES)
+
+    def _run_callbacks(self, id: Optional[bytes], topic: MessageType, message: Message, payload: bytes = None) -> None:
+        """
+        Decode the message and call all the callbacks registered for its
+        type (the peer id is only given to callbacks as broker). ``payload``
+        is the decoded content (binary of a START) if already decoded.
+        """
+        try:
+            args = self._message_args(topic, message, payload)
+        except ValueError as e:
+            logging.error(f"can't decode {topic.name} payload from {'broker' if id is None else id}: {e}")
+            return
+        if id is not None:
+            args = [id] + args
         for cb in self._cbs[topic]:
             cb(*args)
 
@@ -238,9 +652,39 @@ class NetworkAgent(object):
         typ = message.WhichOneof('msg')
         return getattr(message, typ), MessageType(typ)
 
-    def _message_args(self, topic: MessageType, msg: Message):
+    def _hello_received(self, id: bytes, msg: HelloMsg) -> None:
+        codecs = [Compression(x) for x in msg.compressions if x in Compression._value2member_map_]
+        self._codecs[id] = negotiate_compression(codecs)
+        if msg.package_cache:
+            self._package_peers.add(id)
+
+    def _package_requested(self, id: bytes, digest: str) -> None:
+        logging.error(f"package {digest} requested by {id} but packages are not served")
+
+    def _seed_credits_received(self, id: bytes, credits: int) -> None:
+        logging.error(f"seed credits received from {id} but flow control is not supported")
+
+    def _seeds_pulled(self, id: bytes, digests: List[bytes]) -> None:
+        logging.error(f"seeds pulled by {id} but seeds are not announced")
+
+    def _seeds_announced(self, msg: SeedAnnounceMsg) -> None:
+        logging.error(f"{len(msg.digests)} seeds announced but seed pulling is not enabled")
+
+    def _resolve_package(self, msg: StartMsg) -> Optional[bytes]:
+        return decompress(msg.binary, Compression(msg.compression))  # the binary is always included
+
+    @staticmethod
+    def _iter_unbatched(message: Message, topic: MessageType):
+        """ Unpack a seed batch as individual INPUT_SEED messages (other messages are yielded as-is) """
+        if topic == MessageType.INPUT_SEED_BATCH:
+            for seed in message.seeds:
+                yield seed, MessageType.INPUT_SEED
+        else:
+            yield message, topic
+
+    def _message_args(self, topic: MessageType, msg: Message, payload: bytes = None):
         if topic == MessageType.INPUT_SEED:
-            return [SeedType(msg.type), msg.seed]
+            return [SeedType(msg.type), decompress(msg.seed, Compression(msg.compression))]
         elif topic == MessageType.LOG:
             return [LogLevel(msg.level), msg.message]
         elif topic == MessageType.TELEMETRY:
@@ -248,9 +692,11 @@ class NetworkAgent(object):
                     msg.coverage_edge, msg.coverage_path, msg.last_cov_update]
         elif topic == MessageType.HELLO:
             engs = [(FuzzingEngineInfo.from_pb(x)) for x in msg.engines]
-            return [engs, Arch(msg.architecture), msg.cpus, msg.memory, msg.hostname, Platform(msg.platform)]
+            running = FuzzingEngineInfo.from_pb(msg.running_engine) if msg.HasField("running_engine") else None
+            return [engs, Arch(msg.architecture), msg.cpus, msg.memory, msg.hostname, Platform(msg.platform), running]
         elif topic == MessageType.START:
-            return [msg.binary_filename, msg.binary, FuzzingEngineInfo.from_pb(msg.engine), ExecMode(msg.exec_mode), FuzzMode(msg.fuzz_mode),
+            binary = decompress(msg.binary, Compression(msg.compression)) if payload is None else payload
+            return [msg.binary_filename, binary, FuzzingEngineInfo.from_pb(msg.engine), ExecMode(msg.exec_mode), FuzzMode(msg.fuzz_mode),
                     CheckMode(msg.check_mode), CoverageMode(msg.coverage_mode), SeedInjectLoc(msg.seed_location),
                     msg.engine_args, [x for x in msg.program_argv], msg.sast_report]
         elif topic == MessageType.DATA:
@@ -260,19 +706,295 @@ class NetworkAgent(object):
 
 
 class BrokerAgent(NetworkAgent):
+    """
+    Subclass of NetworkAgent to run as the broker. START messages only
+    carry the digest of the binary package for clients keeping a package
+    cache. The package is sent only if the client requests it (cache miss).
+
+    Clients advertising a seed window in their HELLO are sent at most that
+    many seeds until they grant new credits. Other seeds are held in a
+    :py:class:`SeedBacklog` (bounded to ``seed_backlog_size`` bytes for all
+    clients) and sent as credits are received.
+
+    Clients asking for seed announces in their HELLO only receive batches of
+    seed digests, and pull the seeds they lack. The last ``SEED_STORE_SIZE``
+    seeds announced can be pulled: their bodies are read back with the
+    function registered with :py:meth:`register_seed_reader` (e.g: from a
+    seed pool), or kept in memory if there is none.
+
+    Clients advertising a heartbeat interval in their HELLO are considered
+    lost when no message has been received from them for ``heartbeat_timeout``
+    seconds (or two heartbeat intervals if longer). Their state is released
+    and callbacks registered with :py:meth:`register_client_lost_callback`
+    are called (after the callbacks of messages already received from them).
+
+    :param seed_backlog_size: maximum size (in bytes) of seeds held for all clients
+    :param heartbeat_timeout: seconds without message before a client is lost (0 to never consider them lost)
+    """
+
+    ANNOUNCE_BATCH_SIZE = 256
+    #: maximum number of digests in an announce message
+
+    SEED_STORE_SIZE = 100000
+    #: number of announced seeds kept to serve pull requests
+
+    LIVENESS_CHECK_PERIOD = 1
+    #: period (in seconds) of the check for lost clients
+
+    def __init__(self, *args, seed_backlog_size: int = 64 * 1024 * 1024, heartbeat_timeout: float = 30, **kwargs):
+        super(BrokerAgent, self).__init__(*args, **kwargs)
+        self._pkg_digests = {}  # (path, mtime, size) -> digest
+        self._pkg_files = {}  # digest -> Path
+        self._pending_starts = {}  # client id -> StartMsg (without binary)
+
+        # Seeds flow control
+        self._credits = {}  # client id -> seeds it can still receive (only clients with a window)
+        self._backlog = SeedBacklog(seed_backlog_size)
+        self._flow_lock = threading.Lock()
+
+        # Seeds announces
+        self._announce_peers = set()  # ids of clients pulling seeds
+        self._announces = {}  # client id -> List[(digest, SeedType)] pending
+        self._seed_store = OrderedDict()  # digest -> (SeedType, seed or None if read back) announced
+        self._seed_reader = None  # digest -> seed (None if not available)
+
+        # Clients liveness
+        self.heartbeat_timeout = heartbeat_timeout
+        self._peer_timeouts = {}  # client id -> seconds of silence after which it is lost
+        self._liveness_checked = False  # whether the periodic check is scheduled
+        self._lost_cbs = []
+
+    @property
+    def seed_backlog_bytes(self) -> int:
+        """
+        Cumulated size of seeds held for clients without credits.
+        """
+        return self._backlog.size
+
+    @property
+    def seed_backlog_dropped(self) -> int:
+        """
+        Number of seeds dropped because the backlog was full.
+        """
+        return self._backlog.dropped
+
+    def seed_backlog_count(self, id: bytes) -> int:
+        """
+        Get the number of seeds held for a client.
+
+        :param id: raw id of the client
+        :return: number of seeds waiting for credits
+        """
+        with self._flow_lock:
+            return self._backlog.count(id)
+
+    def seed_backlog_stats(self, id: bytes) -> Dict[str, float]:
+        """
+        Get the metrics of the backlog of a client.
+
+        :param id: raw id of the client
+        :return: seeds held (count), their size (bytes), seeds held at the top
+                 priority level (top) and mean time seeds spent in it (wait, seconds)
+        """
+        with self._flow_lock:
+            return {"count": self._backlog.count(id), "bytes": self._backlog.bytes(id),
+                    "top": self._backlog.count_top(id), "wait": self._backlog.wait(id)}
+
+    def clear_seed_backlog(self, id: bytes) -> None:
+        """
+        Drop the seeds held for a client and forget its credits
+        (e.g: when the client is kicked).
+
+        :param id: raw id of the client
+        """
+        with self._flow_lock:
+            self._backlog.clear(id)
+            self._credits.pop(id, None)
+            self._announces.pop(id, None)
+            self._announce_peers.discard(id)
+
+    def forget_client(self, id: bytes) -> None:
+        """
+        Release all the state kept for a client (seeds held, credits, codec,
+        liveness...), e.g: when it is kicked or lost. Messages it may send
+        afterward are handled as coming from a client that did not say hello.
+
+        :param id: raw id of the client
+        """
+        self.clear_seed_backlog(id)
+        self._last_seen.pop(id, None)
+        self._peer_timeouts.pop(id, None)
+        self._codecs.pop(id, None)
+        self._package_peers.discard(id)
+        self._pending_starts.pop(id, None)
+        with self._batch_lock:
+            self._batches.pop(id, None)
+        if self._dispatcher:
+            self._dispatcher.forget(id)
+
+    def _check_liveness(self) -> None:
+        now = time.monotonic()
+        for id, last in list(self._last_seen.items()):
+            silence = now - last
+            if silence > self._peer_timeouts.get(id, silence):
+                self._last_seen.pop(id, None)  # report it only once
+                if self._dispatcher is None:
+                    self._client_lost(id, silence)
+                else:  # after the callbacks of messages already received
+                    self._dispatcher.submit(id, self._client_lost, id, silence)
+        if not self._stop:
+            self.call_later(self.LIVENESS_CHECK_PERIOD, self._check_liveness)
+
+    def _client_lost(self, id: bytes, silence: float) -> None:
+        with self._flow_lock:
+            freed = self._backlog.bytes(id)
+        self.forget_client(id)
+        logging.warning(f"client {id} lost: no message for {silence:.1f}s, {freed} bytes of seed backlog freed")
+        for cb in self._lost_cbs:
+            cb(id, silence)
+
+    def _hello_received(self, id: bytes, msg: HelloMsg) -> None:
+        super(BrokerAgent, self)._hello_received(id, msg)
+        with self._flow_lock:
+            self._backlog.clear(id)  # a client saying hello again starts from scratch
+            if msg.seed_window:
+                self._credits[id] = msg.seed_window
+            else:
+                self._credits.pop(id, None)
+            if msg.seed_announce:
+                self._announce_peers.add(id)
+            else:
+                self._announce_peers.discard(id)
+        if msg.heartbeat_interval and self.heartbeat_timeout:
+            self._peer_timeouts[id] = max(self.heartbeat_timeout, 2 * msg.heartbeat_interval / 1000)
+            self._last_seen[id] = time.monotonic()
+            if not self._liveness_checked:
+                self._liveness_checked = True
+                self.call_later(self.LIVENESS_CHECK_PERIOD, self._check_liveness)
+        else:
+            self._peer_timeouts.pop(id, None)
+            self._last_seen.pop(id, None)
+
+    def _seed_credits_received(self, id: bytes, credits: int) -> None:
+        seeds = []
+        with self._flow_lock:
+            if id not in self._credits:
+                logging.warning(f"seed credits received from {id} which did not advertise a window")
+                return
+            self._credits[id] += credits
+            while self._credits[id] > 0:
+                item = self._backlog.pop(id)
+                if item is None:
+                    break
+                self._credits[id] -= 1
+                seeds.append(item)
+        for typ, seed in seeds:
+            self._send_seed_now(id, typ, seed)
+
+    def _seeds_pulled(self, id: bytes, digests: List[bytes]) -> None:
+        with self._flow_lock:
+            items = [self._seed_store.get(x) for x in digests]
+        for digest, item in zip(digests, items):
+            seed = None
+            if item is not None:
+                seed = item[1] if item[1] is not None else self._seed_reader(digest)
+            if seed is None:
+                logging.warning(f"seed {digest.hex()} pulled by {id} is no longer available")
+            else:
+                self._send_seed_credited(id, item[0], seed)
+
+    def _store_seed(self, typ: SeedType, seed: bytes, digest: bytes) -> None:
+        # Must be called with _flow_lock held
+        if digest not in self._seed_store:
+            self._seed_store[digest] = (typ, None if self._seed_reader else seed)
+            if len(self._seed_store) > self.SEED_STORE_SIZE:
+                self._seed_store.popitem(last=False)
+
+    def _announce_seed(self, id: bytes, typ: SeedType, seed: bytes, digest: bytes = None) -> None:
+        digest = md5(seed).digest() if digest is None else digest
+        with self._flow_lock:
+            self._store_seed(typ, seed, digest)
+            new_batch = id not in self._announces
+            batch = self._announces.setdefault(id, [])
+            batch.append((digest, typ))
+            if len(batch) < self.ANNOUNCE_BATCH_SIZE:
+                if new_batch:  # make sure the announce will be sent in time
+                    self.call_later(self._batch_latency, self._flush_announces)
+                return
+            del self._announces[id]
+        self._send_announce(id, batch)
+
+    def _flush_announces(self) -> None:
+        with self._flow_lock:
+            batches, self._announces = self._announces, {}
+        for id, batch in batches.items():
+            self._send_announce(id, batch)
+
+    def _send_announce(self, id: bytes, batch: List[Tuple[bytes, SeedType]]) -> None:
+        msg = SeedAnnounceMsg()
+        msg.digests.extend(x for x, _ in batch)
+        msg.types.extend(x.value for _, x in batch)
+        self.send_to(id, msg, msg_type=MessageType.SEED_ANNOUNCE)
+
+    def flush_seeds(self, expired_only: bool = False) -> None:
+        super(BrokerAgent, self).flush_seeds(expired_only)
+        if not expired_only:
+            self._flush_announces()
+
+    def _package_digest(self, package: Path) -> str:
+        st = package.stat()
+        key = (str(package.absolute()), st.st_mtime_ns, st.st_size)
+        if key not in self._pkg_digests:
+            self._pkg_digests[key] = PackageCache.digest(package.read_bytes())
+            self._pkg_files[self._pkg_digests[key]] = package
+        return self._pkg_digests[key]
+
+    def _package_requested(self, id: bytes, digest: str) -> None:
+        msg = self._pending_starts.pop(id, None)
+        if msg is None or msg.binary_digest != digest or digest not in self._pkg_files:
+            logging.error(f"package {digest} requested by {id} does not match any START sent")
+            return
+        logging.debug(f"package {digest[:16]} not in client {id} cache, send it")
+        binary, codec = self._compress(id, self._pkg_files[digest].read_bytes(), MessageType.START)
+        msg.binary = binary
+        msg.compression = codec.value
+        self.send_to(id, msg, msg_type=MessageType.START)
 
-    def send_seed(self, id: bytes, typ: SeedType, seed: bytes) -> None:
+    def send_seed(self, id: bytes, typ: SeedType, seed: bytes, priority: int = 0, digest: bytes = None) -> None:
         """
-        Send the given input to the client `id`.
+        Send the given input to the client `id`. If seed batching
+        is enabled, the seed is queued in the client's pending batch.
+        If the client ran out of credits, the seed is held in its backlog
+        where it is ranked according to its type and ``priority``.
+        If the client pulls seeds, only the seed digest is announced.
 
         :param id: raw id of the client
         :param typ: Type of the input
         :param seed: Bytes the of input
+        :param priority: level of the seed in the backlog (from 0 to ``SeedBacklog.LEVELS - 1``, higher first)
+        :param digest: md5 digest of the seed if already known (computed otherwise, when announced)
         """
+        if id in self._announce_peers:
+            self._announce_seed(id, typ, seed, digest)
+        else:
+            self._send_seed_credited(id, typ, seed, priority)
+
+    def _send_seed_credited(self, id: bytes, typ: SeedType, seed: bytes, priority: int = 0) -> None:
+        with self._flow_lock:
+            if id in self._credits:
+                if self._credits[id] <= 0:
+                    self._backlog.push(id, typ, seed, priority)
+                    return
+                self._credits[id] -= 1
+        self._send_seed_now(id, typ, seed)
+
+    def _send_seed_now(self, id: bytes, typ: SeedType, seed: bytes) -> None:
         msg = InputSeedMsg()
         msg.type = typ.value
+        seed, codec = self._compress(id, seed, MessageType.INPUT_SEED)
         msg.seed = seed
-        self.send_to(id, msg, msg_type=MessageType.INPUT_SEED)
+        msg.compression = codec.value
+        self._push_seed(id, msg)
 
     def send_start(self, id: bytes, name: str, package: PathLike, argv: List[str], exmode: ExecMode, fuzzmode: FuzzMode,
                    ckmode: CheckMode, covmode: CoverageMode, engine: FuzzingEngineInfo, engine_args: str,
@@ -297,7 +1019,12 @@ class BrokerAgent(NetworkAgent):
         if isinstance(package, str):
             package = Path(package)
         msg.binary_filename = name
-        msg.binary = package.read_bytes()
+        msg.binary_digest = self._package_digest(package)
+        if id not in self._package_peers:  # the client has no cache, always send the package
+            binary, codec = self._compress(id, package.read_bytes(), MessageType.START)
+            msg.binary = binary
+            msg.compression = codec.value
+        msg.seed_compression = self._codecs.get(id, Compression.RAW).value
         msg.engine.name = engine.name
         msg.engine.version = engine.version
         msg.exec_mode = exmode.value
@@ -310,6 +1037,8 @@ class BrokerAgent(NetworkAgent):
             msg.sast_report = sast_report
         for arg in argv:
             msg.program_argv.append(arg)
+        if id in self._package_peers:  # kept in case the client does not have the package
+            self._pending_starts[id] = msg
         self.send_to(id, msg, msg_type=MessageType.START)
 
     def send_stop(self, id: bytes) -> None:
@@ -339,14 +1068,175 @@ class BrokerAgent(NetworkAgent):
     def register_data_callback(self, cb: Callable) -> None:
         self.register_callback(MessageType.DATA, cb)
 
+    def register_seed_reader(self, reader: Callable[[bytes], Optional[bytes]]) -> None:
+        """
+        Register the function reading back the seeds pulled by clients, so
+        that announced seeds are not kept in memory. The function takes the
+        md5 digest of a seed and returns its content (None if not available).
+        Must be registered before any seed is sent.
+
+        :param reader: seed reader function
+        """
+        self._seed_reader = reader
+
+    def register_client_lost_callback(self, cb: Callable) -> None:
+        """
+        Register a callback called when a client is considered lost (no
+        heartbeat received in time). The callback takes 2 parameters, the
+        client id and the time elapsed (in seconds) since its last message.
+
+        :param cb: callback function
+        """
+        self._lost_cbs.append(cb)
+
 
 class ClientAgent(NetworkAgent):
     """
     Subclass of NetworkAgent to connect to PASTIS as a fuzzing
     agent. The class provides helper methods to interact with
     the broker.
+
+    Binary packages received are kept in a :py:obj:`PackageCache`
+    so that the broker does not have to send them again on restart.
+
+    With a ``seed_window``, the broker sends at most that many seeds
+    before the client grants new credits with :py:meth:`grant_seed_credits`.
+    With ``auto_credit`` a credit is granted once the seed callbacks returned,
+    otherwise the engine grants them when it actually consumes seeds.
+
+    With ``seed_announce``, the broker only announces the digests of seeds
+    and the client pulls the seeds it does not know yet (i.e: neither sent
+    nor received by this agent since the last START, as engines restart
+    from scratch).
+
+    Once the HELLO sent, a heartbeat is sent every ``heartbeat_interval``
+    seconds by the receiving loop so that the broker can detect the agent
+    died (even if it has nothing else to send).
+
+    When the connection to the broker is lost and established again (e.g:
+    the broker restarted), the HELLO is sent again before anything else,
+    with the engine started by the last START (if not stopped since), so
+    that a broker restored from a checkpoint can resume the agent without
+    restarting its engine.
+
+    :param package_cache: directory of the package cache (default in the user cache directory)
+    :param seed_window: number of seeds the broker can send in advance (0 for no flow control)
+    :param auto_credit: grant a credit when seed callbacks return
+    :param seed_announce: receive seed digests and pull the missing seeds
+    :param heartbeat_interval: seconds between heartbeats (0 to disable them)
     """
 
+    def __init__(self, *args, package_cache: PathLike = None, seed_window: int = 0, auto_credit: bool = True,
+                 seed_announce: bool = False, heartbeat_interval: float = 5, **kwargs):
+        super(ClientAgent, self).__init__(*args, **kwargs)
+        self.package_cache = PackageCache(package_cache)
+        #: cache of the binary packages received
+        self.package_digest = None
+        #: digest of the package of the last START (checked), to extract it without hashing it again
+
+        self.seed_window = seed_window
+        self._auto_credit = auto_credit
+        self._pending_credits = 0  # credits not yet sent (sent by chunks of a quarter window)
+        self._credit_lock = threading.Lock()
+
+        self.seed_announce = seed_announce
+        self._known_seeds = set()  # digests of seeds sent or received (with seed_announce)
+        self.seeds_skipped = 0
+        #: number of announced seeds not pulled because already known
+
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_scheduled = False
+
+        self._hello = None  # last HELLO sent (sent again on reconnection)
+        self._running_engine = None  # engine of the last START, None once stopped
+        self._disconnected = False
+
+    def connect(self, remote: str = "localhost", port: int = 5555) -> bool:
+        res = super(ClientAgent, self).connect(remote, port)
+        self._monitor = self.socket.get_monitor_socket(zmq.EVENT_CONNECTED | zmq.EVENT_DISCONNECTED)
+        return res
+
+    def _connection_event(self, event: int) -> None:
+        if event == zmq.EVENT_DISCONNECTED:
+            logging.warning("connection to the broker lost")
+            self._disconnected = True
+        elif event == zmq.EVENT_CONNECTED and self._disconnected:
+            self._disconnected = False
+            if self._hello is None:
+                return
+            msg = HelloMsg()
+            msg.CopyFrom(self._hello)
+            if self._running_engine is not None:
+                msg.running_engine.CopyFrom(self._running_engine)
+            logging.info(f"reconnected to the broker, send HELLO again (engine running: {msg.running_engine.name or 'none'})")
+            final_msg = EnvelopeMsg(hello_msg=msg)
+            self._outbox.appendleft([final_msg.SerializeToString()])  # before messages queued meanwhile
+
+    def _seeds_announced(self, msg: SeedAnnounceMsg) -> None:
+        missing = [x for x in msg.digests if x not in self._known_seeds]  # marked known once received
+        self.seeds_skipped += len(msg.digests) - len(missing)
+        if missing:
+            self.send(SeedPullMsg(digests=missing), msg_type=MessageType.SEED_PULL)
+
+    def grant_seed_credits(self, count: int = 1) -> None:
+        """
+        Notify the broker that ``count`` seeds have been consumed and that
+        as many can be sent. Credits are sent by chunks to limit the traffic.
+        Does nothing without seed window.
+
+        :param count: number of seeds consumed
+        """
+        if not self.seed_window:
+            return
+        with self._credit_lock:
+            self._pending_credits += count
+            if self._pending_credits < max(1, self.seed_window // 4):
+                return
+            count, self._pending_credits = self._pending_credits, 0
+        msg = SeedCreditMsg()
+        msg.credits = count
+        self.send(msg, msg_type=MessageType.SEED_CREDIT)
+
+    def _run_callbacks(self, id: Optional[bytes], topic: MessageType, message: Message, payload: bytes = None) -> None:
+        if topic == MessageType.START:
+            self._known_seeds.clear()  # the engine restarts from scratch
+            self._running_engine = message.engine
+        elif topic == MessageType.STOP:
+            self._running_engine = None
+        super(ClientAgent, self)._run_callbacks(id, topic, message, payload)
+        if topic == MessageType.INPUT_SEED and self._auto_credit:
+            self.grant_seed_credits()
+
+    def _message_args(self, topic: MessageType, msg: Message, payload: bytes = None):
+        args = super(ClientAgent, self)._message_args(topic, msg, payload)
+        if topic == MessageType.INPUT_SEED and self.seed_announce:
+            self._known_seeds.add(md5(args[1]).digest())
+        return args
+
+    def _resolve_package(self, msg: StartMsg) -> Optional[bytes]:
+        """
+        Save the package received in the cache, or load it from the cache.
+        On cache miss, request the package to the broker.
+
+        :param msg: START message received
+        :return: the package content, None if it has been requested
+        """
+        self.package_digest = None
+        if not msg.binary_digest:  # broker does not use digests
+            return super(ClientAgent, self)._resolve_package(msg)
+        if msg.binary:
+            data = decompress(msg.binary, Compression(msg.compression))
+            self.package_cache.put(data, msg.binary_digest)  # raise ValueError if it does not match
+        else:
+            data = self.package_cache.get(msg.binary_digest)
+            if data is None:
+                logging.info(f"package {msg.binary_digest[:16]} not in cache, request it")
+                self.send(PackageRequestMsg(digest=msg.binary_digest), msg_type=MessageType.PACKAGE_REQUEST)
+                return None
+            logging.info(f"package {msg.binary_digest[:16]} loaded from cache")
+        self.package_digest = msg.binary_digest
+        return data
+
     def send_hello(self, engines: List[FuzzingEngineInfo], arch: Arch = None, platform: Platform = None) -> bool:
         """
         Send the hello message to the broker. `engines` parameter is the list of fuzzing engines
@@ -373,7 +1263,23 @@ class ClientAgent(NetworkAgent):
         msg.platform = plfm.value
         for eng in engines:
             msg.engines.add(name=eng.name, version=eng.version, pymodule=eng.pymodule)
+        msg.compressions.extend(x.value for x in available_compressions())
+        msg.package_cache = True
+        msg.seed_window = self.seed_window
+        msg.seed_announce = self.seed_announce
+        msg.heartbeat_interval = int(self.heartbeat_interval * 1000)
+        self._hello = msg
         self.send(msg, msg_type=MessageType.HELLO)
+        if self.heartbeat_interval and not self._heartbeat_scheduled:
+            self._heartbeat_scheduled = True
+            self.call_later(self.heartbeat_interval, self._send_heartbeat)
+        return True
+
+    def _send_heartbeat(self) -> None:
+        if self._stop:
+            return
+        self.send(HeartbeatMsg(), msg_type=MessageType.HEARTBEAT)
+        self.call_later(self.heartbeat_interval, self._send_heartbeat)
 
     def send_log(self, level: LogLevel, message: str) -> None:
         """
@@ -483,15 +1389,20 @@ class ClientAgent(NetworkAgent):
     def send_seed(self, typ: SeedType, seed: bytes) -> None:
         """
         Send an input seed to the broker. The ``typ`` indicates
-        the type of the seed, namely, input, crash or hang.
+        the type of the seed, namely, input, crash or hang. If seed
+        batching is enabled, the seed is queued in the pending batch.
 
         :param typ: type of the input
         :param seed: bytes of the input
         """
+        if self.seed_announce:
+            self._known_seeds.add(md5(seed).digest())  # do not pull it back
         msg = InputSeedMsg()
         msg.type = typ.value
+        seed, codec = self._compress(None, seed, MessageType.INPUT_SEED)
         msg.seed = seed
-        self.send(msg, msg_type=MessageType.INPUT_SEED)
+        msg.compression = codec.value
+        self._push_seed(None, msg)
 
     def send_alert_data(self, alert_data: AlertData) -> None:
         """
@@ -553,6 +1464,7 @@ class FileAgent(ClientAgent):
         super(FileAgent, self).__init__()
         del self.ctx    # Remove network related attributes
         del self.socket
+        self._stop_event = threading.Event()
         self.logger = logging.getLogger('FileAgent')
         self.logger.parent = None  # Remove root handler to make sur it is not printed on output
 
@@ -569,11 +1481,12 @@ class FileAgent(ClientAgent):
     def connect(self, remote: str = "localhost", port: int = 5555) -> bool:
         return True  # Do nothing
 
+    def stop(self) -> None:
+        self._stop_event.set()
+        super(FileAgent, self).stop()
+
     def _recv_loop(self):
-        while 1:
-            if self._stop:
-                return
-            time.sleep(0.05)
+        self._stop_event.wait()  # nothing to receive, just wait to be stopped
 
     def send_to(self, id: bytes, msg: Message, msg_type: MessageType = None):
         raise RuntimeError("FileAgent is not meant to be used as broker")
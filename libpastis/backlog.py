@@ -0,0 +1,129 @@
+# built-in imports
+import time
+from collections import deque
+from typing import Dict, Hashable, Optional, Tuple
+
+# local imports
+from libpastis.types import SeedType
+
+
+class SeedBacklog(object):
+    """
+    Seeds held back for clients that ran out of credits. Seeds of a client
+    are ranked by type (crashes first, then hangs, then inputs), then by
+    priority level (as given by the sender, e.g: seeds covering new edges
+    first) and in arrival order within a level. The memory used by all
+    backlogs is bounded by ``max_bytes``: when exceeded, the lowest ranked
+    seed of the largest backlog is dropped.
+
+    :param max_bytes: maximum cumulated size of seeds held (all clients)
+    """
+
+    PRIORITY = [SeedType.CRASH, SeedType.HANG, SeedType.INPUT]
+    #: seed types by decreasing priority
+
+    LEVELS = 16
+    #: number of priority levels within a seed type (0 is the lowest)
+
+    WAIT_SMOOTHING = 0.1
+    #: weight of the last seed in the mean waiting time
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0  # bytes held by all backlogs
+        self.dropped = 0  # number of seeds dropped to respect max_bytes
+        self._queues = {}  # client id -> [deque[(bytes, push time)]] by decreasing rank (type, level)
+        self._sizes = {}  # client id -> bytes held
+        self._waits = {}  # client id -> mean time spent in the backlog by seeds popped (seconds)
+
+    def _rank(self, typ: SeedType, priority: int) -> int:
+        level = min(max(priority, 0), self.LEVELS - 1)
+        return self.PRIORITY.index(typ) * self.LEVELS + (self.LEVELS - 1 - level)
+
+    def push(self, id: Hashable, typ: SeedType, seed: bytes, priority: int = 0) -> None:
+        """
+        Add a seed in the backlog of a client (evicting seeds if the
+        memory budget is exceeded).
+
+        :param id: client id
+        :param typ: type of the seed
+        :param seed: seed content
+        :param priority: priority level of the seed within its type (from 0 to ``LEVELS - 1``)
+        """
+        queues = self._queues.get(id)
+        if queues is None:
+            queues = self._queues[id] = [deque() for _ in range(len(self.PRIORITY) * self.LEVELS)]
+        queues[self._rank(typ, priority)].append((seed, time.monotonic()))
+        self._sizes[id] = self._sizes.get(id, 0) + len(seed)
+        self.size += len(seed)
+        while self.size > self.max_bytes:
+            self._evict(max(self._sizes, key=self._sizes.get))
+
+    def pop(self, id: Hashable) -> Optional[Tuple[SeedType, bytes]]:
+        """
+        Pop the highest ranked seed of a client.
+
+        :param id: client id
+        :return: the type and content of the seed, None if the backlog is empty
+        """
+        for rank, q in enumerate(self._queues.get(id, [])):
+            if q:
+                seed, t = q.popleft()
+                wait = time.monotonic() - t
+                self._waits[id] = wait if id not in self._waits else \
+                    (1 - self.WAIT_SMOOTHING) * self._waits[id] + self.WAIT_SMOOTHING * wait
+                self._account(id, -len(seed))
+                return self.PRIORITY[rank // self.LEVELS], seed
+        return None
+
+    def count(self, id: Hashable) -> int:
+        """
+        Number of seeds held for a client.
+        """
+        return sum(len(q) for q in self._queues.get(id, []))
+
+    def bytes(self, id: Hashable) -> int:
+        """
+        Cumulated size of seeds held for a client.
+        """
+        return self._sizes.get(id, 0)
+
+    def wait(self, id: Hashable) -> float:
+        """
+        Mean time (in seconds) spent in the backlog by the last seeds sent to a client.
+        """
+        return self._waits.get(id, 0.0)
+
+    def count_top(self, id: Hashable) -> int:
+        """
+        Number of seeds held for a client at the highest priority level of their type.
+        """
+        return sum(len(q) for i, q in enumerate(self._queues.get(id, [])) if i % self.LEVELS == 0)
+
+    def clear(self, id: Hashable) -> None:
+        """
+        Drop the whole backlog of a client.
+        """
+        self._queues.pop(id, None)
+        self._waits.pop(id, None)
+        self.size -= self._sizes.pop(id, 0)
+
+    def stats(self) -> Dict[Hashable, int]:
+        """
+        Number of seeds held for each client.
+        """
+        return {id: self.count(id) for id in self._queues}
+
+    def _evict(self, id: Hashable) -> None:
+        for q in reversed(self._queues[id]):
+            if q:
+                self._account(id, -len(q.popleft()[0]))
+                self.dropped += 1
+                return
+
+    def _account(self, id: Hashable, delta: int) -> None:
+        self._sizes[id] += delta
+        self.size += delta
+        if not any(self._queues[id]):  # drained (the mean waiting time is kept)
+            del self._queues[id]
+            del self._sizes[id]
@@ -0,0 +1,115 @@
+# built-in imports
+import zlib
+import zipfile
+from typing import List, Tuple, Iterable
+
+# third-party imports
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+# local imports
+from libpastis.types import Compression
+
+
+MIN_COMPRESS_SIZE = 512
+#: payloads smaller than this size are sent as-is
+
+COMPRESSED_MAGICS = [
+    b"\x1f\x8b",          # gzip
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"\xfd7zXZ\x00",      # xz
+    b"BZh",               # bzip2
+    b"\x89PNG",           # png
+    b"\xff\xd8\xff",      # jpeg
+]
+#: magic bytes of formats that are already compressed
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def available_compressions() -> List[Compression]:
+    """
+    Get the codecs supported locally by order of preference.
+
+    :return: list of compression codecs
+    """
+    return [Compression.ZSTD, Compression.ZLIB] if ZSTD_AVAILABLE else [Compression.ZLIB]
+
+
+def negotiate_compression(remote: Iterable[Compression]) -> Compression:
+    """
+    Select the preferred codec supported both locally and by the peer.
+
+    :param remote: codecs supported by the peer
+    :return: the codec to use (``RAW`` if none in common)
+    """
+    remote = set(remote)
+    for codec in available_compressions():
+        if codec in remote:
+            return codec
+    return Compression.RAW
+
+
+def is_compressed(data: bytes) -> bool:
+    """
+    Check whether the data already looks compressed (by its magic bytes). Zip
+    archives are only considered compressed if their first entry is deflated.
+
+    :param data: payload
+    :return: True if the payload is likely already compressed
+    """
+    if data.startswith(ZIP_MAGIC):
+        return len(data) > 9 and int.from_bytes(data[8:10], "little") != zipfile.ZIP_STORED
+    return any(data.startswith(x) for x in COMPRESSED_MAGICS)
+
+
+def compress(data: bytes, codec: Compression, level: int) -> Tuple[bytes, Compression]:
+    """
+    Compress the payload with the given codec. Tiny payloads, payloads already
+    compressed and payloads that do not shrink are returned unchanged.
+
+    :param data: payload to compress
+    :param codec: codec to use
+    :param level: compression level (zlib levels are capped to 9)
+    :return: the resulting bytes and the codec effectively applied
+    """
+    if codec == Compression.RAW or len(data) < MIN_COMPRESS_SIZE or is_compressed(data):
+        return data, Compression.RAW
+    if codec == Compression.ZSTD:
+        out = zstandard.ZstdCompressor(level=level).compress(data)
+    else:
+        out = zlib.compress(data, min(level, 9))
+    if len(out) >= len(data):
+        return data, Compression.RAW
+    return out, codec
+
+
+def decompress(data: bytes, codec: Compression) -> bytes:
+    """
+    Decompress a payload received.
+
+    :param data: compressed payload
+    :param codec: codec used to compress it
+    :return: the original bytes
+    :raise ValueError: if the codec is not supported locally
+    """
+    if codec == Compression.RAW:
+        return data
+    elif codec == Compression.ZLIB:
+        try:
+            return zlib.decompress(data)
+        except zlib.error as e:
+            raise ValueError(f"invalid zlib payload: {e}")
+    elif codec == Compression.ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd payload received but zstandard is not installed")
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"invalid zstd payload: {e}")
+    else:
+        raise ValueError(f"unknown compression codec {codec}")
@@ -0,0 +1,141 @@
+# built-in imports
+import queue
+import logging
+import itertools
+import threading
+from enum import Enum
+from typing import Callable, Hashable
+
+
+class DispatchPolicy(Enum):
+    """
+    Behavior of the dispatcher when the queue of a worker is full.
+    """
+    BLOCK = 0  # wait for room in the queue (backpressure on the receiving thread)
+    DROP = 1   # drop droppable jobs (others still block)
+
+
+class Dispatcher(object):
+    """
+    Pool of worker threads running jobs submitted by the receiving thread
+    of an agent. Jobs are sharded on workers by key (the client id): keys
+    are assigned to workers in a round-robin manner when first seen, thus
+    jobs of a given client are run in order while jobs of different clients
+    run concurrently (as long as there are more workers than clients). Each worker has a bounded queue, the behavior when
+    it is full is given by the :py:class:`DispatchPolicy`.
+
+    :param workers: number of worker threads
+    :param queue_size: maximum number of pending jobs per worker
+    :param policy: policy to apply when a queue is full
+    """
+
+    def __init__(self, workers: int, queue_size: int = 1000, policy: DispatchPolicy = DispatchPolicy.BLOCK):
+        self.policy = policy
+        self.dropped = 0
+        self._closed = False
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._assigned = {}  # key -> [worker queue, jobs queued not run yet, forgotten]
+        self._lock = threading.Lock()  # protects assignments (updated by workers as jobs are run)
+        self._next = itertools.count()  # round-robin counter of assignments
+        self._threads = [threading.Thread(name=f"[LIBPASTIS-DISPATCH-{i}]", target=self._worker, args=(q,), daemon=True)
+                         for i, q in enumerate(self._queues)]
+        for th in self._threads:
+            th.start()
+
+    @property
+    def depth(self) -> int:
+        """
+        Total number of jobs waiting in the worker queues.
+        """
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, key: Hashable, fn: Callable, *args, droppable: bool = False) -> bool:
+        """
+        Submit a job to the worker in charge of ``key``.
+
+        :param key: key identifying the ordering domain (client id)
+        :param fn: function to call
+        :param args: arguments of the function
+        :param droppable: whether the job can be dropped if the queue is full (with the DROP policy)
+        :return: True if the job has been queued
+        """
+        with self._lock:
+            entry = self._assigned.get(key)
+            if entry is None:
+                entry = self._assigned[key] = [self._queues[next(self._next) % len(self._queues)], 0, False]
+            entry[1] += 1
+            entry[2] = False  # the key is back (its jobs stay on the same worker)
+        q = entry[0]
+        if droppable and self.policy == DispatchPolicy.DROP:
+            try:
+                q.put_nowait((key, fn, args))
+                return True
+            except queue.Full:
+                self.dropped += 1
+                self._job_done(key)
+                return False
+        while not self._closed:
+            try:
+                q.put((key, fn, args), timeout=0.1)  # block but keep an eye on close()
+                return True
+            except queue.Full:
+                pass
+        self._job_done(key)
+        return False
+
+    def _job_done(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._assigned.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0 and entry[2]:  # forgotten and drained
+                    del self._assigned[key]
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Release the worker assignment of a key (client gone). Jobs already
+        queued are still run, the assignment is only released once they are
+        (if the key comes back meanwhile, its jobs go to the same worker).
+
+        :param key: key to forget
+        """
+        with self._lock:
+            entry = self._assigned.get(key)
+            if entry is not None:
+                if entry[1] == 0:
+                    del self._assigned[key]
+                else:
+                    entry[2] = True
+
+    def close(self) -> None:
+        """
+        Stop accepting jobs. Workers exit once their pending jobs are run.
+        """
+        self._closed = True
+        for q in self._queues:
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                pass  # the worker will notice on its own when its queue gets empty
+
+    def join(self) -> None:
+        """
+        Wait for workers to exit (to call after :py:meth:`close`).
+        """
+        for th in self._threads:
+            if th is not threading.current_thread():  # a job might close the dispatcher
+                th.join()
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            job = q.get()
+            if job is None:
+                break
+            key, fn, args = job
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error(f"dispatched job {fn} failed: {e}")
+            self._job_done(key)
+            if self._closed and q.empty():
+                break
@@ -3,6 +3,8 @@ from pathlib import Path
 import zipfile
 import tempfile
 import logging
+import hashlib
+import os
 from typing import Tuple, Optional, Union
 
 # third-party imports
@@ -12,7 +14,8 @@ import stat
 import lief
 
 # local imports
-from libpastis.types import Arch, Platform
+from libpastis.types import Arch, Platform, PathLike
+from libpastis.utils import user_cache_directory
 
 
 class BinaryPackage(object):
@@ -251,7 +254,8 @@ class BinaryPackage(object):
         for file in self.other_files:
             zip.write(file, file.name)
         zip.close()
-        return Path(fname)
+        self._package_file = Path(fname)  # keep it to avoid re-creating it (and thus re-hashing it)
+        return self._package_file
 
     @staticmethod
     def _read_binary_infos(file: Path) -> Optional[Tuple[Platform, Arch]]:
@@ -306,13 +310,7 @@ class BinaryPackage(object):
             # Extract the archive in the right directory
             shutil.unpack_archive(tmp_file.as_posix(), extract_dir)  # unpack it in dst directory
             # Create the package object
-            pkg = BinaryPackage.auto(Path(extract_dir) / name)
-            if pkg is None:
-                raise ValueError(f"Cannot create a BinaryPackage with {name}")
-            for file in extract_dir.iterdir():
-                if file not in [pkg.executable_path, pkg.callgraph, pkg.quokka, pkg.dictionary]:
-                    pkg.other_files.append(file)
-            return pkg
+            return BinaryPackage.from_directory(name, extract_dir)
         elif mime in ['application/x-pie-executable', 'application/x-dosexec', 'application/x-mach-binary', 'application/x-executable', 'application/x-sharedlib']:
             program_path = extract_dir / name
             program_path.write_bytes(binary)
@@ -320,3 +318,159 @@ class BinaryPackage(object):
             return BinaryPackage(program_path)
         else:
             raise FileNotFoundError(f"mimetype not recognized {mime}")
+
+    @staticmethod
+    def from_directory(name: str, directory: Path) -> 'BinaryPackage':
+        """
+        Create a BinaryPackage out of a directory where a package has
+        been extracted. All files beside the main executable, the quokka,
+        callgraph and dictionary are considered as other files.
+
+        :param name: name of the main executable in the directory
+        :param directory: directory where the package has been extracted
+        :return: the package object
+        :raise ValueError: if the executable file is not valid
+        """
+        directory = Path(directory)
+        pkg = BinaryPackage.auto(directory / name)
+        if pkg is None:
+            raise ValueError(f"Cannot create a BinaryPackage with {name}")
+        for file in directory.iterdir():
+            if file not in [pkg.executable_path, pkg.callgraph, pkg.quokka, pkg.dictionary]:
+                pkg.other_files.append(file)
+        return pkg
+
+
+class PackageCache(object):
+    """
+    On-disk cache of the binary packages received by a fuzzing agent, keyed
+    by their digest. It enables the broker to only send the digest of the
+    package in the START message when the agent already has it. Each package
+    is also extracted only once, subsequent extractions are hard links of
+    the files already extracted. Packages are executed by engines, thus the
+    default directory is private to the user and packages are checked against
+    their digest when loaded.
+    """
+
+    CACHE_NAME = "packages"
+    PACKAGE_SUFFIX = ".pkg"
+
+    def __init__(self, directory: PathLike = None):
+        """
+        :param directory: directory where to store packages (default in the user cache directory)
+        """
+        if directory:
+            self.root = Path(directory)
+            self.root.mkdir(parents=True, exist_ok=True)
+        else:
+            self.root = user_cache_directory(self.CACHE_NAME)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """
+        Compute the digest of a package.
+
+        :param data: content of the package
+        :return: hexadecimal sha256 digest
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def __contains__(self, digest: str) -> bool:
+        return self._package_file(digest).exists()
+
+    def _package_file(self, digest: str) -> Path:
+        return self.root / (digest + self.PACKAGE_SUFFIX)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """
+        Get the content of a package (a package not matching its digest is
+        removed from the cache).
+
+        :param digest: digest of the package
+        :return: bytes of the package if in cache
+        """
+        file = self._package_file(digest)
+        if not file.exists():
+            return None
+        data = file.read_bytes()
+        if self.digest(data) != digest:
+            logging.warning(f"package {digest[:16]} in cache does not match its digest (removed)")
+            self._remove(digest)
+            return None
+        return data
+
+    def _remove(self, digest: str) -> None:
+        self._package_file(digest).unlink(missing_ok=True)
+        shutil.rmtree(self.root / digest, ignore_errors=True)
+
+    def put(self, data: bytes, digest: str = None) -> str:
+        """
+        Add a package in the cache. The write is atomic, thus the cache
+        can be shared by multiple agents running on the same host.
+
+        :param data: content of the package
+        :param digest: expected digest of the package (checked)
+        :raise ValueError: if the package does not match the digest
+        :return: digest of the package
+        """
+        actual = self.digest(data)
+        if digest is not None and digest != actual:
+            raise ValueError(f"package does not match its digest {digest[:16]}")
+        digest = actual
+        file = self._package_file(digest)
+        if not file.exists():
+            tmp = file.with_name(f"{file.name}.{os.getpid()}")
+            tmp.write_bytes(data)
+            os.replace(tmp, file)
+        return digest
+
+    def extract(self, name: str, data: bytes, extract_dir: Path, digest: str = None) -> 'BinaryPackage':
+        """
+        Same as :py:meth:`BinaryPackage.from_binary` but the package is only
+        unpacked once in the cache. Files are then hard-linked (or copied if not
+        possible) in ``extract_dir``.
+
+        :param name: name of executable, or executable name in archive
+        :param data: content of the package
+        :param extract_dir: directory where files should be extracted
+        :param digest: digest of the package, already checked against ``data`` (computed if not provided)
+        :return: the package object
+
+        :raise FileNotFoundError: if the mime type of the binary is not recognized
+        """
+        digest = self.digest(data) if digest is None else digest
+        cached_dir = self.root / digest
+        if cached_dir.exists() and hasattr(os, "getuid") and cached_dir.stat().st_uid != os.getuid():
+            logging.warning(f"package {name} in cache not extracted by the current user, extract it again")
+            return BinaryPackage.from_binary(name, data, extract_dir)
+        if not cached_dir.exists():
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.root, prefix=f"{digest}."))
+            try:
+                BinaryPackage.from_binary(name, data, tmp_dir)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            try:
+                os.rename(tmp_dir, cached_dir)
+            except OSError:  # another agent extracted it meanwhile
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            logging.info(f"package {name} found in cache ({digest[:16]})")
+
+        extract_dir = Path(extract_dir)
+        for file in cached_dir.iterdir():
+            dst = extract_dir / file.name
+            if dst.is_dir() and not dst.is_symlink():
+                shutil.rmtree(dst)
+            else:
+                dst.unlink(missing_ok=True)  # a file of a package previously extracted here
+            try:
+                os.link(file, dst)
+            except OSError:  # cross-device link
+                shutil.copy2(file, dst)
+        try:
+            return BinaryPackage.from_directory(name, extract_dir)
+        except ValueError:
+            if (extract_dir / name).exists():  # standalone executable not recognized by BinaryPackage.auto
+                return BinaryPackage(extract_dir / name)
+            raise
@@ -0,0 +1,190 @@
+# built-in imports
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import List, Optional
+
+# local imports
+from libpastis.types import PathLike, SeedInjectLoc
+from libpastis.utils import user_cache_directory
+
+
+class ReplayCache(object):
+    """
+    On-disk cache of the results of seed replays (coverage or traces), keyed
+    by the digest of the target binary, its arguments, the injection location
+    of the seed and the seed digest: a seed replayed on the same target
+    always gives the same result, it is thus only traced once, even across
+    restarts. Entries are opaque bytes whose format is up to the caller (it
+    is part of the key, see ``kind``). The size of the cache is bounded, the
+    least recently used entries are evicted first.
+
+    The cache can be shared by several processes on the same host (writes
+    are atomic) but each one only accounts the entries it knows of. Results
+    are trusted as is, thus the default directory is private to the user.
+    """
+
+    CACHE_NAME = "replays"
+    DEFAULT_SIZE = 1024 * 1024 * 1024
+    ENTRY_SUFFIX = ".rpl"
+
+    def __init__(self, directory: PathLike = None, max_size: int = DEFAULT_SIZE):
+        """
+        :param directory: directory where to store entries (default in the user cache directory)
+        :param max_size: maximum cumulated size of entries (bytes)
+        """
+        if directory:
+            self.root = Path(directory)
+            self.root.mkdir(parents=True, exist_ok=True)
+        else:
+            self.root = user_cache_directory(self.CACHE_NAME)
+        self.max_size = max_size
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._lock = threading.Lock()
+
+        # Entries already in the cache, from the least recently used
+        entries = []
+        for file in self.root.glob(f"*/*{self.ENTRY_SUFFIX}"):
+            try:
+                st = file.stat()
+            except FileNotFoundError:  # evicted by another process meanwhile
+                continue
+            entries.append((st.st_mtime, file.stem, st.st_size))
+        self._index = OrderedDict((k, size) for _, k, size in sorted(entries))  # key -> size
+        self.size = sum(self._index.values())
+        self._evict()
+
+    def __getstate__(self) -> dict:
+        # Replays can be dispatched to other processes (e.g: joblib workers)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def target_digest(program: PathLike) -> str:
+        """
+        Compute the digest of a target binary.
+
+        :param program: path of the binary
+        :return: hexadecimal sha256 digest
+        """
+        h = hashlib.sha256()
+        with open(program, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def key(target: str, argv: List[str], inject_loc: SeedInjectLoc, seed: str, kind: str = "") -> str:
+        """
+        Compute the key of a replay.
+
+        :param target: digest of the target binary (see :py:meth:`target_digest`)
+        :param argv: arguments of the target (with the input placeholder, if any)
+        :param inject_loc: injection location of the seed
+        :param seed: digest of the seed
+        :param kind: format of the result (e.g: the coverage strategy), results
+                     of different kinds are cached separately
+        :return: hexadecimal digest of the replay
+        """
+        desc = json.dumps([target, list(argv), inject_loc.name, kind, seed])
+        return hashlib.sha256(desc.encode()).hexdigest()
+
+    def _entry_file(self, key: str) -> Path:
+        return self.root / key[:2] / (key + self.ENTRY_SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get the result of a replay (accounted as a hit or a miss). An entry
+        that cannot be read is a miss.
+
+        :param key: key of the replay (see :py:meth:`key`)
+        :return: bytes of the result if in cache
+        """
+        file = self._entry_file(key)
+        try:
+            data = file.read_bytes()
+        except OSError as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"cannot read replay cache entry {key[:16]}: {e}")
+            with self._lock:
+                self.misses += 1
+                if key in self._index:  # evicted by another process
+                    self.size -= self._index.pop(key)
+            return None
+        try:
+            os.utime(file)  # keeps track of the last use across restarts
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:  # added by another process
+                self._index[key] = len(data)
+                self.size += len(data)
+                self._evict()
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Add the result of a replay in the cache (least recently used entries
+        are evicted if the cache gets full). Results larger than the cache
+        are not kept, neither are results that cannot be written (the error
+        is logged).
+
+        :param key: key of the replay (see :py:meth:`key`)
+        :param data: result of the replay
+        """
+        if len(data) > self.max_size or key in self._index:
+            return
+        file = self._entry_file(key)
+        tmp = file.with_name(f"{file.name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            file.parent.mkdir(exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, file)
+        except OSError as e:
+            logging.warning(f"cannot write replay cache entry {key[:16]}: {e}")
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._index[key] = len(data)
+            self.size += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_size and self._index:
+            key, size = self._index.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                self._entry_file(key).unlink(missing_ok=True)
+            except OSError as e:
+                logging.warning(f"cannot evict replay cache entry {key[:16]}: {e}")
+
+    @property
+    def stats(self) -> dict:
+        """
+        Counters of the cache: hits, misses, evictions, number of entries and
+        their cumulated size (bytes).
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._index), "size": self.size}
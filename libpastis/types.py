@@ -2,6 +2,7 @@ import json
 from aenum import Enum, extend_enum
 from pathlib import Path
 from typing import Union
+from hashlib import md5
 import base64
 
 PathLike = Union[str, Path]
@@ -102,6 +103,16 @@ class SeedInjectLoc(Enum):
     ARGV = 1
 
 
+class Compression(Enum):
+    """
+    Compression codec applied on a message payload (binary
+    package or seed). ``RAW`` means not compressed.
+    """
+    RAW = 0
+    ZLIB = 1
+    ZSTD = 2
+
+
 class Arch(Enum):
     """
     Architecture representation
@@ -167,6 +178,43 @@ class AlertData(object):
                            'address': self.address})
 
 
+class SeedRecord(object):
+    """
+    A seed along with its type and its digest. The digest (md5, as in
+    seed file names) is computed on first use only and kept, so that
+    the record can be passed around without hashing the seed again.
+    """
+    __slots__ = ("typ", "content", "_digest")
+
+    def __init__(self, typ: SeedType, content: bytes, digest: bytes = None):
+        self.typ: SeedType = typ
+        #: Type of the seed
+        self.content: bytes = content
+        #: Bytes of the seed
+        self._digest = digest
+
+    @property
+    def digest(self) -> bytes:
+        """
+        md5 digest of the seed (computed once).
+
+        :return: 16 bytes digest
+        """
+        if self._digest is None:
+            self._digest = md5(self.content).digest()
+        return self._digest
+
+    @property
+    def hexdigest(self) -> str:
+        """
+        md5 digest of the seed, as hexadecimal string.
+        """
+        return self.digest.hex()
+
+    def __len__(self) -> int:
+        return len(self.content)
+
+
 class FuzzingEngineInfo(object):
     """
     Class to represent a fuzzing engine metadata.
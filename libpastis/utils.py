@@ -1,5 +1,7 @@
 # builtin imports
+import os
 import platform
+from pathlib import Path
 from typing import Optional
 
 # Local imports
@@ -16,3 +18,21 @@ def get_local_platform() -> Optional[Platform]:
     mapping = {"Linux": Platform.LINUX, "Windows": Platform.WINDOWS, "MacOS": Platform.MACOS, "iOS": Platform.IOS}
     # FIXME: Make sure platform.system() returns this string for other platforms
     return mapping.get(platform.system())
+
+
+def user_cache_directory(name: str) -> Path:
+    """
+    Get a cache directory private to the current user (``$XDG_CACHE_HOME/pastis/<name>``,
+    ``~/.cache`` by default), created with mode 0700 if needed.
+
+    :param name: name of the cache
+    :raise PermissionError: if the directory is owned by another user
+    :return: path of the directory
+    """
+    root = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "pastis" / name
+    root.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if hasattr(os, "getuid"):
+        if root.stat().st_uid != os.getuid():
+            raise PermissionError(f"cache directory {root} is not owned by the current user")
+        root.chmod(0o700)
+    return root
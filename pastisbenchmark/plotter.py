@@ -191,11 +191,15 @@ class Plotter(object):
     def _calcul_input_stats(self, campaign: CampaignResult) -> List[InputEntry]:
         entries = []
 
-        # FIXME: Compute uniquness
         useless_ctrs = Counter()
+        seed_counts = campaign.metadata.seed_counts() if campaign.metadata is not None else {}  # client -> (sent, sent first)
 
         for fuzzer, items in campaign.results:
             num = len(items)
+            if fuzzer == campaign.ALL_FUZZER:
+                unique = sum(x[1] for x in seed_counts.values()) if seed_counts else -1
+            else:
+                unique = seed_counts[fuzzer][1] if fuzzer in seed_counts else -1
             for item in items:
                 if not len(item.overall_new_items_covered):
                     useless_ctrs[fuzzer] += 1
@@ -217,7 +221,7 @@ class Plotter(object):
                             if s in str(file):
                                 syms[s] += 1
 
-            entry = InputEntry(engine=fuzzer, number=num, unique=-1, useless=useless_ctrs[fuzzer], condition=syms["CC"],
+            entry = InputEntry(engine=fuzzer, number=num, unique=unique, useless=useless_ctrs[fuzzer], condition=syms["CC"],
                                symread=syms["SR"], symwrite=syms["SW"], symjump=syms["DYN"])
             entries.append(entry)
         return entries
@@ -431,7 +435,7 @@ class Plotter(object):
             # Resolve broker input to triton ones (to what it was generated from)
             typ = "-"
             if campaign.is_triton(delta.fuzzer):
-                meta = campaign.parse_filename(delta.input_name)
+                meta = campaign.input_meta(delta.input_name)
                 if meta:
                     hash = meta[3]
                     triton_input_name = mapping.get(hash)
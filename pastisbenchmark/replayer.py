@@ -3,15 +3,19 @@ from enum import Enum, auto
 from pathlib import Path
 from typing import Generator, Optional
 import os
+import shutil
 import subprocess
 import logging
 import time
 import re
+import tempfile
 from datetime import datetime, timedelta
+from hashlib import md5
 
 # third-party
 from pastisbroker.workspace import Workspace, WorkspaceStatus
 from libpastis.types import SeedInjectLoc, SeedType
+from libpastis import ReplayCache
 from tritondse.trace import QBDITrace, TraceException
 from tritondse import CoverageStrategy
 
@@ -28,7 +32,7 @@ class Replayer(object):
     REPLAY_FAILS_LOG = "replay_fails.log"
 
     def __init__(self, program: Path, workspace: Path, type: ReplayType, injloc: SeedInjectLoc,
-                 stream: bool = False, full: bool = False, timeout: int = 15, *args):
+                 stream: bool = False, full: bool = False, timeout: int = 15, *args, cache: ReplayCache = None):
         self.workspace = Workspace(workspace)
         self.type = type
         self.stream = stream
@@ -40,6 +44,10 @@ class Replayer(object):
         self._fails = []
         self._tracing_times = []
 
+        # Traces of inputs already replayed on the same program (e.g: in another campaign)
+        self.cache = cache
+        self._target_digest = ReplayCache.target_digest(self.program) if cache is not None else None
+
         # initiatialize directories
         self._init_directories()
 
@@ -55,8 +63,21 @@ class Replayer(object):
             return self.workspace.root / self.LLVMPROFILE_REPLAY_DIR
 
     def iter(self) -> Generator[Path, None, None]:
+        """
+        Iterate the inputs to replay. Inputs of a packed corpus are taken from
+        its index, their path is the one they would have in the corpus directory
+        (they are only written in a temporary file when replayed).
+        """
         yield from self.workspace.iter_initial_corpus_directory()
-        yield from self.workspace.iter_corpus_directory(SeedType.INPUT)
+        pack = self.workspace.pack
+        if pack is None:
+            yield from self.workspace.iter_corpus_directory(SeedType.INPUT)
+            return
+        for file in self.workspace.iter_corpus_directory(SeedType.INPUT):
+            if file.name not in pack:  # written before the corpus was packed (or exported)
+                yield file
+        for entry in pack.iter(SeedType.INPUT):
+            yield self.workspace.seed_path(SeedType.INPUT, entry.name)
 
     def replay(self, input: Path) -> bool:
         if self.type == ReplayType.qbdi:
@@ -71,6 +92,27 @@ class Replayer(object):
             # The trace has already been generated
             return True
 
+        key = None
+        if self.cache is not None:
+            kind = f"qbdi-trace:{CoverageStrategy.EDGE.name}" + (":full" if self._full else "")
+            key = ReplayCache.key(self._target_digest, self._args, self._inject_loc,
+                                  md5(self.workspace.read_seed(input)).hexdigest(), kind)
+            if (data := self.cache.get(key)) is not None:
+                out_file.write_bytes(data)
+                return True
+
+        try:
+            if input.exists():
+                return self._trace_qbdi(input, out_file, key)
+            with tempfile.TemporaryDirectory() as tmp:  # packed input, the program needs a file
+                file = Path(tmp) / input.name
+                file.write_bytes(self.workspace.read_seed(input))
+                return self._trace_qbdi(file, out_file, key)
+        except TraceException as e:
+            self._fails.append(input)
+            return False
+
+    def _trace_qbdi(self, input: Path, out_file: Path, key: Optional[str]) -> bool:
         args = self._args[:]
 
         # If inject on argv try replacing the right argv
@@ -79,25 +121,50 @@ class Replayer(object):
                 idx = args.index("@@")
                 args[idx] = str(input.absolute())
 
-        try:
-            t0 = time.time()
-            res = QBDITrace.run(CoverageStrategy.EDGE,
-                                 str(self.program.absolute()),
-                                 args=args,
-                                 output_path=str(out_file.absolute()),
-                                 stdin_file=input if self._inject_loc == SeedInjectLoc.STDIN else None,
-                                 dump_trace=self._full,
-                                 cwd=self.program.parent,
-                                 timeout=self._timeout)
-            self._tracing_times.append(time.time()-t0)
-            return res
-        except TraceException as e:
-            self._fails.append(input)
-            return False
+        t0 = time.time()
+        res = QBDITrace.run(CoverageStrategy.EDGE,
+                             str(self.program.absolute()),
+                             args=args,
+                             output_path=str(out_file.absolute()),
+                             stdin_file=input if self._inject_loc == SeedInjectLoc.STDIN else None,
+                             dump_trace=self._full,
+                             cwd=self.program.parent,
+                             timeout=self._timeout)
+        self._tracing_times.append(time.time()-t0)
+        if res and key is not None:
+            self.cache.put(key, out_file.read_bytes())
+        return res
 
     def _replay_llvm_profile(self, input: Path) -> bool:
         pass
 
+    def replay_duplicates(self) -> int:
+        """
+        Give the duplicate inputs recorded by the broker (not written in the
+        corpus) the trace of the identical input replayed, so that they are
+        accounted to the fuzzer which found them again.
+
+        :return: number of traces added
+        """
+        traces = {}  # md5 -> trace file
+        for file in self.iter():
+            trace = self.corpus_replay_dir / (file.name + ".trace")
+            if trace.exists():
+                traces.setdefault(md5(self.workspace.read_seed(file)).hexdigest(), trace)
+
+        count = 0
+        for name, typ in self.workspace.iter_duplicates():
+            trace = traces.get(name.split("_")[-1].split(".")[0])
+            out_file = self.corpus_replay_dir / (name + ".trace")
+            if typ != SeedType.INPUT or trace is None or out_file.exists():
+                continue
+            try:
+                os.link(trace, out_file)
+            except OSError:
+                shutil.copy(trace, out_file)
+            count += 1
+        return count
+
 
     def start(self):
         # TODO: Start monitoring folders (and status file)
@@ -110,6 +177,8 @@ class Replayer(object):
     def print_stats(self):
         def tt(secs):
             return str(timedelta(seconds=int(secs)))
+        if self.cache is not None:
+            print(f"Trace cache: {self.cache.hits} hits, {self.cache.misses} misses, {self.cache.evictions} evictions")
         if not self._tracing_times:
             print("nothing replayed")
             return
@@ -16,6 +16,7 @@ import matplotlib.pyplot as plt
 # third-party
 from pastisbroker import BrokingMode
 from pastisbroker.workspace import Workspace, WorkspaceStatus
+from pastisbroker.metadata import MetadataIndex
 from libpastis.types import SeedInjectLoc, SeedType
 from tritondse.trace import QBDITrace
 from tritondse import CoverageStrategy, GlobalCoverage, BranchSolvingStrategy, Config
@@ -66,6 +67,9 @@ class CampaignResult(object):
 
     def __init__(self, workspace: Union[Path, str]):
         self.workspace = Workspace(Path(workspace))
+        # Index filled by the broker (and by replays), workspaces of older brokers have none (files are parsed)
+        self.metadata = MetadataIndex(self.workspace.metadata_file) if self.workspace.metadata_file.exists() else None
+        self._seeds_meta = None  # seed name -> metadata (loaded on first use)
         # Stat items
         self.fuzzers_items = {}     # fuzzer_name -> List[StatItem]
         self.fuzzers_coverage = {}  # fuzzer_name -> Coverage
@@ -81,8 +85,10 @@ class CampaignResult(object):
         self.mode = self.load_broking_mode(self.workspace)
 
     def _load_fuzzer_configs(self):
-        f = self.workspace.root / self.CLIENT_STATS
-        data = json.loads(f.read_text())
+        data = self.metadata.clients() if self.metadata is not None else None
+        if not data:  # workspace of a broker without metadata index
+            f = self.workspace.root / self.CLIENT_STATS
+            data = json.loads(f.read_text())
         for client in data:
             id = client['strid']
             conf = client['engine_args']
@@ -103,7 +109,7 @@ class CampaignResult(object):
 
     @property
     def is_full_duplex(self) -> bool:
-        return bool(self.mode == BrokingMode.FULL)
+        return bool(self.mode != BrokingMode.NO_TRANSMIT)  # seeds are shared (to all peers or not)
 
     @property
     def is_half_duplex(self) -> bool:
@@ -114,8 +120,10 @@ class CampaignResult(object):
         data = ["AFL" if any(("AFLPP" in x for x in self.fuzzers_config)) else "",
                 "HF" if any(("HF" in x for x in self.fuzzers_config)) else "",
                 "TT" if any(("TT" in x for x in self.fuzzers_config)) else ""]
-        if self.is_full_duplex:
+        if self.mode == BrokingMode.FULL:
             return f"PASTIS[{'|'.join(x for x in data if x)}]"
+        elif self.is_full_duplex:
+            return f"PASTIS-{self.mode.name}[{'|'.join(x for x in data if x)}]"
         else:
             return f"U[{'|'.join(x for x in data if x)}]"
 
@@ -175,10 +183,32 @@ class CampaignResult(object):
         else:
             return None
 
+    def input_meta(self, filename: str) -> Optional[tuple]:
+        """
+        Get the metadata of an input received by the broker, from the
+        metadata index or (if not indexed) from its file name.
+
+        :param filename: name of the input file (or of a file derived from it, e.g: trace)
+        :return: reception date, elapsed time (seconds), fuzzer id and md5 (None for initial seeds)
+        """
+        if self._seeds_meta is None:
+            self._seeds_meta = self.metadata.seeds_by_name() if self.metadata is not None else {}
+        i = filename.find(".cov")
+        meta = self._seeds_meta.get(filename[:i+4] if i != -1 else filename)
+        if meta is None:
+            return self.parse_filename(filename)
+        date, elapsed, fuzzer_id, hash = meta
+        return datetime.fromtimestamp(date), elapsed, fuzzer_id, hash
+
     def _iter_sorted(self, path: Path):
+        # Elapsed times of packed seeds are read from the pack index, not parsed from names
+        pack = self.workspace.pack
+        packed = {} if pack is None else {x.name: x.elapsed / 1e6 for x in pack.iter() if x.elapsed >= 0}
         files = {None: []}
         for file in path.iterdir():
-            res = self.parse_filename(file.name)
+            i = file.name.find(".cov")
+            elapsed = packed.get(file.name[:i+4] if i != -1 else file.name)
+            res = self.input_meta(file.name) if elapsed is None else (None, elapsed, None, None)
             if res is None:
                 files[None].append(file)
             else:
@@ -197,7 +227,11 @@ class CampaignResult(object):
 
     def load(self, type: ReplayType = ReplayType.qbdi) -> None:
         logging.info(f"load in {type.name} [mode:{self.mode.name}]")
-        if self.has_delta_files():
+        if self.metadata is not None and self.metadata.count("replays"):
+            items = self.load_delta_index()
+            self.load_delta(items)
+            self.load_coverage()  # If delta, coverage files shall also be present
+        elif self.has_delta_files():
             items = self.load_delta_directory()
             self.load_delta(items)
             self.load_coverage()  # If delta, coverage files shall also be present
@@ -223,7 +257,7 @@ class CampaignResult(object):
         for i, file in enumerate(self._iter_sorted(folder)):
             # parse name
             print(f"[{i+1}/{total}] {file}\r", file=sys.stderr, end="")
-            meta = self.parse_filename(file.name)
+            meta = self.input_meta(file.name)
 
             # Get the fuzzer name (and coverage)
             if meta is None:
@@ -279,9 +313,14 @@ class CampaignResult(object):
 
             items.append((fuzzer, statitem))
 
-            # Write the delta file
+            # Write the delta file (and index it)
+            data = statitem.json()
             with open(self.replay_delta_dir / (file.name+".json"), 'w') as f:
-                f.write(statitem.json())
+                f.write(data)
+            if self.metadata is not None:
+                self.metadata.add_replay_delta(file.name, fuzzer, statitem.time_elapsed, data)
+        if self.metadata is not None:
+            self.metadata.commit()
         return items
 
     def load_llvmprofile(self) -> None:
@@ -294,7 +333,7 @@ class CampaignResult(object):
         items = []
 
         for file in self._iter_sorted(self.replay_delta_dir):
-            meta = self.parse_filename(file.name)
+            meta = self.input_meta(file.name)
 
             # Get the fuzzer name (and coverage)
             if meta is None:
@@ -304,8 +343,16 @@ class CampaignResult(object):
 
             delta = InputCovDelta.parse_file(file)
             items.append((fuzzer, delta))
+            if self.metadata is not None:  # next loads use the index
+                self.metadata.add_replay_delta(delta.input_name, fuzzer, delta.time_elapsed, delta.json())
+        if self.metadata is not None:
+            self.metadata.commit()
         return items
 
+    def load_delta_index(self) -> List[Tuple[str, InputCovDelta]]:
+        logging.info("load delta index")
+        return [(fuzzer, InputCovDelta.parse_raw(delta)) for _, fuzzer, _, delta in self.metadata.iter_replay_deltas()]
+
     def load_delta(self, items: List[Tuple[str, InputCovDelta]]) -> None:
         self._all_items = [x[1] for x in items]
         self.fuzzers_items[self.SEED_FUZZER] = []
@@ -0,0 +1,427 @@
+# built-in imports
+import struct
+from pathlib import Path
+from itertools import chain
+from collections import Counter
+from typing import Collection, List, Tuple, Union
+
+# Third-party imports
+import numpy as np
+from tritondse import GlobalCoverage, CoverageSingleRun, CoverageStrategy, BranchSolvingStrategy
+from tritondse.coverage import CovItem
+
+# Local imports
+from pastisbroker.replay import coverage_from_json
+
+
+MIX = np.uint64(0x9E3779B97F4A7C15)  # multiplier hashing the source of an edge in its key
+
+
+def item_keys(items: np.ndarray) -> np.ndarray:
+    """
+    Compute the 64-bits keys of items.
+
+    :param items: items as a (n, 2) uint64 array (source and target of edges)
+    :return: keys as an uint64 array
+    """
+    return (items[:, 0] * MIX) ^ items[:, 1]
+
+
+class ItemTable(object):
+    """
+    Set of coverage items (with hit counts) held in NumPy arrays sorted by
+    key. Lookups are vectorized (binary search on keys then exact comparison
+    of items, keys colliding are resolved). Items are inserted in a small
+    delta table merged into the main one once it exceeds ``1/DELTA_RATIO``
+    of its size, so insertions do not copy the whole table.
+    """
+
+    DELTA_RATIO = 8
+    MIN_DELTA = 4096
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.items = np.empty((0, 2), dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.uint64)
+        self._delta = None  # ItemTable of items inserted since the last compaction
+
+    def __len__(self) -> int:
+        return len(self.keys) + (len(self._delta) if self._delta is not None else 0)
+
+    def _find(self, keys: np.ndarray, items: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.intp)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        same_key = self.keys[pos] == keys
+        found = same_key & (self.items[pos] == items).all(axis=1)
+        for i in np.nonzero(same_key & ~found)[0]:  # keys collision, look at all the items of that key
+            lo, hi = pos[i], np.searchsorted(self.keys, keys[i], side="right")
+            hits = np.nonzero((self.items[lo:hi] == items[i]).all(axis=1))[0]
+            if len(hits):
+                found[i], pos[i] = True, lo + hits[0]
+        return found, pos
+
+    def find(self, keys: np.ndarray, items: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up items in the table.
+
+        :param keys: keys of the items
+        :param items: items as a (n, 2) uint64 array
+        :return: whether each item is in the table, and its position in it (if so, to give to :py:meth:`add_counts`)
+        """
+        found, pos = self._find(keys, items)
+        if self._delta is not None and not found.all():
+            miss = ~found
+            d_found, d_pos = self._delta._find(keys[miss], items[miss])
+            found[miss] = d_found
+            pos[miss] = d_pos + len(self.keys)
+        return found, pos
+
+    def add_counts(self, pos: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Add hits to items of the table.
+
+        :param pos: positions of the items (as returned by :py:meth:`find`)
+        :param counts: hit counts to add
+        """
+        base = pos < len(self.keys)
+        np.add.at(self.counts, pos[base], counts[base])
+        if self._delta is not None:
+            np.add.at(self._delta.counts, pos[~base] - len(self.keys), counts[~base])
+
+    def _insert(self, keys: np.ndarray, items: np.ndarray, counts: np.ndarray) -> None:
+        order = np.argsort(keys, kind="stable")
+        keys, items, counts = keys[order], items[order], counts[order]
+        idx = np.searchsorted(self.keys, keys)
+        self.keys = np.insert(self.keys, idx, keys)
+        self.items = np.insert(self.items, idx, items, axis=0)
+        self.counts = np.insert(self.counts, idx, counts)
+
+    def add(self, keys: np.ndarray, items: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Insert items not already in the table.
+
+        :param keys: keys of the items
+        :param items: items as a (n, 2) uint64 array
+        :param counts: hit counts of the items
+        """
+        if not len(keys):
+            return
+        if self._delta is None:
+            self._delta = ItemTable()
+        self._delta._insert(keys, items, counts)
+        if len(self._delta) > max(self.MIN_DELTA, len(self.keys) // self.DELTA_RATIO):
+            self._insert(self._delta.keys, self._delta.items, self._delta.counts)
+            self._delta = None
+
+    def all_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get all the items of the table.
+
+        :return: items as a (n, 2) uint64 array and their hit counts
+        """
+        if self._delta is None:
+            return self.items, self.counts
+        return np.concatenate([self.items, self._delta.items]), np.concatenate([self.counts, self._delta.counts])
+
+
+class EdgeList(object):
+    """
+    Compact form of the coverage of a run: items covered with their hit
+    counts and items not covered, as uint64 arrays (blocks have a target of
+    0). Replay workers send it to the coverage manager serialized with
+    :py:meth:`to_bytes`, which is read back without copy. Instruction
+    coverage is not kept.
+
+    :param strategy: coverage strategy (EDGE or BLOCK)
+    :param items: items covered as a (n, 2) uint64 array
+    :param counts: hit counts of the items covered
+    :param not_covered: items not covered as a (m, 2) uint64 array
+    """
+
+    __slots__ = ("strategy", "items", "counts", "not_covered")
+
+    STRATEGIES = [CoverageStrategy.EDGE, CoverageStrategy.BLOCK]
+    HEADER = struct.Struct("<BQQ")  # strategy (index in STRATEGIES), number of items covered and not covered
+
+    def __init__(self, strategy: CoverageStrategy, items: np.ndarray, counts: np.ndarray, not_covered: np.ndarray):
+        self.strategy = strategy
+        self.items = items
+        self.counts = counts
+        self.not_covered = not_covered
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @staticmethod
+    def _to_array(strategy: CoverageStrategy, items: Collection[CovItem]) -> np.ndarray:
+        if strategy == CoverageStrategy.BLOCK:
+            arr = np.zeros((len(items), 2), dtype=np.uint64)
+            arr[:, 0] = np.fromiter(items, dtype=np.uint64, count=len(items))
+            return arr
+        return np.fromiter(chain.from_iterable(items), dtype=np.uint64, count=2 * len(items)).reshape(-1, 2)
+
+    @classmethod
+    def from_run(cls, run: CoverageSingleRun) -> 'EdgeList':
+        """
+        Convert the coverage of a run.
+
+        :param run: coverage of the run (EDGE or BLOCK strategy)
+        :return: edge list
+        """
+        if run.strategy not in cls.STRATEGIES:
+            raise ValueError(f"coverage strategy {run.strategy.name} not supported by {cls.__name__}")
+        return cls(run.strategy,
+                   cls._to_array(run.strategy, run.covered_items.keys()),
+                   np.fromiter(run.covered_items.values(), dtype=np.uint64, count=len(run.covered_items)),
+                   cls._to_array(run.strategy, run.not_covered_items))
+
+    @classmethod
+    def from_trace(cls, data: dict) -> 'EdgeList':
+        """
+        Build the edge list of a trace produced by QBDI (JSON decoded), without
+        creating the :py:class:`CoverageSingleRun` for the EDGE strategy.
+
+        :param data: trace (as written by the tritondse tracing script)
+        :return: edge list
+        """
+        strategy = CoverageStrategy[data["coverage_strategy"]]
+        if strategy != CoverageStrategy.EDGE:
+            return cls.from_run(coverage_from_json(data))
+        rows = data["covered_items"]  # (branch, taken, not taken or None if dynamic)
+        taken = np.fromiter(chain.from_iterable(r[:2] for r in rows), dtype=np.uint64, count=2 * len(rows)).reshape(-1, 2)
+        items, counts = np.unique(taken, axis=0, return_counts=True)
+        not_taken = [(r[0], r[2]) for r in rows if r[2] is not None]
+        not_covered = np.unique(np.array(not_taken, dtype=np.uint64).reshape(-1, 2), axis=0)
+        # Branches not taken are not covered if never taken in the whole run
+        table = ItemTable()
+        table._insert(item_keys(items), items, counts)
+        found, _ = table.find(item_keys(not_covered), not_covered)
+        return cls(strategy, items, counts.astype(np.uint64), not_covered[~found])
+
+    def to_run(self) -> CoverageSingleRun:
+        """
+        Convert back into a :py:class:`CoverageSingleRun`.
+        """
+        run = CoverageSingleRun(self.strategy)
+        if self.strategy == CoverageStrategy.BLOCK:
+            run.covered_items = Counter(dict(zip(self.items[:, 0].tolist(), self.counts.tolist())))
+            run.not_covered_items = set(self.not_covered[:, 0].tolist())
+        else:
+            run.covered_items = Counter(dict(zip(map(tuple, self.items.tolist()), self.counts.tolist())))
+            run.not_covered_items = set(map(tuple, self.not_covered.tolist()))
+        return run
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the edge list.
+        """
+        return (self.HEADER.pack(self.STRATEGIES.index(self.strategy), len(self.items), len(self.not_covered)) +
+                self.items.tobytes() + self.counts.tobytes() + self.not_covered.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'EdgeList':
+        """
+        Deserialize an edge list (arrays are read-only views of ``data``).
+        """
+        strat, n, m = cls.HEADER.unpack_from(data)
+        off = cls.HEADER.size
+        items = np.frombuffer(data, dtype=np.uint64, count=2 * n, offset=off).reshape(-1, 2)
+        counts = np.frombuffer(data, dtype=np.uint64, count=n, offset=off + 16 * n)
+        not_covered = np.frombuffer(data, dtype=np.uint64, count=2 * m, offset=off + 24 * n).reshape(-1, 2)
+        return cls(cls.STRATEGIES[strat], items, counts, not_covered)
+
+
+Run = Union[CoverageSingleRun, EdgeList]
+
+
+class BitmapCoverage(object):
+    """
+    Global coverage of edges (or blocks) held in NumPy arrays instead of
+    Python sets and dicts. A hashed bitmap of the items covered gives a fast
+    novelty check (an item hitting an empty slot is new), items hitting a
+    set slot are checked exactly against the table of items covered. It
+    provides the operations the coverage manager needs on a
+    :py:class:`GlobalCoverage` and converts losslessly to and from it (for
+    persistence and the benchmark tooling).
+
+    :param strategy: coverage strategy (EDGE or BLOCK)
+    :param branch_strategy: branch solving strategy (kept for conversions)
+    :param bits: log2 of the number of slots of the bitmap
+    """
+
+    STRATEGIES = [CoverageStrategy.EDGE, CoverageStrategy.BLOCK]
+
+    def __init__(self, strategy: CoverageStrategy = CoverageStrategy.EDGE,
+                 branch_strategy: BranchSolvingStrategy = BranchSolvingStrategy.ALL_NOT_COVERED, bits: int = 20):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"coverage strategy {strategy.name} not supported by {self.__class__.__name__}")
+        self.strategy = strategy
+        self.branch_strategy = branch_strategy
+        self._mask = np.uint64((1 << bits) - 1)
+        self._bitmap = np.zeros(1 << bits, dtype=np.uint8)
+        self._covered = ItemTable()
+        self._not_covered = ItemTable()  # counts unused
+        # Kept as is for lossless conversions (not used by the broker)
+        self.covered_instructions = Counter()
+        self.pending_coverage = set()
+        self.uncoverable_items = {}
+        self.covered_symbolic_pointers = set()
+
+    @property
+    def unique_covitem_covered(self) -> int:
+        """
+        :return: The number of unique items covered
+        """
+        return len(self._covered)
+
+    def _to_array(self, items: Collection[CovItem]) -> np.ndarray:
+        return EdgeList._to_array(self.strategy, items)
+
+    def _to_covitems(self, items: np.ndarray) -> List[CovItem]:
+        if self.strategy == CoverageStrategy.BLOCK:
+            return items[:, 0].tolist()
+        return [tuple(x) for x in items.tolist()]
+
+    def _covered_arrays(self, run: Run) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if run.strategy != self.strategy:
+            raise ValueError(f"coverage strategy mismatch: {run.strategy.name} (expected {self.strategy.name})")
+        if isinstance(run, EdgeList):
+            return item_keys(run.items), run.items, run.counts
+        items = self._to_array(run.covered_items.keys())
+        counts = np.fromiter(run.covered_items.values(), dtype=np.uint64, count=len(run.covered_items))
+        return item_keys(items), items, counts
+
+    def _new_mask(self, keys: np.ndarray, items: np.ndarray) -> np.ndarray:
+        maybe = self._bitmap[(keys & self._mask).astype(np.intp)].astype(bool)
+        new = ~maybe
+        if maybe.any():
+            found, _ = self._covered.find(keys[maybe], items[maybe])
+            new[maybe] = ~found
+        return new
+
+    def improve_coverage(self, run: Run) -> bool:
+        """
+        Check whether a run covers items not covered yet.
+
+        :param run: coverage of the run
+        :return: True if the run covers new items
+        """
+        keys, items, _ = self._covered_arrays(run)
+        return bool(self._new_mask(keys, items).any())
+
+    def new_items(self, run: Run) -> List[CovItem]:
+        """
+        Get the items covered by a run and not covered yet.
+
+        :param run: coverage of the run
+        :return: new items (as in :py:attr:`CoverageSingleRun.covered_items`)
+        """
+        keys, items, _ = self._covered_arrays(run)
+        return self._to_covitems(items[self._new_mask(keys, items)])
+
+    def merge(self, run: Run) -> None:
+        """
+        Merge the coverage of a run (same semantic as :py:meth:`GlobalCoverage.merge`).
+
+        :param run: coverage of the run
+        """
+        keys, items, counts = self._covered_arrays(run)
+        self._merge_arrays(keys, items, counts)
+
+        self._merge_not_covered(run)
+
+    def _merge_arrays(self, keys: np.ndarray, items: np.ndarray, counts: np.ndarray) -> None:
+        found, pos = self._covered.find(keys, items)
+        self._covered.add_counts(pos[found], counts[found])
+        self._covered.add(keys[~found], items[~found], counts[~found])
+        self._bitmap[(keys & self._mask).astype(np.intp)] = 1
+
+    def _merge_not_covered(self, run: Run) -> None:
+        if isinstance(run, EdgeList):
+            items = run.not_covered
+        else:
+            items = self._to_array(run.not_covered_items)
+            self.covered_instructions.update(run.covered_instructions)
+        if len(items):
+            keys = item_keys(items)
+            keep = self._new_mask(keys, items) & ~self._not_covered.find(keys, items)[0]
+            self._not_covered.add(keys[keep], items[keep], np.zeros(int(keep.sum()), dtype=np.uint64))
+
+        if self.pending_coverage:
+            self.pending_coverage.difference_update(self._to_covitems(run.items) if isinstance(run, EdgeList) else run.covered_items)
+
+    def update(self, run: Run) -> List[CovItem]:
+        """
+        Merge the coverage of a run if it covers new items (what
+        :py:meth:`new_items` then :py:meth:`merge` do, converting the run once).
+
+        :param run: coverage of the run
+        :return: new items (as in :py:attr:`CoverageSingleRun.covered_items`), empty if the run was not merged
+        """
+        keys, items, counts = self._covered_arrays(run)
+        new = self._new_mask(keys, items)
+        if not new.any():
+            return []
+        new_items = self._to_covitems(items[new])
+        self._merge_arrays(keys, items, counts)
+        self._merge_not_covered(run)
+        return new_items
+
+    def is_covered(self, item: CovItem) -> bool:
+        """
+        Return whether the item has been covered or not.
+
+        :param item: an edge or an address (according to the strategy)
+        """
+        items = self._to_array([item])
+        return not self._new_mask(item_keys(items), items)[0]
+
+    @classmethod
+    def from_global(cls, coverage: GlobalCoverage, bits: int = 20) -> 'BitmapCoverage':
+        """
+        Create a bitmap coverage holding the same data as a global coverage.
+
+        :param coverage: global coverage
+        :param bits: log2 of the number of slots of the bitmap
+        :return: bitmap coverage
+        """
+        cov = cls(coverage.strategy, coverage.branch_strategy, bits)
+        cov.merge(coverage)
+        items = cov._to_array(coverage.not_covered_items)  # as is (even items covered since)
+        cov._not_covered = ItemTable()
+        cov._not_covered.add(item_keys(items), items, np.zeros(len(items), dtype=np.uint64))
+        cov.covered_instructions = Counter(coverage.covered_instructions)
+        cov.pending_coverage = set(coverage.pending_coverage)
+        cov.uncoverable_items = dict(coverage.uncoverable_items)
+        cov.covered_symbolic_pointers = set(coverage.covered_symbolic_pointers)
+        return cov
+
+    def to_global(self) -> GlobalCoverage:
+        """
+        Convert the coverage into a :py:class:`GlobalCoverage`.
+
+        :return: global coverage holding the same data
+        """
+        cov = GlobalCoverage(self.strategy, self.branch_strategy)
+        items, counts = self._covered.all_items()
+        cov.covered_items = Counter(dict(zip(self._to_covitems(items), counts.tolist())))
+        cov.not_covered_items = set(self._to_covitems(self._not_covered.all_items()[0]))
+        cov.covered_instructions = Counter(self.covered_instructions)
+        cov.pending_coverage = set(self.pending_coverage)
+        cov.uncoverable_items = dict(self.uncoverable_items)
+        cov.covered_symbolic_pointers = set(self.covered_symbolic_pointers)
+        return cov
+
+    @classmethod
+    def from_file(cls, file: Union[str, Path], bits: int = 20) -> 'BitmapCoverage':
+        """
+        Load a coverage saved with :py:meth:`to_file` (or by :py:meth:`GlobalCoverage.to_file`).
+        """
+        return cls.from_global(GlobalCoverage.from_file(file), bits)
+
+    def to_file(self, file: Union[str, Path]) -> None:
+        """
+        Save the coverage (in the :py:class:`GlobalCoverage` format).
+        """
+        self.to_global().to_file(file)
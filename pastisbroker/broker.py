@@ -1,22 +1,25 @@
 # built-in imports
+import re
+import base64
 import hashlib
 import logging
-from typing import Generator, List, Optional, Union
+from typing import Dict, Generator, List, Optional, Union
 from pathlib import Path
 import time
 from hashlib import md5
-from enum import Enum
 from collections import Counter
 import datetime
 import random
 import queue
+import threading
 
 # Third-party imports
 import psutil
-from libpastis import BrokerAgent, FuzzingEngineDescriptor, EngineConfiguration, BinaryPackage, SASTReport, ClientAgent
+from libpastis import BrokerAgent, FuzzingEngineDescriptor, EngineConfiguration, BinaryPackage, SASTReport, ClientAgent, ReplayCache
 from libpastis.types import SeedType, FuzzingEngineInfo, LogLevel, Arch, State, SeedInjectLoc, CheckMode, CoverageMode, \
-                            ExecMode, AlertData, PathLike, Platform, FuzzMode
+                            ExecMode, AlertData, PathLike, Platform, FuzzMode, SeedRecord
 from libpastis.utils import get_local_architecture
+from libpastis.dispatch import DispatchPolicy
 import lief
 from tritondse import QuokkaProgram
 
@@ -26,23 +29,26 @@ from pastisbroker.stat_manager import StatManager
 from pastisbroker.workspace import Workspace, WorkspaceStatus
 from pastisbroker.utils import load_engine_descriptor, Bcolors, COLORS
 from pastisbroker.coverage import CoverageManager, ClientInput
+from pastisbroker.seed_pool import SeedPool
+from pastisbroker.corpus_writer import CorpusWriter, FsyncPolicy
+from pastisbroker.metadata import MetadataIndex
+from pastisbroker.broking import BrokingMode, mk_router
+from pastisbroker.replay import ReplayBackend
 
 
 lief.logging.disable()
 
 
-class BrokingMode(Enum):
-    FULL = 1              # Transmit all seeds to all peers
-    NO_TRANSMIT = 2       # Does not transmit seed to peers (for comparing perfs of tools against each other)
-
-
-
-
 class PastisBroker(BrokerAgent):
 
     PROXY_NETID = b"PROXY"
     PROXY_ID = "PROXY"
 
+    CHECKPOINT_VERSION = 1
+    WATCHDOG_PERIOD = 60  # seconds between two memory usage checks
+    RESUME_DELAY = 60     # seconds clients checkpointed have to come back after a restart
+    SMALL_SEED = 4096     # seeds up to this size are favored in clients backlogs
+
     def __init__(self, workspace: PathLike,
                  binaries_dir: PathLike,
                  broker_mode: BrokingMode,
@@ -55,16 +61,34 @@ class PastisBroker(BrokerAgent):
                  filter_inputs: bool = False,
                  stream: bool = False,
                  replay_threads: int = 4,
-                 replay_timeout: int = 60):
-        super(PastisBroker, self).__init__()
+                 replay_timeout: int = 60,
+                 seed_batch: int = 1,
+                 dispatch_workers: int = 4,
+                 drop_on_overload: bool = False,
+                 heartbeat_timeout: float = 30,
+                 seed_cache_size: int = 64 * 1024 * 1024,
+                 checkpoint_interval: int = 300,
+                 fsync: FsyncPolicy = FsyncPolicy.NONE,
+                 packed_corpus: bool = False,
+                 gossip_fanout: int = 3,
+                 replay_backend: ReplayBackend = ReplayBackend.PROCESS,
+                 replay_cache_size: int = 512 * 1024 * 1024):
+        super(PastisBroker, self).__init__(seed_batch_size=seed_batch,
+                                           dispatch_workers=dispatch_workers,
+                                           dispatch_policy=DispatchPolicy.DROP if drop_on_overload else DispatchPolicy.BLOCK,
+                                           heartbeat_timeout=heartbeat_timeout)
+
+        # Callbacks of different clients run concurrently, shared state is protected by this lock
+        self._lock = threading.RLock()
 
         # Initialize workspace
-        self.workspace = Workspace(Path(workspace))
+        self.workspace = Workspace(Path(workspace), packed=packed_corpus)
         params = {"binaries_dir": str(Path(binaries_dir).absolute()),
                   "broker_mode": broker_mode.name,
                   "check_mode": check_mode.name,
                   "inject_loc": inject_loc.name,
-                  "argvs": p_argv}
+                  "argvs": p_argv,
+                  "gossip_fanout": gossip_fanout}
         self.workspace.initialize_runtime(binaries_dir, params)
 
         self._configure_logging()
@@ -74,6 +98,7 @@ class PastisBroker(BrokerAgent):
 
         # Init internal state
         self.broker_mode = broker_mode
+        self._router = mk_router(broker_mode, gossip_fanout)  # selects peers seeds are sent to
         self.ck_mode = check_mode
         self.inject = inject_loc
         self.argv = [] if p_argv is None else p_argv
@@ -98,16 +123,25 @@ class PastisBroker(BrokerAgent):
 
         # Runtime infos
         self._running = False
-        self._seed_pool = {}  # Seed bytes -> SeedType
-        self._init_seed_pool = {}  # Used for NO_TRANSMIT mode
+        self._corpus_writer = CorpusWriter(self.workspace, fsync=fsync)  # Seeds are written asynchronously
+        self._seed_pool = SeedPool(seed_cache_size, self._corpus_writer.read)  # Seed id -> SeedType (bodies on disk)
+        self._init_seed_pool = {}  # Seed id -> SeedType, used for NO_TRANSMIT mode
         self._start_time = None
         self._stop = False
+        self._shut_down = False  # whether stop_broker has been called
+        self._loop_event = threading.Event()  # set when the main loop (run) has work to do
 
-        # Load the workspace seeds
-        self._load_workspace()
+        # Checkpoint of the broker state (for warm restarts)
+        self._checkpoint_interval = checkpoint_interval  # seconds (0 disables checkpoints)
+        self._restored_clients = {}  # "hostname|engine" -> states of clients checkpointed, not yet back
+        self._restored_id_count = 0  # number of seed ids allocated when the checkpoint was saved
+        self._resume_deadline = None  # time after which clients checkpointed are considered lost
+
+        # Index of the campaign metadata (seeds, replays, telemetry, alerts)
+        self.metadata = MetadataIndex(self.workspace.metadata_file)
 
         # Create the stat manager
-        self.statmanager = StatManager(self.workspace)
+        self.statmanager = StatManager(self.workspace, self.metadata)
 
         # Watchdog to monitor RAM usage
         self.watchdog = None
@@ -131,9 +165,19 @@ class PastisBroker(BrokerAgent):
             if (path := self.find_vanilla_binary()) is not None:  # Find an executable suitable for coverage
                 logging.info(f"Coverage binary: {path}")
                 stream_file = self.workspace.coverage_history if stream else ""
-                self._coverage_manager = CoverageManager(replay_threads, replay_timeout, filter_inputs, path, self.argv, self.inject, stream_file)
+                # Coverages of replays are kept in the workspace (not replayed again on restart)
+                cache = ReplayCache(self.workspace.replay_cache_directory, replay_cache_size) if replay_cache_size else None
+                self._coverage_manager = CoverageManager(replay_threads, replay_timeout, filter_inputs, path, self.argv, self.inject, stream_file,
+                                                         self.metadata, replay_backend, cache)
+                self._coverage_manager.register_granted_callback(self.wake_main_loop)
             else:
                 logging.warning("filtering or stream enabled but cannot find vanilla binary")
+        if broker_mode == BrokingMode.CROSS_ENGINE and not (self._coverage_manager and filter_inputs):
+            logging.warning("cross-engine broking mode without input filtering: edges of seeds unknown, seeds sent to all peers")
+
+        # Restore the last checkpoint (if any) and load the workspace seeds
+        self._restore_checkpoint()
+        self._load_workspace()
 
 
     def find_vanilla_binary(self) -> Optional[str]:
@@ -197,111 +241,262 @@ class PastisBroker(BrokerAgent):
         return v
 
     def _register_all(self):
-        self.register_seed_callback(self.seed_received)
-        self.register_hello_callback(self.hello_received)
-        self.register_log_callback(self.log_received)
-        self.register_telemetry_callback(self.telemetry_received)
-        self.register_stop_coverage_callback(self.stop_coverage_received)
-        self.register_data_callback(self.data_received)
+        self.register_seed_callback(self.seed_received)  # takes the lock itself (files are written concurrently)
+        self.register_hello_callback(self._locked(self.hello_received))
+        self.register_log_callback(self.log_received)  # only writes in the client log
+        self.register_telemetry_callback(self._locked(self.telemetry_received))
+        self.register_stop_coverage_callback(self._locked(self.stop_coverage_received))
+        self.register_data_callback(self._locked(self.data_received))
+        self.register_client_lost_callback(self._locked(self.client_lost))
+        self.register_seed_reader(self._read_pooled_seed)  # seeds pulled are read back from the pool
+
+    def _read_pooled_seed(self, digest: bytes) -> Optional[bytes]:
+        return self._seed_pool.get(self._seed_pool.seed_id(digest))
+
+    def _locked(self, fun):
+        def wrapper(*args):
+            with self._lock:
+                return fun(*args)
+        return wrapper
 
     def get_client(self, cli_id: bytes) -> Optional[PastisClient]:
         cli = self.clients.get(cli_id)
         if not cli:
+            if self._awaiting_clients():  # messages queued by a client reconnecting, its HELLO follows
+                logging.debug(f"client '{cli_id}' unknown (ignored, waiting clients to come back)")
+                return None
             logging.warning(f"client '{cli_id}' unknown (send stop)")
-            if cli.netid != self.PROXY_NETID:
+            if cli_id != self.PROXY_NETID:
                 self.send_stop(cli_id)
         return cli
 
+    def _awaiting_clients(self) -> bool:
+        """
+        Whether clients checkpointed are still expected to come back. Once
+        :py:attr:`RESUME_DELAY` seconds elapsed since the start, those that
+        did not are forgotten.
+        """
+        if self._restored_clients and self._resume_deadline is not None and time.time() > self._resume_deadline:
+            count = sum(len(x) for x in self._restored_clients.values())
+            logging.warning(f"{count} client(s) checkpointed did not come back: {', '.join(self._restored_clients)}")
+            self._restored_clients.clear()
+        return bool(self._restored_clients)
+
     def kick_client(self, cli_id: bytes) -> None:
-        cli = self.clients.pop(cli_id)  # pop it from client list
+        with self._lock:
+            cli = self.clients.pop(cli_id)  # pop it from client list
+        self.forget_client(cli_id)
         logging.info(f"kick client: {cli.strid}")
         self.send_stop(cli_id)
 
+    def client_lost(self, cli_id: bytes, silence: float) -> None:
+        """
+        Called when a client stopped sending heartbeats. Remove it from the
+        clients, and rebalance engines if it was running one.
+
+        :param cli_id: netid of the client lost
+        :param silence: seconds elapsed since its last message
+        """
+        cli = self.clients.pop(cli_id, None)
+        if cli is None:
+            return
+        count = len(cli._seeds_received) + len(cli._seeds_submitted)
+        freed = cli._seeds_received.nbytes + cli._seeds_submitted.nbytes
+        logging.warning(f"client {cli.strid} lost: detected after {silence:.1f}s of silence, "
+                        f"seed sets freed: {count} entries ({freed} bytes)")
+        for clis in self._slicing_ongoing.get(cli.package_name, {}).values():
+            if cli in clis:
+                clis.remove(cli)
+        if cli.is_running() and self.running:
+            self.rebalance_engines()
+
+    def rebalance_engines(self) -> None:
+        """
+        Restart a client running the most used engine on the least used
+        one, if the gap between both is more than one instance (e.g: when
+        the only client running an engine is lost).
+        """
+        running = [c for c in self.clients.values() if c.is_running() and c.netid != self.PROXY_NETID]
+        engines = Counter({e: 0 for e in self.engines})
+        engines.update(c.engine.NAME for c in running)
+        if not engines:
+            return
+        least, most = engines.most_common()[-1], engines.most_common()[0]
+        if most[1] - least[1] < 2:
+            return
+        for cli in running:
+            if cli.engine.NAME == most[0] and cli.is_supported_engine(self.engines[least[0]]):
+                logging.info(f"rebalance engines: relaunch {cli.strid} ({most[0]}: {most[1]}, {least[0]}: {least[1]})")
+                cli.set_stopped()  # not counted when selecting its new engine
+                self.start_client_and_send_corpus(cli)
+                return
+
     def seed_received(self, cli_id: bytes, typ: SeedType, seed: bytes):
+        self.seed_record_received(cli_id, SeedRecord(typ, seed))
+
+    def seed_record_received(self, cli_id: bytes, rec: SeedRecord):
+        """
+        Handle a seed sent by a client. The seed is hashed only once
+        (the digest is kept in the record passed along). The seed is
+        queued to the corpus writer once the lock is released (it blocks
+        when the writer lags behind), it is readable from the pool meanwhile.
+
+        :param cli_id: netid of the client
+        :param rec: seed received
+        """
         cli = self.get_client(cli_id)
         if not cli:
             return
-        is_new = seed not in self._seed_pool
-        h = md5(seed).hexdigest()
+        typ, seed = rec.typ, rec.content
+        h = rec.hexdigest
+        seed_id = self._seed_pool.seed_id(rec.digest)
+        fname = self.mk_input_name(cli.strid, rec)
 
-        # Show log message and save seed to file
-        self.statmanager.update_seed_stat(cli, typ)  # Add info only if new
-        cli.log(LogLevel.INFO, f"seed {h} [{cli.strid}][{self._colored_seed_type(typ)}][{self._colored_seed_newness(is_new)}]")
-        cli.add_own_seed(seed)  # Add seed in client's seed
-        fname = self.write_seed(typ, cli.strid, seed) # Write seed to file
+        with self._lock:
+            is_new = seed_id not in self._seed_pool
+            self.statmanager.update_seed_stat(cli, typ)  # Add info only if new
+            cli.add_own_seed(seed_id)  # Add seed in client's seed
 
-        if is_new:
-            if self.is_proxied and not cli.strid == self.PROXY_ID:  # Directly forward to proxy if not proxy
-                self._clis_to_proxy.put((cli.netid, typ, seed))
+            if is_new:
+                path = self._corpus_writer.hold_seed(typ, fname, seed)  # Readable until written (queued below)
+
+                if self.is_proxied and not cli.strid == self.PROXY_ID:  # Directly forward to proxy if not proxy
+                    self._clis_to_proxy.put((cli.netid, typ, seed))
+                    self.wake_main_loop()
+
+                if self._coverage_manager:  # True if filter_is_activated
+                    self.push_input_filtering(cli.netid, cli.strid, fname, rec)
 
-            if self._coverage_manager:  # True if filter_is_activated
-                self.push_input_filtering(cli.netid, cli.strid, fname, seed, typ)
+                if not self.filter_inputs:  # If seed are not filtered send it right away
+                    self.seed_granted(cli.netid, rec, path)
+            self.metadata.add_seed(fname, h, typ, cli.strid, time.time() - self._start_time, is_new)
 
-            if not self.filter_inputs:  # If seed are not filtered send it right away
-                self.seed_granted(cli.netid, typ, seed)
+        if is_new:
+            self._corpus_writer.put_seed(typ, fname, seed)  # Write seed to file (asynchronously)
         else:
+            self._corpus_writer.put_duplicate(typ, fname)  # Only recorded (the seed is already in the corpus)
+
+        # Show log message
+        cli.log(LogLevel.INFO, f"seed {h} [{cli.strid}][{self._colored_seed_type(typ)}][{self._colored_seed_newness(is_new)}]")
+        if not is_new:
             logging.debug(f"receive duplicate seed {h} by {cli.strid}")
 
-    def push_input_filtering(self, netid: bytes, id: str, fname: str, seed: bytes, typ: SeedType) -> None:
+    def push_input_filtering(self, netid: bytes, id: str, fname: str, rec: SeedRecord) -> None:
         sp = fname.split("_")
-        covi = ClientInput(seed, "", f"{sp[0]}_{sp[1]}", sp[2], md5(seed).hexdigest(),
-                           fname, typ, netid, id, "GRANTED", "", -1, [])
+        covi = ClientInput(rec.content, "", f"{sp[0]}_{sp[1]}", sp[2], rec.hexdigest,
+                           fname, rec.typ, netid, id, "GRANTED", "", -1, [])
         self._coverage_manager.push_input(covi)
 
-    def seed_granted(self, cli_id: bytes, typ: SeedType, seed: bytes):
-        # Save it in the local pool
-        self._seed_pool[seed] = typ
-        if cli_id == b"PROXY":
-            self._init_seed_pool[seed] = typ
+    def seed_granted(self, cli_id: bytes, rec: SeedRecord, path: Path = None, edges: list = None):
+        typ, seed = rec.typ, rec.content
+        seed_id = self._seed_pool.seed_id(rec.digest)
+        with self._lock:
+            # Save it in the local pool (the body stays on disk if written in the workspace)
+            self._seed_pool.add(seed_id, typ, path, seed)
+            if cli_id == b"PROXY":
+                self._init_seed_pool[seed_id] = typ
 
-        # Iterate on all clients and send it to whomever never received it
-        if self.broker_mode == BrokingMode.FULL:
-            self.send_seed_to_all_others(cli_id, typ, seed)
+            # Send it to the peers selected by the broking mode (that never received it)
+            self.send_seed_to_peers(cli_id, rec, seed_id, edges)
 
-    def send_seed_to_all_others(self, origin_id: bytes, typ: SeedType, seed: bytes) -> None:
+    def send_seed_to_peers(self, origin_id: bytes, rec: SeedRecord, seed_id: int, edges: list = None) -> None:
+        """
+        Send a seed granted to the peers of its origin selected by the broking
+        mode. Clients not started yet and the proxy are not subject to the
+        mode (the former receive the pool when started).
+
+        :param origin_id: netid of the client which sent the seed
+        :param rec: seed
+        :param seed_id: seed id
+        :param edges: items newly covered by the seed (if computed)
+        """
+        if not self._router.TRANSMIT:
+            self._router.route(None, [])
+            return
+        peers, others = [], []
         for c in self.iter_other_clients(origin_id):
-            self.send_seed_to(c, typ, seed)
+            (peers if c.is_running() and c.netid != self.PROXY_NETID else others).append(c)
+        origin = self.clients.get(origin_id)
+        for c in others + self._router.route(origin, peers, edges):
+            self.send_seed_to(c, rec.typ, rec.content, seed_id, self._seed_priority(origin, c, rec, edges))
 
-    def send_seed_to(self, cli: PastisClient, typ: SeedType, seed: bytes) -> None:
-        if cli.is_new_seed(seed):
+    def _seed_priority(self, origin: Optional[PastisClient], cli: PastisClient, rec: SeedRecord, edges: list = None) -> int:
+        """
+        Priority level of a seed in the backlog of a client (used when the
+        client is out of credits, the seed type is ranked first by the backlog).
+        Seeds covering the most new edges come first (by buckets of 1, 4, 16
+        edges and more), then seeds coming from another engine than the
+        client's one, then small seeds. Only clients advertising a seed window
+        (TritonDSE) are held back, other engines import seeds as they come.
+
+        :return: level from 0 to ``SeedBacklog.LEVELS - 1``
+        """
+        new_edges = min((len(edges).bit_length() + 1) // 2, 3) if edges else 0  # 0, 1-3, 4-15, 16+
+        other_engine = origin is not None and origin.engine is not None and cli.engine is not None \
+                       and origin.engine.NAME != cli.engine.NAME
+        return 4 * new_edges + 2 * other_engine + (len(rec) <= self.SMALL_SEED)
+
+    def send_seed_to_all_others(self, origin_id: bytes, typ: SeedType, seed: bytes, seed_id: int = None) -> None:
+        seed_id = self._seed_pool.seed_id(md5(seed).digest()) if seed_id is None else seed_id
+        for c in self.iter_other_clients(origin_id):
+            self.send_seed_to(c, typ, seed, seed_id)
+
+    def send_seed_to(self, cli: PastisClient, typ: SeedType, seed: bytes, seed_id: int = None, priority: int = 0) -> None:
+        seed_id = self._seed_pool.seed_id(md5(seed).digest()) if seed_id is None else seed_id
+        if cli.is_new_seed(seed_id):
             if cli.netid == self.PROXY_NETID:
                 self._proxy.send_seed(typ, seed)
             else:
-                self.send_seed(cli.netid, typ, seed)  # send the seed to the client
-            cli.add_peer_seed(seed)  # Add it in its list of seed
+                # send the seed to the client (ranked if held back)
+                self.send_seed(cli.netid, typ, seed, priority, self._seed_pool.digest(seed_id))
+            self._router.seed_sent(cli, len(seed))
+            cli.add_peer_seed(seed_id)  # Add it in its list of seed
 
     def add_seed_file(self, file: PathLike, initial: bool = False) -> None:
         p = Path(file)
         logging.info(f"Add seed {p.name} in pool")
         # Save seed in the workspace
-        self.workspace.save_seed_file(SeedType.INPUT, p, initial)
+        out = self.workspace.save_seed_file(SeedType.INPUT, p, initial)
 
-        seed = p.read_bytes()
-        self._seed_pool[seed] = SeedType.INPUT
+        seed_id = self._seed_pool.seed_id(md5(p.read_bytes()).digest())
+        self._seed_pool.add(seed_id, SeedType.INPUT, out)
         if initial:
-            self._init_seed_pool[seed] = SeedType.INPUT
+            self._init_seed_pool[seed_id] = SeedType.INPUT
 
     def write_seed(self, typ: SeedType, cli_id: str, seed: bytes) -> str:
-        fname = self.mk_input_name(cli_id, seed)
-        self.workspace.save_seed(typ, fname, seed)
+        fname = self.mk_input_name(cli_id, SeedRecord(typ, seed))
+        self._corpus_writer.put_seed(typ, fname, seed)
         return fname
 
-    def mk_input_name(self, cli_id: str, seed: bytes) -> str:
+    def mk_input_name(self, cli_id: str, rec: SeedRecord) -> str:
         t = time.strftime("%Y-%m-%d_%H:%M:%S", time.localtime())
         elapsed = str(datetime.timedelta(seconds=time.time() - self._start_time)).replace(" day, ", "d:").replace(" days, ", "d:")
-        return f"{t}_{elapsed}_{cli_id}_{md5(seed).hexdigest()}.cov"
+        return f"{t}_{elapsed}_{cli_id}_{rec.hexdigest}.cov"
 
-    def hello_received(self, cli_id: bytes, engines: List[FuzzingEngineInfo], arch: Arch, cpus: int, memory: int, hostname: str, platform: Platform):
+    def hello_received(self, cli_id: bytes, engines: List[FuzzingEngineInfo], arch: Arch, cpus: int, memory: int, hostname: str, platform: Platform,
+                       running_engine: Optional[FuzzingEngineInfo] = None):
         uid = self.new_uid()
         client = PastisClient(uid, cli_id, engines, arch, cpus, memory, hostname, platform)
         logging.info(f"[{client.strid}] [HELLO] Name:{hostname} Arch:{arch.name} engines:{[x.name for x in engines]} (cpu:{cpus}, mem:{memory})")
-        self.clients[client.netid] = client
 
         # Load engines if they are not (lazy loading)
         for eng in engines:
             if eng.name not in self.engines:
                 self.load_engine_addon(eng.pymodule)
 
+        if running_engine is not None:  # The client reconnected with its engine still running
+            states = self._restored_clients.get(f"{hostname}|{running_engine.name}") if self._awaiting_clients() else None
+            if not states or running_engine.name not in self.engines:
+                logging.warning(f"[{client.strid}] engine {running_engine.name} running but client not checkpointed (send stop)")
+                self.send_stop(cli_id)
+                return
+            self.clients[client.netid] = client
+            self._resume_client(client, self.engines[running_engine.name], states.pop(0))
+            if not states:
+                self._restored_clients.pop(f"{hostname}|{running_engine.name}")
+            return
+
+        self.clients[client.netid] = client
         if self.running:  # A client is coming in the middle of a session
             if self._startup_quorum:
                 self._current_quorum += 1
@@ -317,10 +512,52 @@ class PastisBroker(BrokerAgent):
         else:
             pass  # Client connection is kept in clients dict for later
 
-    def _transmit_pool(self, client, pool) -> None:
-        for seed, typ in pool.items():
-            self.send_seed(client.netid, typ, seed)  # necessarily a new seed
-            client.add_peer_seed(seed)  # Add it in its list of seed
+    def _resume_client(self, client: PastisClient, engine: FuzzingEngineDescriptor, state: Dict) -> None:
+        """
+        Resume a client checkpointed, whose engine kept running while the
+        broker restarted: it is not sent START again, it gets back the seeds
+        it knew and is only sent the seeds with ids allocated since the
+        checkpoint.
+
+        :param client: client that said HELLO again
+        :param engine: engine running on the client
+        :param state: state of the client saved by :py:meth:`checkpoint`
+        """
+        client.set_running(state["program"], engine, CoverageMode(state["coverage_mode"]), ExecMode[state["exec_mode"]],
+                           CheckMode[state["check_mode"]], state["engine_args"])
+        client.restore_seeds(base64.b64decode(state["received"]), base64.b64decode(state["submitted"]))
+        if state["target"] is not None:
+            client.target = state["target"]
+            targets = self._slicing_ongoing.get(client.package_name, {})
+            if client.target in targets:
+                targets[client.target].append(client)
+        client.configure_logger(self.workspace.log_directory, random.choice(COLORS))
+        logging.info(f"resume client {client.strid}: {client.package_name} [{engine.NAME}, {client.coverage_mode.name}, "
+                     f"{client.exec_mode.name}] knowing {client.seed_received_count} seeds received")
+
+        if self._router.TRANSMIT:
+            self._transmit_pool(client, start=self._restored_id_count)
+        else:
+            self._transmit_pool(client, self._init_seed_pool, start=self._restored_id_count)
+
+    def _transmit_pool(self, client, pool: Dict[int, SeedType] = None, start: int = 0) -> None:
+        """
+        Send a client all the seeds of the pool it does not know yet.
+
+        :param client: client to send seeds to
+        :param pool: subset of the pool to consider (seed id -> type), None for the whole pool
+        :param start: first seed id to consider (lower ones are not sent)
+        """
+        for seed_id in client.unseen_seeds(self._seed_pool.id_count, start):
+            typ = self._seed_pool.seed_type(seed_id) if pool is None else pool.get(seed_id)
+            if typ is None:  # not granted, or not part of the given pool
+                continue
+            seed = self._seed_pool.get(seed_id)  # read from disk if not cached
+            if seed is None:
+                continue
+            self.send_seed(client.netid, typ, seed, digest=self._seed_pool.digest(seed_id))  # necessarily a new seed
+            self._router.seed_sent(client, len(seed))
+            client.add_peer_seed(seed_id)  # Add it in its list of seed
 
     def log_received(self, cli_id: bytes, level: LogLevel, message: str):
         client = self.get_client(cli_id)
@@ -348,6 +585,7 @@ class PastisBroker(BrokerAgent):
         self.statmanager.set_coverage_edge(client, coverage_edge)
         self.statmanager.set_coverage_path(client, coverage_path)
         self.statmanager.set_last_coverage_update(client, last_cov_update)
+        self.statmanager.set_seed_backlog(client, **self.seed_backlog_stats(cli_id))
         self.statmanager.update_telemetry_client(client)
         # NOTE: Send an update signal for future UI ?
 
@@ -401,14 +639,16 @@ class PastisBroker(BrokerAgent):
 
         # Save systematically the AlertData received
         self._save_alert_seed(client, alert_data)  # Also save seed in separate folder
+        self.metadata.add_alert_event(alert.id, client.strid, alert_data.covered, alert_data.validated, first_cov, first_val)
 
         if first_cov or first_val:
             cov, val, tot = self.sast_report.get_stats()
             logging.info(f"SAST results updated: defaults: [covered:{cov}/{tot}] [validated:{val}/{tot}]")
 
-        # If all alerts are validated send a stop to everyone
+        # If all alerts are validated stop the campaign (from the main loop, callbacks still run meanwhile)
         if self.sast_report.all_alerts_validated():
-            self.stop_broker()
+            self._stop = True
+            self.wake_main_loop()
 
     def relaunch_clients(self, clients):
         for cli in clients:
@@ -417,18 +657,34 @@ class PastisBroker(BrokerAgent):
             self.start_client_and_send_corpus(cli)
 
     def stop_broker(self):
+        if self._shut_down:  # already stopped
+            return
+        self._shut_down = True
         for client in self.clients.values():
             logging.info(f"Send stop to {client.strid}")
             if client.netid != self.PROXY_NETID:
                 self.send_stop(client.netid)
-        self._stop = True
+
+        # Stop receiving messages (once the callbacks of those already received returned)
+        self.stop()
 
         # Stop coverage manager if any
         if self._coverage_manager:
             self._coverage_manager.stop()
 
+        if self._checkpoint_interval:
+            self.checkpoint()
+
+        # Write the seeds still queued
+        self._corpus_writer.stop()
+        logging.info(f"corpus writer: {self._corpus_writer.stats()}")
+        if self.workspace.pack is not None:
+            self.workspace.pack.close()  # nothing is appended anymore
+
         # Call the statmanager to wrap-up values
         self.statmanager.post_execution(list(self.clients.values()), self.workspace)
+        self.save_broking_stats()
+        self.metadata.close()
 
         if self.is_proxied:
             self._proxy.stop()
@@ -451,9 +707,9 @@ class PastisBroker(BrokerAgent):
     def start_client_and_send_corpus(self, client: PastisClient) -> None:
         self.start_client(client)
         # Iterate all the seed pool and send it to the client
-        if self.broker_mode == BrokingMode.FULL:
-            self._transmit_pool(client, self._seed_pool)
-        elif self.broker_mode == BrokingMode.NO_TRANSMIT:
+        if self._router.TRANSMIT:
+            self._transmit_pool(client)
+        else:
             self._transmit_pool(client, self._init_seed_pool)
 
     def start_client(self, client: PastisClient):
@@ -596,13 +852,18 @@ class PastisBroker(BrokerAgent):
         super(PastisBroker, self).start()  # Start the listening thread
         self._start_time = time.time()
         self._running = running
+        if self._restored_clients:
+            self._resume_deadline = self._start_time + self.RESUME_DELAY
         self.workspace.status = WorkspaceStatus.RUNNING
         logging.info("start broking")
 
         if self._coverage_manager:  # if it has been instanciated start it
             self._coverage_manager.start()
-            for seed in self._init_seed_pool.keys():  # Push initial corpus to set baseline coverage
-                fname = self.mk_input_name("INITIAL", seed)
+            for seed_id in self._init_seed_pool.keys():  # Push initial corpus to set baseline coverage
+                seed = self._seed_pool.get(seed_id)
+                if seed is None:
+                    continue
+                fname = self.mk_input_name("INITIAL", SeedRecord(SeedType.INPUT, seed, self._seed_pool.digest(seed_id)))
                 sp = fname.split("_")
                 hash = sp[4].split(".")[0]
                 covi = ClientInput(
@@ -630,23 +891,44 @@ class PastisBroker(BrokerAgent):
                 self.start_pending_clients()
 
     def run(self, timeout: int = None):
+        """
+        Run the broker until the campaign timeout, a stop request or Ctrl+C.
+        The loop sleeps until either a work item is available (input granted
+        by the coverage manager, seed from or to the proxy, proxy signal) or
+        the next periodic task is due (memory watchdog, checkpoint, timeout).
+
+        :param timeout: duration of the campaign in seconds (None means no limit)
+        """
         self.start()
-        last_t = time.time()
+        next_check = next_checkpoint = time.time() + self.WATCHDOG_PERIOD
+        if self._checkpoint_interval:
+            next_checkpoint = time.time() + self._checkpoint_interval
 
-        # Start infinite loop
+        # Start the event loop
         try:
             while True:
-                time.sleep(0.05)
+                deadlines = [next_check, next_checkpoint]
+                if timeout is not None:
+                    deadlines.append(self._start_time + timeout)
+                self._loop_event.wait(max(0.0, min(deadlines) - time.time()))
+                self._loop_event.clear()  # cleared before handling so that no wake-up is missed
                 t = time.time()
 
                 # Check if the campaign have to be stopped
                 if timeout is not None:
-                    if t > (self._start_time + timeout):
+                    if t >= (self._start_time + timeout):
                         logging.info("Campaign timeout reached, stop campaign.")
                         self._stop = True
 
-                if t > (last_t + 60):  # only check every minute
-                    last_t = t
+                if t >= next_check:  # only check every minute
+                    next_check = t + self.WATCHDOG_PERIOD
+                    logging.debug(f"send queue depth: {self.send_queue_depth} (peak: {self.send_queue_peak}), "
+                                  f"dispatch queue depth: {self.dispatch_queue_depth} (dropped: {self.dispatch_dropped}), "
+                                  f"seed backlog: {self.seed_backlog_bytes} bytes (dropped: {self.seed_backlog_dropped}), "
+                                  f"seed pool: {self._seed_pool.stats()}, corpus writer: {self._corpus_writer.stats()}, "
+                                  f"broking: {self._router.stats()}")
+                    self.metadata.commit()
+                    self.save_broking_stats()  # rows written while idle would otherwise wait the next write
                     if not self._check_memory_usage():
                         # The machine starts being overloaded
                         # For security kill triton instance
@@ -654,6 +936,10 @@ class PastisBroker(BrokerAgent):
                             if cli.engine.SHORT_NAME == "TT":  # is triton
                                 self.kick_client(cli.netid)
 
+                if self._checkpoint_interval and t >= next_checkpoint:
+                    next_checkpoint = t + self._checkpoint_interval
+                    self.checkpoint()
+
                 # Check if we received the start signal from the proxy-master
                 if self._proxy_start_signal:
                     logging.info("signal received start clients !")
@@ -664,28 +950,28 @@ class PastisBroker(BrokerAgent):
                     # if inputs are filtered. Get granted inputs and forward them to appropriate clients
                     if self.filter_inputs:
                         for item in self._coverage_manager.iter_granted_inputs():
-                            self.seed_granted(item.fuzzer_id, item.seed_status, item.content)
+                            rec = SeedRecord(item.seed_status, item.content, bytes.fromhex(item.hash))
+                            self.seed_granted(item.fuzzer_id, rec, self.workspace.seed_path(item.seed_status, item.path),
+                                              item.new_coverage)
 
                     if self.is_proxied:
                         # Check if there are seed to forward to primary (proxy main)
                         cli = self.clients[self.PROXY_NETID]
-                        if not self._clis_to_proxy.empty():
-                            try:
-                                while True:
-                                    _, typ, seed = self._clis_to_proxy.get_nowait()
-                                    self.send_seed_to(cli, typ, seed)
-                            except queue.Empty:
-                                pass
+                        try:
+                            while True:
+                                _, typ, seed = self._clis_to_proxy.get_nowait()
+                                self.send_seed_to(cli, typ, seed)
+                        except queue.Empty:
+                            pass
 
                         # Check if there are seed coming from the proxy to forward to clients
                         # Used: only if filtering is disabled (otherwise goes through coverageManager)
-                        if not self._proxy_to_clis.empty():
-                            try:
-                                while True:
-                                    origin, typ, seed = self._proxy_to_clis.get_nowait()
-                                    self.seed_received(origin, typ, seed)
-                            except queue.Empty:
-                                pass
+                        try:
+                            while True:
+                                origin, rec = self._proxy_to_clis.get_nowait()
+                                self.seed_record_received(origin, rec)
+                        except queue.Empty:
+                            pass
 
                 if self._stop:
                     logging.info("broker terminate")
@@ -695,6 +981,13 @@ class PastisBroker(BrokerAgent):
         self.workspace.status = WorkspaceStatus.FINISHED
         self.stop_broker()
 
+    def wake_main_loop(self) -> None:
+        """
+        Wake up the loop of :py:meth:`run` to handle new work items (can be
+        called from any thread).
+        """
+        self._loop_event.set()
+
     def _find_binaries(self, binaries_dir) -> None:
         """
         Iterate the whole directory to find suitables binaries in the
@@ -742,14 +1035,99 @@ class PastisBroker(BrokerAgent):
                 self.programs[data2].append(pkg)  # Also add an entry for any platform
 
     def _load_workspace(self):
-        """ Load all the seeds in the workspace"""
+        """ Load all the seeds in the workspace (seeds are only read if their name has no digest) """
         for typ in list(SeedType):  # iter seed types: input, crash, hang..
             for file in self.workspace.iter_corpus_directory(typ):
                 logging.debug(f"Load seed in pool: {file.name}")
-                content = file.read_bytes()
-                self._seed_pool[content] = typ
-        # TODO: Also dumping the current state to a file in case
-        # TODO: of exit. And being able to reload it. (not to resend all seeds to clients)
+                m = re.search(r"_([0-9a-f]{32})\.cov$", file.name)  # name given by mk_input_name
+                digest = bytes.fromhex(m.group(1)) if m else md5(file.read_bytes()).digest()
+                self._seed_pool.add(self._seed_pool.seed_id(digest), typ, file)
+            if self.workspace.pack is not None:  # only the index is read
+                for entry in self.workspace.pack.iter(typ):
+                    self._seed_pool.add(self._seed_pool.seed_id(entry.md5), typ, self.workspace.seed_path(typ, entry.name))
+
+    def save_broking_stats(self) -> None:
+        """
+        Write in the workspace the traffic due to the broking mode and the
+        coverage reached, to compare modes against each other.
+        """
+        with self._lock:
+            stats = {"mode": self.broker_mode.name,
+                     "fanout": self._router.fanout,
+                     "elapsed": time.time() - self._start_time if self._start_time else 0,
+                     "traffic": self._router.stats(),
+                     "replay_cache": self._coverage_manager.cache.stats if self._coverage_manager and self._coverage_manager.cache is not None else None,
+                     "coverage": {"edges": self._coverage_manager.covered_items if self._coverage_manager else None,
+                                  "clients": {c.strid: {"engine": c.engine.NAME if c.engine else "", "edge": c.coverage_edge,
+                                                        "seeds_received": c.seed_received_count}
+                                              for c in self.clients.values() if c.netid != self.PROXY_NETID}}}
+        self.workspace.save_broking_stats(stats)
+
+    def checkpoint(self) -> None:
+        """
+        Save the broker state in the workspace: seed ids, seeds known by each
+        running client (keyed by hostname and engine) with its configuration,
+        alerts status, coverage and uid counter. Seeds themselves are already
+        in the workspace. A client coming back with its engine still running
+        is thus resumed without being restarted, see :py:meth:`_resume_client`.
+        """
+        t0 = time.time()
+        with self._lock:
+            clients = {} if not self._awaiting_clients() else {k: list(v) for k, v in self._restored_clients.items()}
+            for c in self.clients.values():
+                if c.is_running() and c.netid != self.PROXY_NETID:
+                    received, submitted = c.dump_seeds()
+                    clients.setdefault(f"{c.hostname}|{c.engine.NAME}", []).append({
+                        "received": base64.b64encode(received).decode(),
+                        "submitted": base64.b64encode(submitted).decode(),
+                        "program": c.package_name,
+                        "coverage_mode": c.coverage_mode.value,
+                        "exec_mode": c.exec_mode.name,
+                        "check_mode": c.check_mode.name,
+                        "engine_args": c.engine_args,
+                        "target": c.target})
+            state = {"version": self.CHECKPOINT_VERSION,
+                     "uid": self._cur_id,
+                     "seed_ids": base64.b64encode(self._seed_pool.dump_ids()).decode(),
+                     "clients": clients,
+                     "alerts": {str(a.id): [a.covered, a.validated] for a in self.sast_report.iter_alerts()} if self.sast_report else {}}
+        if self._coverage_manager:
+            state["coverage"] = self._coverage_manager.save_state(self.workspace.coverage_checkpoint_file)
+        try:
+            self.workspace.save_checkpoint(state)
+            logging.info(f"checkpoint saved ({self._seed_pool.id_count} seed ids, {sum(len(x) for x in clients.values())} clients) "
+                         f"in {time.time() - t0:.2f}s")
+        except OSError as e:
+            logging.error(f"cannot save checkpoint: {e}")
+
+    def _restore_checkpoint(self) -> None:
+        """
+        Restore the state saved by :py:meth:`checkpoint` if the workspace
+        holds one. Seeds written after the checkpoint are then given new ids
+        by :py:meth:`_load_workspace`, and are the only ones sent to clients
+        resumed.
+        """
+        try:
+            state = self.workspace.load_checkpoint()
+        except ValueError as e:
+            logging.error(f"invalid checkpoint (ignored): {e}")
+            return
+        if state is None:
+            return
+        if state.get("version") != self.CHECKPOINT_VERSION:
+            logging.warning(f"checkpoint version {state.get('version')} not supported (ignored)")
+            return
+        self._cur_id = state["uid"]
+        self._seed_pool.restore_ids(base64.b64decode(state["seed_ids"]))
+        self._restored_id_count = self._seed_pool.id_count
+        self._restored_clients = state.get("clients", {})
+        if self.sast_report:
+            for alert in self.sast_report.iter_alerts():
+                alert.covered, alert.validated = state["alerts"].get(str(alert.id), (alert.covered, alert.validated))
+        if self._coverage_manager and "coverage" in state and self.workspace.coverage_checkpoint_file.exists():
+            self._coverage_manager.load_state(self.workspace.coverage_checkpoint_file, state["coverage"])
+        logging.info(f"checkpoint restored ({self._seed_pool.id_count} seed ids, "
+                     f"{sum(len(x) for x in self._restored_clients.values())} clients awaited)")
 
     def add_engine_configuration(self, name: str, config_file: PathLike):
         if name in self.engines_args:
@@ -834,16 +1212,20 @@ class PastisBroker(BrokerAgent):
         logging.info("[PROXY] start received !")
         self._running = True
         self._proxy_start_signal = True
+        self.wake_main_loop()
         # if self._running:
         #     self.start_pending_clients()
 
     def _proxy_seed_received(self, typ: SeedType, seed: bytes):
         # Forward the seed to underlying clients
-        logging.info(f"[PROXY] receive {md5(seed).hexdigest()} [{typ.name}] (forward it)")
+        rec = SeedRecord(typ, seed)
+        logging.info(f"[PROXY] receive {rec.hexdigest} [{typ.name}] (forward it)")
 
         # Forward it to main thread to be handled as normal seed
-        self._proxy_to_clis.put((b"PROXY", typ, seed))
+        self._proxy_to_clis.put((b"PROXY", rec))
+        self.wake_main_loop()
 
     def _proxy_stop_received(self):
         logging.info(f"[PROXY] stop received!")
         self._stop = True
+        self.wake_main_loop()
@@ -0,0 +1,161 @@
+# built-in imports
+import random
+from enum import Enum
+from collections import Counter
+from typing import Dict, List, Optional, Type
+
+# Local imports
+from pastisbroker.client import PastisClient
+
+
+class BrokingMode(Enum):
+    FULL = 1              # Transmit all seeds to all peers
+    NO_TRANSMIT = 2       # Does not transmit seed to peers (for comparing perfs of tools against each other)
+    AFFINITY = 3          # Transmit seeds to peers running the same engine, and to one peer of each other engine
+    GOSSIP = 4            # Transmit seeds to k peers randomly chosen
+    CROSS_ENGINE = 5      # Transmit seeds covering new edges to peers running another engine only
+
+
+class SeedRouter(object):
+    """
+    Selects the peers a seed granted is sent to, according to a broking
+    mode, and counts the resulting traffic. Routers are instantiated by
+    :py:func:`mk_router` from the :py:data:`ROUTERS` table, a new mode is
+    added by subclassing and registering it there.
+
+    :param fanout: number of peers to send seeds to (modes using it only)
+    """
+
+    TRANSMIT = True  # Whether seeds are transmitted between clients at all
+
+    def __init__(self, fanout: int = 3):
+        self.fanout = fanout
+        # stats
+        self.granted = 0               # seeds routed
+        self.sent = 0                  # seeds sent (all peers)
+        self.bytes_sent = 0
+        self.not_selected = 0          # peers a seed was not sent to (because of the mode)
+        self.sent_by_engine = Counter()  # engine name -> seeds sent to clients running it
+
+    def select(self, origin: Optional[PastisClient], peers: List[PastisClient],
+               edges: Optional[list] = None) -> List[PastisClient]:
+        """
+        Select the peers to send a seed to.
+
+        :param origin: client which sent the seed (None if not a client, e.g: the proxy)
+        :param peers: running clients, other than the origin
+        :param edges: items newly covered by the seed (None if unknown)
+        :return: peers to send the seed to
+        """
+        raise NotImplementedError()
+
+    def route(self, origin: Optional[PastisClient], peers: List[PastisClient],
+              edges: Optional[list] = None) -> List[PastisClient]:
+        """
+        Select peers with :py:meth:`select` and account for the seed.
+        """
+        selected = self.select(origin, peers, edges) if self.TRANSMIT else []
+        self.granted += 1
+        self.not_selected += len(peers) - len(selected)
+        return selected
+
+    def seed_sent(self, client: PastisClient, size: int) -> None:
+        """
+        Account for a seed actually sent to a client.
+
+        :param client: client the seed has been sent to
+        :param size: size of the seed
+        """
+        self.sent += 1
+        self.bytes_sent += size
+        if client.engine is not None:
+            self.sent_by_engine[client.engine.NAME] += 1
+
+    def stats(self) -> dict:
+        """
+        Get the traffic counters of the router.
+        """
+        return {"granted": self.granted, "sent": self.sent, "bytes_sent": self.bytes_sent,
+                "not_selected": self.not_selected, "fanout_avg": round(self.sent / self.granted, 2) if self.granted else 0,
+                "sent_by_engine": dict(self.sent_by_engine)}
+
+
+class FullRouter(SeedRouter):
+    def select(self, origin, peers, edges=None):
+        return peers
+
+
+class NoTransmitRouter(SeedRouter):
+    TRANSMIT = False
+
+    def select(self, origin, peers, edges=None):
+        return []
+
+
+class AffinityRouter(SeedRouter):
+    """
+    Engine-affinity groups: clients running the same engine share all their
+    seeds, and each seed is sent to a single client of each other group
+    (taken in turn), which is enough for other engines to benefit from it.
+    """
+    def __init__(self, fanout: int = 3):
+        super(AffinityRouter, self).__init__(fanout)
+        self._turn = Counter()  # engine name -> number of seeds already sent to its group
+
+    def select(self, origin, peers, edges=None):
+        origin_engine = origin.engine.NAME if origin is not None and origin.engine is not None else None
+        groups = {}
+        for c in peers:
+            groups.setdefault(c.engine.NAME, []).append(c)
+        selected = []
+        for name, clients in groups.items():
+            if name == origin_engine:
+                selected.extend(clients)
+            else:
+                selected.append(clients[self._turn[name] % len(clients)])
+                self._turn[name] += 1
+        return selected
+
+
+class GossipRouter(SeedRouter):
+    """
+    Gossip fan-out: each seed is sent to ``fanout`` peers randomly chosen
+    (traffic grows linearly with the number of clients instead of quadratically).
+    """
+    def select(self, origin, peers, edges=None):
+        return peers if len(peers) <= self.fanout else random.sample(peers, self.fanout)
+
+
+class CrossEngineRouter(SeedRouter):
+    """
+    Cross-engine only: a seed covering new edges is sent to the clients
+    running another engine than the one of its origin. Peers running the
+    same engine are skipped as their engine already reached these edges
+    (edges are new for the whole campaign, so no other engine can have them).
+    Requires edges (coverage computed by the broker), seeds without them are
+    sent to all peers.
+    """
+    def select(self, origin, peers, edges=None):
+        if not edges or origin is None or origin.engine is None:
+            return peers
+        return [c for c in peers if c.engine.NAME != origin.engine.NAME]
+
+
+ROUTERS: Dict[BrokingMode, Type[SeedRouter]] = {
+    BrokingMode.FULL: FullRouter,
+    BrokingMode.NO_TRANSMIT: NoTransmitRouter,
+    BrokingMode.AFFINITY: AffinityRouter,
+    BrokingMode.GOSSIP: GossipRouter,
+    BrokingMode.CROSS_ENGINE: CrossEngineRouter,
+}
+
+
+def mk_router(mode: BrokingMode, fanout: int = 3) -> SeedRouter:
+    """
+    Create the router of a broking mode.
+
+    :param mode: broking mode
+    :param fanout: number of peers to send seeds to (for modes using it)
+    :return: router
+    """
+    return ROUTERS[mode](fanout)
@@ -1,5 +1,5 @@
 # Built-in imports
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Iterator
 from pathlib import Path
 import logging
 import time
@@ -9,6 +9,9 @@ import inspect
 from libpastis.types import FuzzingEngineInfo, Arch, LogLevel, ExecMode, CheckMode, CoverageMode, SeedType, Platform
 from libpastis import FuzzingEngineDescriptor
 
+# Local imports
+from pastisbroker.seed_pool import SeedBitset
+
 
 class PastisClient(object):
     """
@@ -37,8 +40,8 @@ class PastisClient(object):
         self._coverage_mode = None
         self._exec_mode = None
         self._check_mode = None
-        self._seeds_received = set()  # Seed sent to the client
-        self._seeds_submitted = set()  # Seed submitted by the client
+        self._seeds_received = SeedBitset()  # Ids of seeds sent to the client
+        self._seeds_submitted = SeedBitset()  # Ids of seeds submitted by the client
         self.target = None  # target in case of slicing
         self.target_validated = False
 
@@ -51,6 +54,10 @@ class PastisClient(object):
         self.coverage_edge = None
         self.coverage_path = None
         self.last_cov_update = None
+        self.seed_backlog = 0  # seeds held by the broker waiting for credits
+        self.seed_backlog_bytes = 0  # size of these seeds
+        self.seed_backlog_top = 0  # seeds among them at the top priority level
+        self.seed_backlog_wait = 0.0  # mean time (seconds) seeds sent to the client were held
 
         # seed stats
         self.input_submitted_count = 0
@@ -87,20 +94,55 @@ class PastisClient(object):
             engine = self._engine.SHORT_NAME if self._engine else 'N-A'
             return f"{name}-{self.id}-{engine}"
 
-    def is_new_seed(self, seed: bytes) -> bool:
+    def is_new_seed(self, seed_id: int) -> bool:
         """
         Return true if the seed has never been sent to a client
 
-        :param seed: seed bytes
+        :param seed_id: id of the seed in the seed pool
         :return: True if never sent to client
         """
-        return seed not in self._seeds_received and seed not in self._seeds_submitted
+        return seed_id not in self._seeds_received and seed_id not in self._seeds_submitted
+
+    def unseen_seeds(self, count: int, start: int = 0) -> Iterator[int]:
+        """
+        Iterate the ids of seeds neither sent to the client nor submitted by it.
+
+        :param count: number of seed ids allocated by the seed pool
+        :param start: first seed id to consider
+        :return: iterator of seed ids
+        """
+        return self._seeds_received.missing(count, self._seeds_submitted, start)
 
-    def add_peer_seed(self, seed: bytes) -> None:
-        self._seeds_received.add(seed)
+    def dump_seeds(self) -> Tuple[bytes, bytes]:
+        """
+        Serialize the ids of seeds received and submitted (for checkpoints).
 
-    def add_own_seed(self, seed: bytes) -> None:
-        self._seeds_submitted.add(seed)
+        :return: bitmaps of seeds received and submitted
+        """
+        return self._seeds_received.to_bytes(), self._seeds_submitted.to_bytes()
+
+    def restore_seeds(self, received: bytes, submitted: bytes) -> None:
+        """
+        Restore the seeds known by the client from a checkpoint.
+
+        :param received: bitmap of seeds received
+        :param submitted: bitmap of seeds submitted
+        """
+        self._seeds_received = SeedBitset.from_bytes(received)
+        self._seeds_submitted = SeedBitset.from_bytes(submitted)
+
+    @property
+    def seed_received_count(self) -> int:
+        """
+        Number of seeds sent to the client.
+        """
+        return len(self._seeds_received)
+
+    def add_peer_seed(self, seed_id: int) -> None:
+        self._seeds_received.add(seed_id)
+
+    def add_own_seed(self, seed_id: int) -> None:
+        self._seeds_submitted.add(seed_id)
 
     def is_running(self) -> bool:
         return self._running
@@ -123,6 +165,10 @@ class PastisClient(object):
     def engine(self):
         return self._engine
 
+    @property
+    def engine_args(self) -> str:
+        return self._engine_args
+
     @property
     def coverage_mode(self):
         return self._coverage_mode
@@ -152,8 +198,8 @@ class PastisClient(object):
         self._exec_mode = exmode
         self._check_mode = ckmode
         self._engine_args = engine_args
-        self._seeds_received = set()  # Seed sent to the client
-        self._seeds_submitted = set()  # Seed submitted by the client
+        self._seeds_received = SeedBitset()  # Ids of seeds sent to the client
+        self._seeds_submitted = SeedBitset()  # Ids of seeds submitted by the client
 
     def is_supported_engine(self, engine: FuzzingEngineDescriptor) -> bool:
         for e in self.engines:
@@ -176,7 +222,7 @@ class PastisClient(object):
             "coverage_mode": self._coverage_mode.name,
             "exec_mode": self._exec_mode.name,
             "check_mode": self._check_mode.name,
-            "seed_received_count": len(self._seeds_received),
+            "seed_received_count": self.seed_received_count,
             "exec_per_sec": self.exec_per_sec,
             "total_exec": self.total_exec,
             "cycle": self.cycle,
@@ -0,0 +1,238 @@
+# built-in imports
+import os
+import csv
+import time
+import queue
+import logging
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List
+
+# Third-party imports
+from libpastis.types import SeedType
+
+# Local imports
+from pastisbroker.workspace import Workspace
+
+
+class FsyncPolicy(Enum):
+    """
+    When files written by the :py:class:`CorpusWriter` are synced to disk.
+    """
+    NONE = 0    # leave it to the OS
+    BATCH = 1   # once per batch (files and their directories)
+    ALWAYS = 2  # after each file
+
+
+class CorpusWriter(object):
+    """
+    Write-behind writer of the seeds received by the broker. Seeds are queued
+    (the queue is bounded, :py:meth:`put_seed` blocks when it is full) and
+    written by a dedicated thread by batches. Seeds already in the corpus are
+    not written again but recorded as a row of the duplicates file of the
+    workspace. Seeds queued remain readable with :py:meth:`read`. Once the
+    writer stopped, queuing a seed raises a ``RuntimeError``.
+
+    :param workspace: workspace where to write seeds
+    :param queue_size: maximum number of seeds waiting to be written
+    :param batch_size: maximum number of seeds written between two flushes
+    :param fsync: policy to sync written files to disk
+    """
+
+    def __init__(self, workspace: Workspace, queue_size: int = 10000, batch_size: int = 64,
+                 fsync: FsyncPolicy = FsyncPolicy.NONE):
+        self.workspace = workspace
+        self.batch_size = batch_size
+        self.fsync = fsync
+
+        # stats
+        self.written = 0       # number of seed files written
+        self.duplicates = 0    # number of duplicate rows written
+        self.errors = 0        # number of seeds that could not be written
+        self.peak_depth = 0    # maximum number of seeds queued
+        self.last_flush_latency = 0.0  # seconds from queuing of the oldest item of the last batch to its flush
+        self.max_flush_latency = 0.0
+
+        self._queue = queue.Queue(maxsize=queue_size)  # (queuing time, type, name, data or None for a duplicate)
+        self._pending = {}  # path -> data, seeds queued not written yet
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(name="[corpus_writer]", target=self._writer, daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of items waiting to be written.
+        """
+        return self._queue.qsize()
+
+    def put_seed(self, typ: SeedType, name: str, seed: bytes) -> Path:
+        """
+        Queue a seed to be written in the corpus directory of its type.
+
+        :param typ: type of the seed
+        :param name: name of the seed file
+        :param seed: content of the seed
+        :return: path of the seed file (once written)
+        """
+        self._check_running(name)
+        path = self.hold_seed(typ, name, seed)
+        self._put((time.monotonic(), typ, name, seed))
+        return path
+
+    def hold_seed(self, typ: SeedType, name: str, seed: bytes) -> Path:
+        """
+        Make a seed readable with :py:meth:`read` before it is queued with
+        :py:meth:`put_seed` (which may block, e.g: it can be called once a
+        lock is released). Never blocks.
+
+        :param typ: type of the seed
+        :param name: name of the seed file
+        :param seed: content of the seed
+        :return: path of the seed file (once written)
+        """
+        path = self.workspace.seed_path(typ, name)
+        with self._lock:
+            self._pending[str(path)] = seed
+        return path
+
+    def put_duplicate(self, typ: SeedType, name: str) -> None:
+        """
+        Record a seed received again (already in the corpus).
+
+        :param typ: type of the seed
+        :param name: name the seed file would have had
+        """
+        self._check_running(name)
+        self._put((time.monotonic(), typ, name, None))
+
+    def read(self, path: str) -> bytes:
+        """
+        Read a seed file, even if it is still queued.
+
+        :param path: path of the seed file
+        :return: content of the seed
+        """
+        with self._lock:
+            seed = self._pending.get(str(path))
+        return self.workspace.read_seed(Path(path)) if seed is None else seed
+
+    def flush(self) -> None:
+        """
+        Wait for all items queued to be written.
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        """
+        Write all items queued and stop the writer thread (only the
+        first call does).
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._put(None)
+        self._thread.join()
+
+    def _check_running(self, name: str) -> None:
+        if self._stopped:
+            logging.error(f"seed {name} received after the corpus writer stopped (not written)")
+            raise RuntimeError("corpus writer stopped")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the counters of the writer (for logging).
+        """
+        return {"depth": self.depth, "peak_depth": self.peak_depth, "written": self.written,
+                "duplicates": self.duplicates, "errors": self.errors,
+                "flush_latency": round(self.last_flush_latency, 4), "max_flush_latency": round(self.max_flush_latency, 4)}
+
+    def _put(self, item) -> None:
+        self._queue.put(item)
+        self.peak_depth = max(self.peak_depth, self._queue.qsize())
+
+    def _writer(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [x for x in batch if x is not None]
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[tuple]) -> None:
+        files, rows = [], []
+        pack = self.workspace.pack
+        for _, typ, name, data in batch:
+            if data is None:
+                rows.append([name, typ.name])
+                continue
+            path = self.workspace.seed_path(typ, name)
+            try:
+                if pack is not None:
+                    pack.append(typ, name, data)
+                    if self.fsync == FsyncPolicy.ALWAYS:
+                        pack.sync()
+                else:
+                    with open(path, "wb") as f:
+                        f.write(data)
+                        if self.fsync == FsyncPolicy.ALWAYS:
+                            f.flush()
+                            os.fsync(f.fileno())
+                files.append(path)
+            except OSError as e:
+                logging.error(f"cannot write seed {name}: {e}")
+                self.errors += 1
+
+        if rows:
+            try:
+                with open(self.workspace.duplicates_file, "a", newline="") as f:
+                    csv.writer(f).writerows(rows)
+                    if self.fsync != FsyncPolicy.NONE:
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError as e:
+                logging.error(f"cannot write duplicates: {e}")
+                self.errors += len(rows)
+
+        if pack is not None:
+            if self.fsync == FsyncPolicy.BATCH and files:
+                pack.sync()
+        else:
+            if self.fsync == FsyncPolicy.BATCH:
+                for path in files:
+                    self._fsync_path(path)
+            if self.fsync != FsyncPolicy.NONE:
+                for dir in {x.parent for x in files}:  # make the new directory entries durable too
+                    self._fsync_path(dir)
+
+        with self._lock:
+            for _, typ, name, data in batch:
+                if data is not None:
+                    self._pending.pop(str(self.workspace.seed_path(typ, name)), None)
+        self.written += len(files)
+        self.duplicates += len(rows)
+        self.last_flush_latency = time.monotonic() - min(x[0] for x in batch)
+        self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+
+    @staticmethod
+    def _fsync_path(path: Path) -> None:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.warning(f"cannot sync {path}: {e}")
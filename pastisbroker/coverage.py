@@ -3,24 +3,30 @@ import json
 import time
 import logging
 import tempfile
+import itertools
 import os
 import subprocess
-from typing import Generator
+from typing import Callable, Generator, Optional, Tuple
 from pathlib import Path
 import queue
 import csv
 from dataclasses import dataclass
-from threading import Thread
-from multiprocessing import Queue, Manager
+from threading import Thread, Lock
+from multiprocessing import Queue
 from multiprocessing.pool import Pool
 
 from libpastis.types import SeedType, SeedInjectLoc
+from libpastis.replay_cache import ReplayCache
 
 # tritondse imports
-from tritondse import GlobalCoverage, CoverageSingleRun, CoverageStrategy, BranchSolvingStrategy
+from tritondse import CoverageStrategy, BranchSolvingStrategy
 from tritondse.trace import QBDITrace, TraceException
 
 from pastisbroker.utils import Bcolors, mk_color
+from pastisbroker.metadata import MetadataIndex
+from pastisbroker.replay import ReplayBackend, ForkServer
+from pastisbroker.bitmap_coverage import BitmapCoverage, EdgeList
+from pastisbroker.shm_slots import SharedSlots
 
 
 @dataclass
@@ -44,31 +50,48 @@ class CoverageManager(object):
 
     ARGV_PLACEHOLDER = "@@"
     STRATEGY = CoverageStrategy.EDGE
+    SLOTS = 256              # seeds (and results) in shared memory at once, others are sent inline
+    SLOT_SIZE = 64 * 1024    # larger seeds (and results) are sent inline
 
-    def __init__(self, pool_size: int, replay_timeout: int, filter: bool, program: str, args: list[str], inj_loc: SeedInjectLoc, stream_file: str = ""):
+    _worker_ctx = None  # (input queue, coverage queue, slots) in replay workers (set by init_worker)
+
+    def __init__(self, pool_size: int, replay_timeout: int, filter: bool, program: str, args: list[str], inj_loc: SeedInjectLoc, stream_file: str = "",
+                 metadata: MetadataIndex = None, replay_backend: ReplayBackend = ReplayBackend.PROCESS,
+                 cache: ReplayCache = None):
         # Base info for replay
         self.pool_size = pool_size
         self.replay_timeout = replay_timeout
+        self.replay_backend = replay_backend
         self.filter_enabled = filter
         self.program = str(program)
         self.args = args
         self.inj_loc = inj_loc
 
+        # Coverages of inputs already replayed (in a previous run or by another client)
+        self.cache = cache
+        self._target_digest = ReplayCache.target_digest(self.program) if cache is not None else None
+
         # Coverage and messaging attributes
-        self._coverage = GlobalCoverage(self.STRATEGY, BranchSolvingStrategy.ALL_NOT_COVERED)
-        self._manager = Manager()
-        self.input_queue = self._manager.Queue()
-        self.cov_queue = self._manager.Queue()
-        self.granted_queue = self._manager.Queue()
-
-        # Pool of workers
-        self.pool = Pool(self.pool_size)
+        self._coverage = BitmapCoverage(self.STRATEGY, BranchSolvingStrategy.ALL_NOT_COVERED)
+        self._coverage_lock = Lock()  # the coverage worker updates it while it can be saved
+        # Seeds and results are exchanged with replay workers in shared memory, only
+        # descriptors go through queues (see worker for their layout)
+        self._slots = SharedSlots(self.SLOTS, self.SLOT_SIZE)
+        self.input_queue = Queue()
+        self.cov_queue = Queue()
+        self.granted_queue = queue.Queue()
+        self._pending = {}  # ticket -> ClientInput being replayed
+        self._tickets = itertools.count()
+
+        # Pool of workers (inherit queues and slots)
+        self.pool = Pool(self.pool_size, initializer=self.init_worker, initargs=(self.input_queue, self.cov_queue, self._slots))
         self._running = False
         self.cov_worker = Thread(name="[coverage_worker]", target=self.coverage_worker)
 
         # stats
         self.seeds_accepted, self.seeds_submitted = 0, 0
         self.cli_stats = {}
+        self._granted_cbs = []
 
         # Streaming
         if stream_file:
@@ -76,6 +99,7 @@ class CoverageManager(object):
             self.csv = csv.writer(self.stream_file)
         else:
             self.stream_file, self.csv = None, None
+        self.metadata = metadata  # replays are also recorded in the metadata index (if any)
 
 
     def start(self) -> None:
@@ -85,15 +109,51 @@ class CoverageManager(object):
         # First start the coverage worker
         self._running = True
         self.cov_worker.start()
-        logging.info("Starting coverage manager")
+        logging.info(f"Starting coverage manager (replay backend: {self.replay_backend.name})")
 
         for work_id in range(self.pool_size):
-            self.pool.apply_async(self.worker, (self.input_queue, self.cov_queue, self.program, self.args, self.inj_loc, self.replay_timeout))
+            self.pool.apply_async(self.pool_worker, (self.program, self.args, self.inj_loc, self.replay_timeout, self.replay_backend))
 
     def stop(self) -> None:
         self._running = False
-        self.cov_worker.join()
+        if self.cov_worker.is_alive():
+            self.cov_worker.join()
         self.pool.terminate()
+        self.pool.join()
+        self._slots.close()
+        if self.cache is not None:
+            logging.info(f"replay cache: {self.cache.stats}")
+
+    def save_state(self, cov_file: Path) -> dict:
+        """
+        Save the global coverage in the given file.
+
+        :param cov_file: file where to save the coverage
+        :return: counters to save alongside
+        """
+        with self._coverage_lock:
+            self._coverage.to_file(cov_file)
+        return {"seeds_accepted": self.seeds_accepted, "seeds_submitted": self.seeds_submitted}
+
+    def load_state(self, cov_file: Path, counters: dict) -> None:
+        """
+        Restore the global coverage and counters saved with :py:meth:`save_state`.
+
+        :param cov_file: file holding the coverage
+        :param counters: counters returned by :py:meth:`save_state`
+        """
+        with self._coverage_lock:
+            self._coverage = BitmapCoverage.from_file(cov_file)
+        self.seeds_accepted = counters.get("seeds_accepted", 0)
+        self.seeds_submitted = counters.get("seeds_submitted", 0)
+
+    @property
+    def covered_items(self) -> int:
+        """
+        Number of items (edges) covered by all inputs replayed.
+        """
+        with self._coverage_lock:
+            return self._coverage.unique_covitem_covered
 
     def push_input(self, cli_input: ClientInput) -> None:
         """ Push the input in the """
@@ -107,7 +167,62 @@ class CoverageManager(object):
         else:
             self.cli_stats[cli_input.fuzzer_id] = [1, 0]
 
-        self.input_queue.put(cli_input)
+        ticket = next(self._tickets)
+        self._pending[ticket] = cli_input
+
+        # Input already replayed, its coverage is directly handed to the coverage worker
+        if self.cache is not None and (data := self.cache.get(self._cache_key(cli_input))) is not None:
+            self.cov_queue.put((ticket, -1, "SUCCESS", 0, data))
+            return
+
+        # Only a descriptor is queued, the seed is written in a slot (if any is free and it fits)
+        slot = self._slots.acquire()
+        if slot is not None and self._slots.write(slot, cli_input.content):
+            self.input_queue.put((ticket, slot, len(cli_input.content), cli_input.hash, None))
+        else:
+            if slot is not None:
+                self._slots.release(slot)
+            self.input_queue.put((ticket, -1, len(cli_input.content), cli_input.hash, cli_input.content))
+
+    def _cache_key(self, cli_input: ClientInput) -> str:
+        return ReplayCache.key(self._target_digest, self.args, self.inj_loc, cli_input.hash, f"edgelist:{self.STRATEGY.name}")
+
+    @property
+    def pending_inputs(self) -> int:
+        """
+        Number of inputs pushed and not replayed yet.
+        """
+        return len(self._pending)
+
+    def _pop_result(self, timeout: float) -> Tuple[ClientInput, Optional[EdgeList]]:
+        """
+        Get the result of a replay (raise queue.Empty if none in ``timeout`` seconds).
+
+        :return: the input (with its replay status and time set) and its coverage
+                 (None if no coverage)
+        """
+        ticket, slot, status, replay_time, result = self.cov_queue.get(timeout=timeout)
+        item = self._pending.pop(ticket)
+        item.replay_status, item.replay_time = status, replay_time
+        if isinstance(result, int):  # edge list in the slot
+            result = self._slots.read(slot, result)
+        if isinstance(result, bytes):  # edge list (sent inline if it does not fit in the slot)
+            if self.cache is not None and status == "SUCCESS":
+                self.cache.put(self._cache_key(item), result)
+            result = EdgeList.from_bytes(result)
+        if slot >= 0:
+            self._slots.release(slot)
+        return item, result
+
+    def register_granted_callback(self, cb: Callable[[], None]) -> None:
+        """
+        Register a function called (by the coverage worker thread) each time
+        an input is put in the granted queue, to be notified instead of polling
+        :py:meth:`iter_granted_inputs`.
+
+        :param cb: callback function without argument
+        """
+        self._granted_cbs.append(cb)
 
     def iter_granted_inputs(self) -> Generator[ClientInput, None, None]:
         try:
@@ -141,25 +256,28 @@ class CoverageManager(object):
                 item.new_coverage
             ])
             self.stream_file.flush()
+        if self.metadata is not None:
+            self.metadata.add_coverage(item.hash, item.path, item.seed_status, item.fuzzer_name, item.elapsed,
+                                       item.broker_status, item.replay_status, item.replay_time, item.new_coverage)
 
     def coverage_worker(self):
         while self._running:
             try:
-                item, cov_file = self.cov_queue.get(timeout=0.5)
+                item, coverage = self._pop_result(timeout=0.5)
                 # logging.info("Coverage worker fetch item")
                 new_items = []
-                try:
-                    coverage: CoverageSingleRun = QBDITrace.from_file(cov_file).coverage
-                    if self._coverage.improve_coverage(coverage):
+                if coverage is None:  # no coverage produced (or it could not be parsed)
+                    # Grant input
+                    self.grant_input(item)
+                else:
+                    # Update the global coverage (if the input covers new items)
+                    with self._coverage_lock:
+                        new_items = self._coverage.update(coverage)
+                    if new_items:
                         self.cli_stats[item.fuzzer_id][1] += 1  # input accepted
 
-                        # Get newly covered items (and put them in the stream queue
-                        new_items = coverage.difference(self._coverage)
-
-                        item.new_coverage = list(new_items)
-
-                        # Update the global coverage
-                        self._coverage.merge(coverage)
+                        # Newly covered items (put in the stream queue)
+                        item.new_coverage = new_items
 
                         self.grant_input(item)
 
@@ -167,19 +285,7 @@ class CoverageManager(object):
                         item.broker_status = "DROPPED" if self.filter_enabled else "GRANTED"
                         # logging.info(f"seed {item.hash} ({item.seed_status.name}) of {item.fuzzer_name} rejected (do not improve coverage)")
 
-                    # Remove the coverage file
-                    os.unlink(cov_file)
-
-                except json.JSONDecodeError:
-                    item.replay_status = "FAIL_PARSE_COV"
-                    os.unlink(cov_file)
-                    self.grant_input(item)
-
-                except FileNotFoundError:
-                    # Grant input
-                    self.grant_input(item)
-
-                logging.info(f"seed {item.hash} ({item.fuzzer_name}) [replay:{self.mk_rpl_status(item.replay_status)}][{self.mk_broker_status(item.broker_status, bool(new_items))}][{int(item.replay_time):}s] ({len(new_items)} new edges) (pool:{self.input_queue.qsize()})")
+                logging.info(f"seed {item.hash} ({item.fuzzer_name}) [replay:{self.mk_rpl_status(item.replay_status)}][{self.mk_broker_status(item.broker_status, bool(new_items))}][{int(item.replay_time):}s] ({len(new_items)} new edges) (pool:{self.pending_inputs})")
                 # Regardless if it was a success or not log it
                 self.add_item_coverage_stream(item)
             except queue.Empty:
@@ -199,6 +305,8 @@ class CoverageManager(object):
         if self.filter_enabled:  # if not enabled do not need to put it in granted input (just logging)
             if item.fuzzer_name != "INITIAL":  # if not initial corpus add it
                 self.granted_queue.put(item)
+                for cb in self._granted_cbs:
+                    cb()
 
     @staticmethod
     def mk_rpl_status(status: str) -> str:
@@ -218,21 +326,66 @@ class CoverageManager(object):
             return mk_color(status, Bcolors.FAIL)
 
     @staticmethod
-    def worker(input_queue: Queue, cov_queue: Queue, program: str, argv: list[str], seed_inj: SeedInjectLoc, timeout) -> None:
+    def init_worker(input_queue: Queue, cov_queue: Queue, slots: SharedSlots) -> None:
+        """
+        Initializer of replay worker processes (queues and slots are inherited).
+        """
+        CoverageManager._worker_ctx = (input_queue, cov_queue, slots)
+
+    @staticmethod
+    def pool_worker(program: str, argv: list[str], seed_inj: SeedInjectLoc, timeout, backend: ReplayBackend) -> None:
+        input_queue, cov_queue, slots = CoverageManager._worker_ctx
+        CoverageManager.worker(input_queue, cov_queue, slots, program, argv, seed_inj, timeout, backend)
+
+    @staticmethod
+    def _put_result(cov_queue: Queue, slots: SharedSlots, ticket: int, slot: int, status: str, replay_time: float,
+                    coverage: Optional[EdgeList]) -> None:
+        if coverage is not None:  # written in the slot of the input (if it fits)
+            data = coverage.to_bytes()
+            coverage = len(data) if slot >= 0 and slots.write(slot, data) else data
+        cov_queue.put((ticket, slot, status, replay_time, coverage))
+
+    @staticmethod
+    def _load_trace(cov_file: str) -> Tuple[Optional[EdgeList], bool]:
+        """
+        Parse (and remove) the coverage file written by QBDI.
+
+        :return: the edge list (None if there is no coverage) and whether the file could not be parsed
+        """
+        try:
+            data = json.loads(Path(cov_file).read_text())
+        except FileNotFoundError:
+            return None, False
+        except json.JSONDecodeError:
+            os.unlink(cov_file)
+            return None, True
+        os.unlink(cov_file)
+        return EdgeList.from_trace(data), False
+
+    @staticmethod
+    def worker(input_queue: Queue, cov_queue: Queue, slots: SharedSlots, program: str, argv: list[str], seed_inj: SeedInjectLoc,
+               timeout, backend: ReplayBackend = ReplayBackend.PROCESS) -> None:
         """
         worker thread that unstack inputs and replay them.
+
+        Inputs are queued as (ticket, slot, length, hash, content) where content is None if
+        the seed is in the slot (slot is -1 otherwise). Results are queued as (ticket, slot,
+        replay status, replay time, coverage) where coverage is the length of the edge list
+        written in the slot, the edge list serialized (if it does not fit) or None. Traces are
+        parsed here so that the coverage worker only merges them.
         """
         tmpfile = Path(tempfile.mktemp(suffix=f"{os.getpid()}.input"))
         pid = os.getpid()
+        server = None  # fork server (started on the first input, inputs are always written in tmpfile)
         try:
             while True:
-                item: ClientInput = input_queue.get()
-                # logging.debug(f"Worker {os.getpid()} fetch: {str(item)[:50]}")
+                ticket, slot, length, h, content = input_queue.get()
+                # logging.debug(f"Worker {os.getpid()} fetch: {h}")
                 # Write inputs in our tempfile
-                tmpfile.write_bytes(item.content)
+                tmpfile.write_bytes(slots.read(slot, length) if content is None else content)
 
                 # Create to coverage file
-                cov_file = tempfile.mktemp(f"_{item.hash}.cov")
+                cov_file = tempfile.mktemp(f"_{h}.cov")
 
                 # Adjust injection location before calling QBDITrace
                 cur_argv = argv[:]
@@ -243,9 +396,25 @@ class CoverageManager(object):
                         cur_argv[idx] = str(tmpfile)
                     except ValueError as e:
                         logging.error(f"seed injection {seed_inj.name} but can't find '@@' on program argv: {argv}: {e}")
+                        CoverageManager._put_result(cov_queue, slots, ticket, slot, "FAIL_ARGV", 0, None)
                         continue
 
                 t0 = time.time()
+                if backend == ReplayBackend.FORKSERVER:
+                    if server is None:
+                        server = ForkServer(CoverageManager.STRATEGY, program, cur_argv,
+                                            stdin_file=str(tmpfile) if seed_inj == SeedInjectLoc.STDIN else None,
+                                            cwd=Path(program).parent)
+                    try:
+                        trace = server.run_trace(timeout)
+                        coverage = EdgeList.from_trace(trace) if trace is not None else None
+                        status = "SUCCESS" if coverage is not None else "FAIL_NO_COV"
+                    except TraceException:
+                        coverage = None
+                        status = "FAIL_TIMEOUT"
+                    CoverageManager._put_result(cov_queue, slots, ticket, slot, status, time.time() - t0, coverage)
+                    continue
+
                 try:
                     # Run the seed
                     if QBDITrace.run(CoverageManager.STRATEGY,
@@ -255,17 +424,22 @@ class CoverageManager(object):
                                      stdin_file=str(tmpfile) if seed_inj == SeedInjectLoc.STDIN else None,
                                      cwd=Path(program).parent,
                                      timeout=timeout):
-                        item.replay_status = "SUCCESS"
-                        # logging.info(f"[worker-{pid}] replaying {item.hash} sucessful")
+                        status = "SUCCESS"
+                        # logging.info(f"[worker-{pid}] replaying {h} sucessful")
                     else:
-                        item.replay_status = "FAIL_NO_COV"
+                        status = "FAIL_NO_COV"
                         # logging.warning("Cannot load the coverage file generated (maybe had crashed?)")
                 except TraceException:
-                    item.replay_status = "FAIL_TIMEOUT"
+                    status = "FAIL_TIMEOUT"
                     # logging.warning('Timeout hit, while trying to re-run the seed')
-                item.replay_time = time.time() - t0
+                coverage, parse_error = CoverageManager._load_trace(cov_file)
+                if parse_error:
+                    status = "FAIL_PARSE_COV"
                 # Add it to the coverage queue (even if it failed
-                cov_queue.put((item, cov_file))
+                CoverageManager._put_result(cov_queue, slots, ticket, slot, status, time.time() - t0, coverage)
         except KeyboardInterrupt:
             pass
             # logging.info(f"replay worker {os.getpid()}, stops (keyboard interrupt)")
+        finally:
+            if server is not None:
+                server.stop()
@@ -0,0 +1,236 @@
+# built-in imports
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Generator, List, Tuple
+
+# Third-party imports
+from libpastis.types import SeedType
+
+
+class MetadataIndex(object):
+    """
+    Embedded (SQLite) database indexing the metadata of a campaign: seeds
+    received, coverage replays, telemetry samples, alert events, clients and
+    replay deltas (computed by the benchmark tooling). It spares re-parsing
+    file names and CSV files to analyze a campaign.
+
+    Writes come from several threads, they share the connection (under a lock)
+    and are committed by batches, at most every ``commit_period`` seconds
+    (and on :py:meth:`commit`).
+
+    :param file: database file
+    :param commit_period: maximum time (in seconds) between two commits
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS seeds (
+        name TEXT, md5 TEXT, type TEXT, client TEXT, date REAL, elapsed REAL, new INTEGER);
+    CREATE INDEX IF NOT EXISTS seeds_name ON seeds (name);
+    CREATE INDEX IF NOT EXISTS seeds_md5 ON seeds (md5);
+    CREATE INDEX IF NOT EXISTS seeds_client ON seeds (client, elapsed);
+
+    CREATE TABLE IF NOT EXISTS coverage (
+        date REAL, elapsed TEXT, md5 TEXT, name TEXT, type TEXT, client TEXT, broker_status TEXT,
+        replay_status TEXT, replay_time REAL, new_items INTEGER, new_coverage TEXT);
+    CREATE INDEX IF NOT EXISTS coverage_client ON coverage (client, date);
+
+    CREATE TABLE IF NOT EXISTS telemetry (
+        date REAL, client TEXT, exec_per_sec INTEGER, total_exec INTEGER, cycle INTEGER, timeout INTEGER,
+        block INTEGER, edge INTEGER, path INTEGER, last_cov_update INTEGER, seed_backlog INTEGER,
+        seed_backlog_bytes INTEGER, seed_backlog_top INTEGER, seed_backlog_wait REAL);
+    CREATE INDEX IF NOT EXISTS telemetry_client ON telemetry (client, date);
+
+    CREATE TABLE IF NOT EXISTS alerts (
+        date REAL, alert INTEGER, client TEXT, covered INTEGER, validated INTEGER, first_cov INTEGER, first_val INTEGER);
+    CREATE INDEX IF NOT EXISTS alerts_alert ON alerts (alert, date);
+
+    CREATE TABLE IF NOT EXISTS clients (strid TEXT PRIMARY KEY, data TEXT);
+
+    CREATE TABLE IF NOT EXISTS replays (name TEXT PRIMARY KEY, fuzzer TEXT, elapsed REAL, delta TEXT);
+    CREATE INDEX IF NOT EXISTS replays_elapsed ON replays (elapsed);
+    """
+
+    TELEMETRY_FIELDS = ['date', 'id', 'exec_per_sec', 'total_exec', 'cycle', 'timeout', 'block', 'edge', 'path',
+                        'last_cov_update', 'seed_backlog', 'seed_backlog_bytes', 'seed_backlog_top', 'seed_backlog_wait']
+
+    def __init__(self, file: Path, commit_period: float = 1.0):
+        self.file = Path(file)
+        self.commit_period = commit_period
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.file), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")    # readers do not block the broker
+        self._db.execute("PRAGMA synchronous=NORMAL")  # durable at each checkpoint of the WAL
+        self._db.executescript(self.SCHEMA)
+        self._db.commit()
+        self._last_commit = time.monotonic()
+        self._closed = False
+
+    def _write(self, sql: str, args: tuple) -> None:
+        with self._lock:
+            if self._closed:  # late events (e.g: seeds received while stopping)
+                return
+            self._db.execute(sql, args)
+            if time.monotonic() - self._last_commit >= self.commit_period:
+                self._commit()
+
+    def _commit(self) -> None:
+        # Must be called with _lock held
+        if self._closed:
+            return
+        self._db.commit()
+        self._last_commit = time.monotonic()
+
+    def commit(self) -> None:
+        """
+        Commit all rows written so far.
+        """
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        """
+        Commit all rows written and close the database.
+        """
+        with self._lock:
+            self._commit()
+            self._db.close()
+            self._closed = True
+
+    def query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        """
+        Run a read query on the database.
+
+        :param sql: SQL query
+        :param args: parameters of the query
+        :return: rows returned
+        """
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def count(self, table: str) -> int:
+        """
+        Number of rows of a table.
+
+        :param table: table name (seeds, coverage, telemetry, alerts, clients, replays)
+        """
+        return self.query(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+    # Written by the broker
+
+    def add_seed(self, name: str, md5: str, typ: SeedType, client: str, elapsed: float, new: bool) -> None:
+        """
+        Record a seed received by the broker.
+
+        :param name: name of the seed file
+        :param md5: md5 digest of the seed (hex)
+        :param typ: type of the seed
+        :param client: id of the client which sent it
+        :param elapsed: time elapsed since the start of the campaign (seconds)
+        :param new: False if the seed was already in the corpus
+        """
+        self._write("INSERT INTO seeds VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, md5, typ.name, client, time.time(), elapsed, int(new)))
+
+    def add_coverage(self, md5: str, name: str, typ: SeedType, client: str, elapsed: str, broker_status: str,
+                     replay_status: str, replay_time: float, new_coverage: list) -> None:
+        """
+        Record the replay of a seed by the coverage manager (row of the coverage stream).
+
+        :param md5: md5 digest of the seed (hex)
+        :param name: name of the seed file
+        :param typ: type of the seed
+        :param client: id of the client which sent it
+        :param elapsed: time elapsed since the start of the campaign (as in the seed name)
+        :param broker_status: DUPLICATE, DROPPED or GRANTED
+        :param replay_status: result of the replay
+        :param replay_time: time taken by the replay (seconds)
+        :param new_coverage: items newly covered by the seed
+        """
+        self._write("INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), elapsed, md5, name, typ.name, client, broker_status, replay_status, replay_time,
+                     len(new_coverage), json.dumps(new_coverage)))
+
+    def add_telemetry(self, row: dict) -> None:
+        """
+        Record a telemetry sample of a client.
+
+        :param row: sample (fields of :py:attr:`TELEMETRY_FIELDS`, ``id`` is the client id)
+        """
+        self._write(f"INSERT INTO telemetry VALUES ({', '.join('?' * len(self.TELEMETRY_FIELDS))})",
+                    tuple(row.get(x) for x in self.TELEMETRY_FIELDS))
+
+    def add_alert_event(self, alert: int, client: str, covered: bool, validated: bool,
+                        first_cov: bool, first_val: bool) -> None:
+        """
+        Record alert data sent by a client.
+
+        :param alert: alert id
+        :param client: id of the client which sent it
+        :param covered: whether the client covered the alert
+        :param validated: whether the client validated the alert
+        :param first_cov: whether the client is the first to cover it
+        :param first_val: whether the client is the first to validate it
+        """
+        self._write("INSERT INTO alerts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), alert, client, int(covered), int(validated), int(first_cov), int(first_val)))
+
+    def set_clients(self, clients: List[dict]) -> None:
+        """
+        Record the final statistics of clients (replaces previous ones of the same clients).
+
+        :param clients: clients as dicts (with a ``strid`` key)
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._db.executemany("INSERT OR REPLACE INTO clients VALUES (?, ?)",
+                                 [(x['strid'], json.dumps(x)) for x in clients])
+            self._commit()
+
+    # Read by the benchmark tooling
+
+    def seeds_by_name(self) -> Dict[str, Tuple[float, float, str, str]]:
+        """
+        Get the metadata of all seeds received (first reception of each name).
+
+        :return: seed file name -> reception date (timestamp), elapsed time, client id and md5 (hex)
+        """
+        return {name: (date, elapsed, cli, h) for name, date, elapsed, cli, h in
+                self.query("SELECT name, date, elapsed, client, md5 FROM seeds ORDER BY rowid DESC")}
+
+    def seed_counts(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Count seeds sent by each client.
+
+        :return: client id -> (number of seeds sent, number of them not sent before by anyone)
+        """
+        return {cli: (tot, new) for cli, tot, new in
+                self.query("SELECT client, COUNT(*), SUM(new) FROM seeds GROUP BY client")}
+
+    def clients(self) -> List[dict]:
+        """
+        Get the final statistics of clients.
+        """
+        return [json.loads(x) for x, in self.query("SELECT data FROM clients")]
+
+    def add_replay_delta(self, name: str, fuzzer: str, elapsed: float, delta: str) -> None:
+        """
+        Record the coverage delta brought by the replay of a seed.
+
+        :param name: name of the seed (or trace) file
+        :param fuzzer: client id (or ``seeds`` for initial seeds)
+        :param elapsed: time elapsed since the start of the campaign (seconds)
+        :param delta: delta serialized (JSON)
+        """
+        self._write("INSERT OR REPLACE INTO replays VALUES (?, ?, ?, ?)", (name, fuzzer, elapsed, delta))
+
+    def iter_replay_deltas(self) -> Generator[Tuple[str, str, float, str], None, None]:
+        """
+        Iterate coverage deltas, initial seeds first then by elapsed time.
+
+        :return: generator of name, fuzzer, elapsed time and delta (JSON)
+        """
+        yield from self.query("SELECT name, fuzzer, elapsed, delta FROM replays ORDER BY fuzzer != 'seeds', elapsed, rowid")
@@ -0,0 +1,226 @@
+# built-in imports
+import os
+import re
+import struct
+import datetime
+import threading
+from hashlib import md5
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Generator, Optional
+
+# Third-party imports
+from libpastis.types import SeedType
+
+
+@dataclass
+class PackedSeed:
+    """
+    Index entry of a seed in a :py:class:`PackedCorpus`.
+    """
+    typ: SeedType   # type of the seed
+    segment: int    # segment file number
+    offset: int     # offset of the seed in the segment
+    length: int     # size of the seed
+    md5: bytes      # md5 digest of the seed
+    elapsed: int    # time elapsed since the start of the campaign (in microseconds, -1 if unknown)
+    client: str     # client which sent the seed (or the whole seed name if not a standard name)
+    date: str       # reception date (as written in the name, empty if not a standard name)
+
+    @property
+    def name(self) -> str:
+        """
+        Name the seed file has in the per-file layout.
+        """
+        if not self.date:
+            return self.client
+        elapsed = str(datetime.timedelta(microseconds=self.elapsed)).replace(" day, ", "d:").replace(" days, ", "d:")
+        return f"{self.date}_{elapsed}_{self.client}_{self.md5.hex()}.cov"
+
+
+class PackedCorpus(object):
+    """
+    Append-only store of seeds. Seeds are appended to segment files (a new
+    segment is started once ``segment_size`` is reached) and described in an
+    index file of fixed-size records followed by the client name. Loading
+    only reads the index, thus it does not depend on the directory size.
+
+    :param directory: directory holding segments and index
+    :param segment_size: size (in bytes) after which a new segment is started
+    """
+
+    INDEX_FILE = "index.bin"
+    SEGMENT_FILE = "segment-{:05d}.bin"
+
+    RECORD = struct.Struct("<BHQI16sq19sH")  # typ, segment, offset, length, md5, elapsed, date, client length
+    NAME_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2})_(?:(\d+)d:)?(\d+):(\d{2}):(\d{2}(?:\.\d{6})?)_([^_]+)_([0-9a-f]{32})\.cov$")
+
+    def __init__(self, directory: Path, segment_size: int = 256 * 1024 * 1024):
+        self.root = Path(directory)
+        self.segment_size = segment_size
+        self.root.mkdir(exist_ok=True)
+
+        self._entries = []  # List[PackedSeed] in insertion order
+        self._names = None  # name -> PackedSeed (built on first lookup)
+        self._fds = {}      # segment -> file descriptor (for reads)
+        self._lock = threading.Lock()
+        self._load_index()
+
+        self._segment = max((x.segment for x in self._entries), default=0)
+        self._segment_file = open(self.root / self.SEGMENT_FILE.format(self._segment), "ab")
+        self._index_file = open(self.root / self.INDEX_FILE, "ab")
+
+    def __getstate__(self) -> dict:
+        # Copies (e.g: in joblib workers) can only read seeds, files are reopened on use
+        state = self.__dict__.copy()
+        state.update(_fds={}, _segment_file=None, _index_file=None)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def _load_index(self) -> None:
+        index = self.root / self.INDEX_FILE
+        if not index.exists():
+            return
+        data = index.read_bytes()
+        pos = 0
+        while pos + self.RECORD.size <= len(data):
+            typ, seg, off, length, digest, elapsed, date, cli_len = self.RECORD.unpack_from(data, pos)
+            end = pos + self.RECORD.size + cli_len
+            if end > len(data):
+                break
+            client = data[pos + self.RECORD.size:end].decode()
+            self._add_entry(PackedSeed(SeedType(typ), seg, off, length, digest, elapsed, client, date.rstrip(b"\0").decode()))
+            pos = end
+        if pos != len(data):  # record partially written (crash while appending)
+            with open(index, "r+b") as f:
+                f.truncate(pos)
+
+    def _add_entry(self, entry: PackedSeed) -> None:
+        self._entries.append(entry)
+        if self._names is not None:
+            self._names[entry.name] = entry
+
+    def append(self, typ: SeedType, name: str, seed: bytes) -> PackedSeed:
+        """
+        Append a seed to the store.
+
+        :param typ: type of the seed
+        :param name: name of the seed (as in the per-file layout)
+        :param seed: content of the seed
+        :return: the index entry of the seed
+        """
+        m = self.NAME_RE.match(name)
+        if m:
+            date, days, h, mi, s, client, digest = m.groups()
+            elapsed = round(((int(days or 0) * 24 + int(h)) * 60 + int(mi)) * 60 * 1e6 + float(s) * 1e6)
+            digest = bytes.fromhex(digest)
+        if not m or PackedSeed(typ, 0, 0, 0, digest, elapsed, client, date).name != name:
+            date, client, elapsed = "", name, -1  # not a name given by the broker, keep it as is
+            digest = md5(seed).digest()
+        cli = client.encode()
+
+        with self._lock:
+            if self._segment_file.tell() + len(seed) > self.segment_size and self._segment_file.tell() > 0:
+                self._segment_file.close()
+                self._segment += 1
+                self._segment_file = open(self.root / self.SEGMENT_FILE.format(self._segment), "ab")
+            entry = PackedSeed(typ, self._segment, self._segment_file.tell(), len(seed), digest, elapsed, client, date)
+            self._segment_file.write(seed)
+            self._segment_file.flush()  # data before its index record
+            self._index_file.write(self.RECORD.pack(typ.value, entry.segment, entry.offset, entry.length, digest,
+                                                    elapsed, date.encode(), len(cli)) + cli)
+            self._index_file.flush()
+            self._add_entry(entry)
+        return entry
+
+    def sync(self) -> None:
+        """
+        Sync the current segment and the index to disk.
+        """
+        with self._lock:
+            os.fsync(self._segment_file.fileno())
+            os.fsync(self._index_file.fileno())
+
+    def get(self, name: str) -> Optional[PackedSeed]:
+        """
+        Get the index entry of a seed.
+
+        :param name: name of the seed (as in the per-file layout)
+        :return: index entry, None if not in the store
+        """
+        if self._names is None:
+            with self._lock:
+                if self._names is None:
+                    self._names = {x.name: x for x in self._entries}
+        return self._names.get(name)
+
+    def read(self, entry: PackedSeed) -> bytes:
+        """
+        Read the content of a seed.
+
+        :param entry: index entry of the seed
+        :return: content of the seed
+        """
+        fd = self._fds.get(entry.segment)
+        if fd is None:
+            with self._lock:
+                fd = self._fds.get(entry.segment)
+                if fd is None:
+                    fd = self._fds[entry.segment] = os.open(self.root / self.SEGMENT_FILE.format(entry.segment), os.O_RDONLY)
+        return os.pread(fd, entry.length, entry.offset)
+
+    def iter(self, typ: SeedType = None) -> Generator[PackedSeed, None, None]:
+        """
+        Iterate the index entries (in insertion order).
+
+        :param typ: type of seeds to iterate (all if None)
+        :return: generator of index entries
+        """
+        for entry in list(self._entries):
+            if typ is None or entry.typ == typ:
+                yield entry
+
+    def count(self, typ: SeedType = None) -> int:
+        """
+        Number of seeds in the store.
+
+        :param typ: type of seeds to count (all if None)
+        """
+        return sum(1 for _ in self.iter(typ))
+
+    def export(self, dirs: Dict[SeedType, Path]) -> int:
+        """
+        Write back all seeds as files (per-file layout).
+
+        :param dirs: directory where to write seeds of each type
+        :return: number of files written
+        """
+        count = 0
+        for entry in self.iter():
+            out = dirs[entry.typ] / entry.name
+            if not out.exists():
+                out.write_bytes(self.read(entry))
+                count += 1
+        return count
+
+    def close(self) -> None:
+        """
+        Close all files of the store.
+        """
+        with self._lock:
+            for f in (self._segment_file, self._index_file):
+                if f is not None:
+                    f.close()
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
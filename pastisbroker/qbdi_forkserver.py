@@ -0,0 +1,127 @@
+# This script is loaded by pyqbdipreload in the program to replay (see pastisbroker.replay.ForkServer).
+# The program is instrumented once and stopped at main, then forked for each input to replay: children
+# do not pay the process spawn, python startup and instrumentation setup. The coverage of each run is
+# sent back through a pipe instead of a file.
+# It must not import pastisbroker (nor tritondse, which is slow to import), protocol constants are
+# duplicated in pastisbroker.replay.
+
+# built-in imports
+import os
+import sys
+import json
+import time
+import atexit
+import ctypes
+import ctypes.util
+import select
+import signal
+import struct
+import importlib.util
+from collections import Counter
+
+# Third-party imports
+import lief
+import pyqbdi
+
+REQUEST = struct.Struct("<d")    # replay timeout (seconds)
+RESPONSE = struct.Struct("<iI")  # status, length of the coverage (JSON)
+STATUS_OK, STATUS_NO_COV, STATUS_TIMEOUT = 0, 1, 2
+
+# The instrumentation callbacks are the ones of the tritondse tracing script (loaded from its file)
+_spec = importlib.util.spec_from_file_location("qbdi_trace", os.path.join(
+    importlib.util.find_spec("tritondse").submodule_search_locations[0], "qbdi_trace.py"))
+qbdi_trace = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(qbdi_trace)
+
+
+def read_exactly(fd: int, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return b""
+        data += chunk
+    return data
+
+
+def write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def send_coverage(covdata, fd: int, sent: list) -> None:
+    if sent:  # the program exits after main returned
+        return
+    sent.append(True)
+    write_all(fd, json.dumps({"coverage_strategy": covdata.trace.strategy,
+                              "covered_instructions": covdata.trace.covered_instructions,
+                              "covered_items": covdata.trace.covered_items}).encode())
+    os.close(fd)
+
+
+def wait_child(pid: int, fd: int, timeout: float) -> tuple:
+    deadline = time.monotonic() + timeout
+    chunks = []
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            return STATUS_TIMEOUT, b""
+        chunk = os.read(fd, 1 << 16)
+        if not chunk:  # the child exited (or crashed)
+            break
+        chunks.append(chunk)
+    os.waitpid(pid, 0)
+    payload = b"".join(chunks)
+    return (STATUS_OK if payload else STATUS_NO_COV), payload
+
+
+def pyqbdipreload_on_run(vm, start, stop):
+    ctl, res = (int(x) for x in os.environ["PASTIS_FORKSERVER_FDS"].split(","))
+    stdin_file = os.getenv("PASTIS_FORKSERVER_STDIN")
+    strat = os.getenv("PYQBDIPRELOAD_COVERAGE_STRATEGY", "EDGE")
+
+    libdl_path = ctypes.util.find_library("dl")
+    if libdl_path is None:
+        raise Exception("Unable to found dl library")
+    qbdi_trace.libdl = ctypes.cdll.LoadLibrary(libdl_path)
+    qbdi_trace.libdl.dladdr.argtypes = (ctypes.c_void_p, ctypes.POINTER(qbdi_trace.Dl_info))
+
+    mods = qbdi_trace.get_modules()
+    covtrace = qbdi_trace.CoverageTrace(strat, Counter(), [], mods, [])
+    covdata = qbdi_trace.CoverageData(strat, None, covtrace, sorted(mods.values()), lief.parse(sys.argv[0]).is_pie, False)
+
+    # Same instrumentation as qbdi_trace (set once, inherited by children)
+    vm.removeAllInstrumentedRanges()
+    vm.addInstrumentedModuleFromAddr(start)
+    if strat == "BLOCK":
+        vm.addCodeCB(pyqbdi.PREINST, qbdi_trace.register_instruction_coverage, covdata)
+    vm.addVMEventCB(pyqbdi.BASIC_BLOCK_ENTRY, qbdi_trace.register_basic_block_coverage, covdata)
+    vm.addMnemonicCB("JCC", pyqbdi.InstPosition.POSTINST, qbdi_trace.register_branch_coverage, covdata)
+    vm.addVMEventCB(pyqbdi.EXEC_TRANSFER_CALL, qbdi_trace.handle_exec_transfer_call, None)
+
+    while True:
+        req = read_exactly(ctl, REQUEST.size)
+        if not req:  # the replay worker closed the pipe
+            break
+        timeout, = REQUEST.unpack(req)
+        cov_r, cov_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child: run the program on the input
+            os.close(cov_r)
+            os.close(ctl)
+            os.close(res)
+            if stdin_file:
+                os.dup2(os.open(stdin_file, os.O_RDONLY), 0)
+            sent = []
+            atexit.register(send_coverage, covdata, cov_w, sent)  # the program calls exit
+            vm.run(start, stop)
+            send_coverage(covdata, cov_w, sent)
+            os._exit(0)
+        os.close(cov_w)
+        status, payload = wait_child(pid, cov_r, timeout)
+        os.close(cov_r)
+        write_all(res, RESPONSE.pack(status, len(payload)) + payload)
+    os._exit(0)
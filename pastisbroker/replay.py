@@ -0,0 +1,159 @@
+# built-in imports
+import os
+import sys
+import json
+import select
+import struct
+import logging
+import subprocess
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional
+from collections import Counter
+
+# Third-party imports
+from tritondse import CoverageSingleRun, CoverageStrategy
+from tritondse.trace import TraceException
+
+
+class ReplayBackend(Enum):
+    PROCESS = 1     # A new traced process per input (QBDITrace.run), coverage exchanged through a file
+    FORKSERVER = 2  # Program instrumented once and forked for each input, coverage sent back in memory
+
+
+def coverage_from_json(data: dict) -> CoverageSingleRun:
+    """
+    Build a coverage from its JSON form (as written by the tritondse tracing script).
+
+    :param data: coverage decoded from JSON
+    :return: coverage of the run
+    """
+    cov = CoverageSingleRun(CoverageStrategy[data["coverage_strategy"]])
+    cov.covered_instructions = Counter({int(k): v for k, v in data["covered_instructions"].items()})
+    for (src, dst, not_taken) in data["covered_items"]:
+        if not_taken is None:
+            cov.add_covered_dynamic_branch(src, dst)
+        else:
+            cov.add_covered_branch(src, dst, not_taken)
+    return cov
+
+
+class ForkServer(object):
+    """
+    Replays inputs with a single instance of the program traced with QBDI,
+    stopped at main and forked for each input (see ``qbdi_forkserver.py``).
+    The input is read from the same file at each run (given on the command
+    line or as stdin). The server is (re)started on demand.
+
+    :param strategy: coverage strategy
+    :param program: program to replay inputs on
+    :param argv: arguments of the program (the input file already substituted)
+    :param stdin_file: file given as stdin to each run (None if input given in argv)
+    :param cwd: working directory of the program
+    """
+
+    SCRIPT = Path(__file__).parent / "qbdi_forkserver.py"
+    REQUEST = struct.Struct("<d")    # replay timeout (seconds)
+    RESPONSE = struct.Struct("<iI")  # status, length of the coverage (JSON)
+    STATUS_OK, STATUS_NO_COV, STATUS_TIMEOUT = 0, 1, 2
+    STARTUP_TIMEOUT = 30  # seconds, on top of the replay timeout for the first run
+
+    def __init__(self, strategy: CoverageStrategy, program: str, argv: List[str], stdin_file: str = None, cwd: str = None):
+        self.strategy = strategy
+        self.program = str(program)
+        self.argv = argv
+        self.stdin_file = stdin_file
+        self.cwd = cwd
+        self._process = None
+        self._ctl, self._res = None, None
+        self.runs = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        """
+        Start the server (the program is launched and stopped at main).
+        """
+        ctl_r, self._ctl = os.pipe()
+        self._res, res_w = os.pipe()
+        env = dict(os.environ, PYQBDIPRELOAD_COVERAGE_STRATEGY=self.strategy.name,
+                   PASTIS_FORKSERVER_FDS=f"{ctl_r},{res_w}", LD_BIND_NOW="1")
+        if self.stdin_file:
+            env["PASTIS_FORKSERVER_STDIN"] = str(self.stdin_file)
+        self._process = subprocess.Popen([sys.executable, "-m", "pyqbdipreload", str(self.SCRIPT), self.program] + self.argv,
+                                         stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL,
+                                         cwd=self.cwd,
+                                         env=env,
+                                         pass_fds=(ctl_r, res_w))
+        os.close(ctl_r)
+        os.close(res_w)
+        self.restarts += 1
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+        """
+        if self._process is None:
+            return
+        os.close(self._ctl)
+        os.close(self._res)
+        try:
+            self._process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def _read(self, size: int, deadline: float) -> bytes:
+        data = b""
+        while len(data) < size:
+            if not select.select([self._res], [], [], deadline)[0]:
+                raise TimeoutError()
+            chunk = os.read(self._res, size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def run(self, timeout: float) -> Optional[CoverageSingleRun]:
+        """
+        Run the program on the input file.
+
+        :param timeout: timeout of the run (seconds)
+        :raise TraceException: if the run timed out
+        :return: coverage of the run, None if none was produced (e.g: crash)
+        """
+        trace = self.run_trace(timeout)
+        return coverage_from_json(trace) if trace is not None else None
+
+    def run_trace(self, timeout: float) -> Optional[dict]:
+        """
+        Run the program on the input file, and return the trace as sent by
+        the server (see :py:func:`coverage_from_json`).
+
+        :param timeout: timeout of the run (seconds)
+        :raise TraceException: if the run timed out
+        :return: trace of the run, None if none was produced (e.g: crash)
+        """
+        margin = 0
+        if self._process is None:
+            self.start()
+            margin = self.STARTUP_TIMEOUT
+        try:
+            os.write(self._ctl, self.REQUEST.pack(timeout))
+            status, length = self.RESPONSE.unpack(self._read(self.RESPONSE.size, timeout + margin + 1))
+            payload = self._read(length, timeout + 1)
+        except (OSError, EOFError, TimeoutError):  # the server died or hangs, it will be restarted
+            logging.warning(f"replay fork server of {Path(self.program).name} stopped unexpectedly")
+            self.stop()
+            return None
+        self.runs += 1
+        if status == self.STATUS_TIMEOUT:
+            raise TraceException("QBDI fork server timeout expired")
+        if status != self.STATUS_OK:
+            return None
+        try:
+            return json.loads(payload)
+        except json.JSONDecodeError:
+            return None
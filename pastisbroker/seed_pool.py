@@ -0,0 +1,269 @@
+# built-in imports
+import re
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Third-party imports
+from libpastis.types import SeedType
+
+
+class SeedBitset(object):
+    """
+    Growable set of seed ids (as given by :py:meth:`SeedPool.seed_id`)
+    stored as a bitmap: one bit per seed id.
+    """
+
+    __slots__ = ("_bits", "_count")
+
+    _NOT_FULL = re.compile(b"[^\xff]")
+
+    def __init__(self):
+        self._bits = bytearray()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, id: int) -> bool:
+        i = id >> 3
+        return i < len(self._bits) and bool(self._bits[i] >> (id & 7) & 1)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the bitmap.
+        """
+        return len(self._bits)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the set (bit ``i`` of the byte ``i // 8`` is set if id ``i`` is in).
+        """
+        return bytes(self._bits).rstrip(b"\0")
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'SeedBitset':
+        """
+        Create a set from the bytes returned by :py:meth:`to_bytes`.
+        """
+        s = SeedBitset()
+        s._bits = bytearray(data)
+        s._count = bin(int.from_bytes(data, "little")).count("1")
+        return s
+
+    def add(self, id: int) -> None:
+        """
+        Add a seed id in the set.
+
+        :param id: seed id
+        """
+        i = id >> 3
+        if i >= len(self._bits):  # grow geometrically
+            self._bits.extend(bytes(max(i + 1 - len(self._bits), len(self._bits))))
+        mask = 1 << (id & 7)
+        if not self._bits[i] & mask:
+            self._bits[i] |= mask
+            self._count += 1
+
+    def missing(self, size: int, other: 'SeedBitset' = None, start: int = 0) -> Iterator[int]:
+        """
+        Iterate the ids from ``start`` and lower than ``size`` neither in this
+        set nor in ``other``.
+
+        :param size: number of seed ids allocated
+        :param other: another set whose ids are to be excluded too
+        :param start: first id to consider
+        :return: iterator of seed ids
+        """
+        n = (size + 7) >> 3
+        bits = bytes(self._bits[:n]).ljust(n, b"\0")
+        if other is not None:
+            extra = bytes(other._bits[:n]).ljust(n, b"\0")
+            bits = (int.from_bytes(bits, "little") | int.from_bytes(extra, "little")).to_bytes(n, "little")
+        for m in self._NOT_FULL.finditer(bits, start >> 3):  # skip bytes whose 8 seeds are all known
+            i = m.start()
+            byte = bits[i]
+            for j in range(max(0, start - (i << 3)), min(8, size - (i << 3))):
+                if not byte >> j & 1:
+                    yield (i << 3) | j
+
+
+class SeedPool(object):
+    """
+    Pool of seeds. Each seed is given a dense integer id (by its md5 digest)
+    when first received, and seeds are then referred to by this id. The
+    body of a seed is left in the file it has been written to (in the
+    workspace) and read back when needed. The most recently used bodies are
+    kept in memory, up to ``cache_size`` bytes. Seeds added without a file
+    are kept in memory.
+
+    :param cache_size: maximum cumulated size (in bytes) of seed bodies cached
+    :param reader: function reading a seed file (e.g: one aware of files not written yet)
+    """
+
+    def __init__(self, cache_size: int = 64 * 1024 * 1024, reader: Callable[[str], bytes] = None):
+        self.cache_size = cache_size
+        self._reader = (lambda x: Path(x).read_bytes()) if reader is None else reader
+        self.hits = 0  # bodies found in memory
+        self.misses = 0  # bodies read from disk
+        self._ids = {}  # digest -> seed id
+        self._digests = []  # seed id -> digest
+        self._seeds = {}  # seed id -> (SeedType, file path or None) of seeds in the pool
+        self._pinned = {}  # seed id -> bytes (seeds without file)
+        self._cache = OrderedDict()  # seed id -> bytes (in LRU order)
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._seeds)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._seeds
+
+    @property
+    def id_count(self) -> int:
+        """
+        Number of seed ids allocated (seeds in the pool or not).
+        """
+        return len(self._digests)
+
+    @property
+    def cache_bytes(self) -> int:
+        """
+        Cumulated size of seed bodies held in memory.
+        """
+        return self._cache_bytes + sum(len(x) for x in self._pinned.values())
+
+    def seed_id(self, digest: bytes) -> int:
+        """
+        Get the id of a seed, allocate one if the seed has never been seen.
+
+        :param digest: md5 digest of the seed
+        :return: seed id
+        """
+        id = self._ids.get(digest)
+        if id is None:
+            with self._lock:
+                id = self._ids.setdefault(digest, len(self._digests))
+                if id == len(self._digests):
+                    self._digests.append(digest)
+        return id
+
+    def restore_ids(self, digests: bytes) -> None:
+        """
+        Allocate ids as in a previous run (must be called before any seed
+        is added), so that sets of ids saved remain valid.
+
+        :param digests: concatenation of the digests by id (as returned by :py:meth:`dump_ids`)
+        """
+        with self._lock:
+            if self._digests:
+                raise ValueError("seed ids already allocated")
+            self._digests = [digests[i:i+16] for i in range(0, len(digests), 16)]
+            self._ids = {x: i for i, x in enumerate(self._digests)}
+
+    def dump_ids(self) -> bytes:
+        """
+        Get the digests of all seeds, by id.
+
+        :return: concatenation of 16 bytes md5 digests
+        """
+        with self._lock:
+            return b"".join(self._digests)
+
+    def digest(self, id: int) -> bytes:
+        """
+        Get the md5 digest of a seed.
+
+        :param id: seed id
+        :return: md5 digest
+        """
+        return self._digests[id]
+
+    def add(self, id: int, typ: SeedType, path: Optional[Path] = None, seed: Optional[bytes] = None) -> bool:
+        """
+        Add a seed in the pool (if not already in).
+
+        :param id: seed id
+        :param typ: type of the seed
+        :param path: file holding the seed (if None the seed is kept in memory)
+        :param seed: content of the seed if already in memory
+        :return: True if the seed was not in the pool
+        """
+        if path is None and seed is None:
+            raise ValueError("a seed needs either a file or its content")
+        with self._lock:
+            if id in self._seeds:
+                return False
+            self._seeds[id] = (typ, None if path is None else str(path))
+            if path is None:
+                self._pinned[id] = seed
+            elif seed is not None:
+                self._cache_put(id, seed)
+            return True
+
+    def get(self, id: int) -> Optional[bytes]:
+        """
+        Get the content of a seed (read from disk if not cached).
+
+        :param id: seed id
+        :return: content of the seed, None if not in the pool or its file cannot be read
+        """
+        with self._lock:
+            entry = self._seeds.get(id)
+            if entry is None:
+                return None
+            seed = self._pinned.get(id)
+            if seed is None:
+                seed = self._cache.get(id)
+                if seed is not None:
+                    self._cache.move_to_end(id)
+            if seed is not None:
+                self.hits += 1
+                return seed
+        try:
+            seed = self._reader(entry[1])
+        except OSError as e:
+            logging.warning(f"cannot read seed {self._digests[id].hex()}: {e}")
+            return None
+        with self._lock:
+            self.misses += 1
+            self._cache_put(id, seed)
+        return seed
+
+    def seed_type(self, id: int) -> Optional[SeedType]:
+        """
+        Get the type of a seed.
+
+        :param id: seed id
+        :return: type of the seed, None if not in the pool
+        """
+        entry = self._seeds.get(id)
+        return None if entry is None else entry[0]
+
+    def items(self) -> List[Tuple[int, SeedType]]:
+        """
+        Get the id and type of all seeds (in insertion order).
+        """
+        with self._lock:
+            return [(x, typ) for x, (typ, _) in self._seeds.items()]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the counters of the pool (for logging).
+        """
+        return {"seeds": len(self._seeds), "ids": len(self._digests), "cache_bytes": self.cache_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def _cache_put(self, id: int, seed: bytes) -> None:
+        # Must be called with _lock held
+        if id in self._cache:
+            return
+        self._cache[id] = seed
+        self._cache_bytes += len(seed)
+        while self._cache_bytes > self.cache_size:
+            _, old = self._cache.popitem(last=False)
+            self._cache_bytes -= len(old)
@@ -0,0 +1,95 @@
+# built-in imports
+import threading
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+
+class SharedSlots(object):
+    """
+    Fixed-size slots in a shared memory block, to exchange data (seeds,
+    replay results) with worker processes without pickling it: only slot
+    numbers and lengths go through queues. Slots are allocated by the
+    process which created the block, a slot handed to a worker is owned
+    by it until it hands it back. Data larger than a slot cannot be stored
+    (callers send it inline instead).
+
+    :param count: number of slots
+    :param size: size of a slot (bytes)
+    """
+
+    def __init__(self, count: int = 256, size: int = 64 * 1024):
+        self.count = count
+        self.size = size
+        self._shm = SharedMemory(create=True, size=count * size)
+        self._owner = True  # the creator unlinks the block
+        self._free = deque(range(count))
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Workers started with the spawn method attach to the block by name
+        return {"name": self._shm.name, "count": self.count, "size": self.size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.count = state["count"]
+        self.size = state["size"]
+        self._shm = SharedMemory(name=state["name"])
+        self._owner = False
+        self._free = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def free(self) -> int:
+        """
+        Number of slots not allocated.
+        """
+        return len(self._free)
+
+    def acquire(self) -> Optional[int]:
+        """
+        Allocate a slot.
+
+        :return: slot number, None if all slots are allocated
+        """
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot: int) -> None:
+        """
+        Free a slot allocated with :py:meth:`acquire`.
+        """
+        with self._lock:
+            self._free.append(slot)
+
+    def write(self, slot: int, data: bytes) -> bool:
+        """
+        Write data in a slot.
+
+        :param slot: slot number
+        :param data: data to write
+        :return: False if the data does not fit in a slot (nothing written)
+        """
+        if len(data) > self.size:
+            return False
+        off = slot * self.size
+        self._shm.buf[off:off + len(data)] = data
+        return True
+
+    def read(self, slot: int, length: int) -> bytes:
+        """
+        Read data written in a slot.
+
+        :param slot: slot number
+        :param length: length of the data
+        :return: copy of the data
+        """
+        off = slot * self.size
+        return bytes(self._shm.buf[off:off + length])
+
+    def close(self) -> None:
+        """
+        Close the block (and destroy it if this process created it).
+        """
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
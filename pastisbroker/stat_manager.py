@@ -11,15 +11,19 @@ from libpastis.types import SeedType
 # Local imports
 from pastisbroker.client import PastisClient
 from pastisbroker.workspace import Workspace
+from pastisbroker.metadata import MetadataIndex
 
 
 class StatManager(object):
     """
-    Keeps temporal statistics to plot them.
+    Keeps temporal statistics to plot them. Telemetry samples and final
+    client statistics are also recorded in the metadata index (if any).
     """
-    def __init__(self, workspace: Workspace):
+    def __init__(self, workspace: Workspace, metadata: MetadataIndex = None):
+        self.metadata = metadata
+
         # Configure CSV writer that will write stats
-        names = ['date', 'id', 'exec_per_sec', 'total_exec', 'cycle', 'timeout', 'block', 'edge', 'path', 'last_cov_update']
+        names = MetadataIndex.TELEMETRY_FIELDS
         self._tel_file = open(workspace.telemetry_file, "w")
         self.writer = csv.DictWriter(self._tel_file, fieldnames=names)
         self.writer.writeheader()
@@ -73,8 +77,16 @@ class StatManager(object):
         if last_up is not None:
             client.last_cov_update = last_up  # instantaneous value does not keep history
 
+    @staticmethod
+    def set_seed_backlog(client: PastisClient, count: int, bytes: int = 0, top: int = 0, wait: float = 0.0):
+        # instantaneous values do not keep history
+        client.seed_backlog = count
+        client.seed_backlog_bytes = bytes
+        client.seed_backlog_top = top
+        client.seed_backlog_wait = wait
+
     def update_telemetry_client(self, client: PastisClient):
-        self.writer.writerow({
+        row = {
             'date': time.time(),
             'id': client.strid,
             'exec_per_sec': client.exec_per_sec,
@@ -84,8 +96,15 @@ class StatManager(object):
             'block': client.coverage_block,
             'edge': client.coverage_edge,
             'path': client.coverage_path,
-            'last_cov_update': client.last_cov_update
-        })
+            'last_cov_update': client.last_cov_update,
+            'seed_backlog': client.seed_backlog,
+            'seed_backlog_bytes': client.seed_backlog_bytes,
+            'seed_backlog_top': client.seed_backlog_top,
+            'seed_backlog_wait': round(client.seed_backlog_wait, 3)
+        }
+        self.writer.writerow(row)
+        if self.metadata is not None:
+            self.metadata.add_telemetry(row)
 
 
     def post_execution(self, clients: List[PastisClient], workspace: Workspace) -> None:
@@ -95,5 +114,8 @@ class StatManager(object):
         """
         self._tel_file.flush()  # Flush the csv if it has not been
 
+        stats = [cli.to_dict() for cli in clients if cli.is_running()]
         with open(workspace.clients_stat_file, "w") as f:
-            json.dump([cli.to_dict() for cli in clients if cli.is_running()], f, indent=2)
+            json.dump(stats, f, indent=2)
+        if self.metadata is not None:
+            self.metadata.set_clients(stats)
@@ -1,12 +1,15 @@
+import os
+import csv
 import json
 from pathlib import Path
-from typing import Iterator, Generator
+from typing import Iterator, Generator, Optional, Tuple
 import shutil
 import stat
 from enum import Enum, auto
 
 from libpastis.types import SeedType, PathLike
 from libpastis import SASTReport
+from pastisbroker.packed_corpus import PackedCorpus
 
 
 class WorkspaceStatus(Enum):
@@ -23,6 +26,8 @@ class Workspace(object):
     BINS_DIR = "binaries"
     ALERTS_DIR = "alerts_data"
     SEED_DIR = "seeds"
+    PACKED_DIR = "packed"
+    REPLAY_CACHE_DIR = "replay_cache"
 
     SAST_REPORT_COPY = "sast-report.bin"
     CSV_FILE = "results.csv"
@@ -32,8 +37,13 @@ class Workspace(object):
     STATUS_FILE = "STATUS"
     RUNTIME_CONFIG_FILE = "config.json"
     COVERAGE_HISTORY = "coverage-history.csv"
+    CHECKPOINT_FILE = "checkpoint.json"
+    COVERAGE_CHECKPOINT = "checkpoint-coverage.pickle"
+    DUPLICATES_FILE = "duplicates.csv"
+    METADATA_DB = "metadata.db"
+    BROKING_STATS = "broking-stats.json"
 
-    def __init__(self, directory: Path, erase: bool = False):
+    def __init__(self, directory: Path, erase: bool = False, packed: bool = False):
         self.root = directory
 
         if erase:  # If want to erase the whole workspace
@@ -55,6 +65,11 @@ class Workspace(object):
         else:
             self._status = WorkspaceStatus[status_file.read_text()]
 
+        # Seeds received stored in a packed corpus (instead of a file per seed), kept once used
+        self.pack = None
+        if packed or (self.root / self.PACKED_DIR).exists():
+            self.pack = PackedCorpus(self.root / self.PACKED_DIR)
+
     def initialize_runtime(self, binaries_dir: PathLike, params: dict):
         # First copy binary files in workspace if different directories
         if self.root / self.BINS_DIR != binaries_dir:
@@ -74,7 +89,20 @@ class Workspace(object):
             yield file
 
     def count_corpus_directory(self, typ: SeedType) -> int:
-        return sum(1 for _ in self.iter_corpus_directory(typ))
+        count = sum(1 for _ in self.iter_corpus_directory(typ))
+        return count + self.pack.count(typ) if self.pack is not None else count
+
+    def export_packed(self) -> int:
+        """
+        Write the seeds of the packed corpus (if any) as files in the corpus
+        directories (for tools expecting a file per seed).
+
+        :return: number of files written
+        """
+        if self.pack is None:
+            return 0
+        dir_map = {SeedType.INPUT: self.INPUT_DIR, SeedType.CRASH: self.CRASH_DIR, SeedType.HANG: self.HANGS_DIR}
+        return self.pack.export({x: self.root / d for x, d in dir_map.items()})
 
     @property
     def status(self) -> WorkspaceStatus:
@@ -117,6 +145,82 @@ class Workspace(object):
     def coverage_history(self) -> Path:
         return self.root / self.COVERAGE_HISTORY
 
+    @property
+    def metadata_file(self) -> Path:
+        return self.root / self.METADATA_DB
+
+    @property
+    def duplicates_file(self) -> Path:
+        return self.root / self.DUPLICATES_FILE
+
+    def iter_duplicates(self) -> Generator[Tuple[str, SeedType], None, None]:
+        """
+        Iterate the seeds received again while already in the corpus (they
+        are not written, only the name their file would have had is recorded).
+
+        :return: generator of seed file names and types
+        """
+        if not self.duplicates_file.exists():
+            return
+        with open(self.duplicates_file, newline="") as f:
+            for name, typ in csv.reader(f):
+                yield name, SeedType[typ]
+
+    @property
+    def broking_stats_file(self) -> Path:
+        return self.root / self.BROKING_STATS
+
+    def save_broking_stats(self, stats: dict) -> None:
+        """
+        Write the traffic and coverage statistics of the broking mode.
+
+        :param stats: JSON serializable statistics
+        """
+        self.broking_stats_file.write_text(json.dumps(stats, indent=2))
+
+    def load_broking_stats(self) -> Optional[dict]:
+        """
+        Read the statistics of the broking mode (to compare campaigns).
+
+        :return: statistics, None if not recorded
+        """
+        if not self.broking_stats_file.exists():
+            return None
+        return json.loads(self.broking_stats_file.read_text())
+
+    @property
+    def checkpoint_file(self) -> Path:
+        return self.root / self.CHECKPOINT_FILE
+
+    @property
+    def coverage_checkpoint_file(self) -> Path:
+        return self.root / self.COVERAGE_CHECKPOINT
+
+    @property
+    def replay_cache_directory(self) -> Path:
+        return self.root / self.REPLAY_CACHE_DIR
+
+    def save_checkpoint(self, state: dict) -> None:
+        """
+        Write the broker checkpoint (atomically, a crash while writing
+        keeps the previous checkpoint).
+
+        :param state: JSON serializable state
+        """
+        tmp = self.checkpoint_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.checkpoint_file)
+
+    def load_checkpoint(self) -> Optional[dict]:
+        """
+        Read the last broker checkpoint.
+
+        :return: state saved, None if there is no checkpoint
+        """
+        if not self.checkpoint_file.exists():
+            return None
+        return json.loads(self.checkpoint_file.read_text())
+
     def add_binary(self, binary_path: Path) -> Path:
         """
         Add a binary in the workspace directory structure.
@@ -165,16 +269,41 @@ class Workspace(object):
         p = ((self.root / self.ALERTS_DIR) / str(id)) / name
         p.write_bytes(data)
 
-    def save_seed_file(self, typ: SeedType, file: Path, initial: bool = False) -> None:
-        dir_map = {SeedType.INPUT: self.INPUT_DIR, SeedType.CRASH: self.CRASH_DIR, SeedType.HANG: self.HANGS_DIR}
+    def save_seed_file(self, typ: SeedType, file: Path, initial: bool = False) -> Path:
         if initial:
             out = self.root / self.SEED_DIR / file.name
         else:
-            out = self.root / dir_map[typ] / file.name
+            out = self.seed_path(typ, file.name)
         if str(file) != str(out):
             shutil.copy(str(file), str(out))
+        return out
+
+    def save_seed(self, typ: SeedType, name: str, data: bytes) -> Path:
+        out = self.seed_path(typ, name)
+        if self.pack is not None:
+            self.pack.append(typ, name, data)
+        else:
+            out.write_bytes(data)
+        return out
+
+    def read_seed(self, path: Path) -> bytes:
+        """
+        Read a seed of the corpus, either from its file or from the packed corpus.
+
+        :param path: path of the seed (as given by :py:meth:`seed_path`)
+        :return: content of the seed
+        """
+        if self.pack is not None and (entry := self.pack.get(path.name)) is not None:
+            return self.pack.read(entry)
+        return path.read_bytes()
 
-    def save_seed(self, typ: SeedType, name: str, data: bytes) -> None:
+    def seed_path(self, typ: SeedType, name: str) -> Path:
+        """
+        Get the path of a seed file in the corpus directory of its type.
+
+        :param typ: type of the seed
+        :param name: name of the seed file
+        :return: path of the seed file
+        """
         dir_map = {SeedType.INPUT: self.INPUT_DIR, SeedType.CRASH: self.CRASH_DIR, SeedType.HANG: self.HANGS_DIR}
-        out = self.root / dir_map[typ] / name
-        out.write_bytes(data)
+        return self.root / dir_map[typ] / name
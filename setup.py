@@ -53,6 +53,7 @@ setup(
         "watchdog",
         "pydantic",
         "matplotlib",
+        "numpy",
         "joblib",
         "rich",
         "tritondse>=v0.1.11",
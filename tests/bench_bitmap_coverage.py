@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the global coverage of the coverage manager.
+
+Runs covering random edges of a synthetic program are checked and merged
+as :py:meth:`CoverageManager.coverage_worker` does, once with a
+:py:class:`GlobalCoverage` and once with a :py:class:`BitmapCoverage`.
+The time per run and the memory held by the global coverage are printed
+(runs are created anew for each, as the broker parses them from replays).
+"""
+import gc
+import time
+import random
+import argparse
+import tracemalloc
+
+from tritondse import GlobalCoverage, CoverageSingleRun, CoverageStrategy, BranchSolvingStrategy
+from pastisbroker.bitmap_coverage import BitmapCoverage
+
+
+def mk_runs(seed: int, count: int, edges: int, per_run: int) -> list:
+    random.seed(seed)
+    runs = []
+    # Edges are more or less easy to reach: new edges get rarer as runs go
+    for _ in range(count):
+        run = CoverageSingleRun(CoverageStrategy.EDGE)
+        for e in {min(int(random.expovariate(20 / edges)), edges - 1) for _ in range(per_run)}:
+            src = 0x1000 + e * 16
+            run.add_covered_branch(src, src + 8, src + 4)
+        runs.append(run)
+    return runs
+
+
+def check_global(cov: GlobalCoverage, run: CoverageSingleRun) -> None:
+    if cov.improve_coverage(run):
+        list(run.difference(cov))
+        cov.merge(run)
+
+
+def bench(cov, check, args) -> tuple:
+    tracemalloc.start()
+    runs = mk_runs(args.seed, args.count, args.edges, args.per_run)
+    t0 = time.perf_counter()
+    for run in runs:
+        check(cov, run)
+    elapsed = time.perf_counter() - t0
+    del runs
+    gc.collect()
+    mem = tracemalloc.get_traced_memory()[0]  # held by the global coverage only
+    tracemalloc.stop()
+    return elapsed, mem, cov.unique_covitem_covered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Global coverage benchmark")
+    parser.add_argument("-n", "--count", type=int, default=2000, help="number of runs")
+    parser.add_argument("-e", "--edges", type=int, default=200000, help="number of edges of the program")
+    parser.add_argument("-r", "--per-run", type=int, default=2000, help="number of edges covered per run")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    for cov, check in [(GlobalCoverage(CoverageStrategy.EDGE, BranchSolvingStrategy.ALL_NOT_COVERED), check_global),
+                       (BitmapCoverage(CoverageStrategy.EDGE), BitmapCoverage.update)]:
+        elapsed, mem, covered = bench(cov, check, args)
+        name = cov.__class__.__name__
+        print(f"{name:>15}: {elapsed / args.count * 1e6:8.1f}us/run  memory: {mem / 1024 / 1024:7.1f}MB  edges covered: {covered}")
+
+'''
+PYTHONPATH=. python3 ./tests/bench_bitmap_coverage.py
+'''
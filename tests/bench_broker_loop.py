@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the end-to-end latency of seeds going through the main loop of
+the broker (:py:meth:`PastisBroker.run`), and of its CPU usage when idle.
+
+The broker is run as a proxy of an upstream broker: the upstream broker submits
+seeds to the broker which forwards them (through its main loop) to a fuzzing
+client. All agents run in this process, each seed carries its submission time,
+and the latency is measured on reception by the fuzzing client. The client
+impersonates the engine given (it needs a binary it supports, e.g: /bin/ls).
+"""
+import time
+import shutil
+import struct
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+from libpastis.agent import BrokerAgent, ClientAgent
+from libpastis.types import SeedType, FuzzingEngineInfo, ExecMode, FuzzMode, CheckMode, CoverageMode, SeedInjectLoc
+from pastisbroker import PastisBroker, BrokingMode
+from pastisbroker.utils import load_engine_descriptor
+
+
+def bench(port: int, count: int, interval: float, idle: float, engine: str, binary: str):
+    tmp = Path(tempfile.mkdtemp())
+    (tmp / "bins").mkdir()
+    shutil.copy(binary, tmp / "bins")
+    desc = load_engine_descriptor(engine)
+    engine_info = FuzzingEngineInfo(desc.NAME, desc.VERSION, engine)
+
+    # Upstream broker
+    upstream = BrokerAgent()
+    hellos = []
+    upstream.register_hello_callback(lambda cli_id, *args: hellos.append(cli_id))
+    upstream.bind(port + 1, "127.0.0.1")
+    upstream.start()
+
+    # Broker under test, proxy of the upstream one
+    broker = PastisBroker(tmp / "ws", tmp / "bins", BrokingMode.FULL, checkpoint_interval=0, heartbeat_timeout=0)
+    broker.set_proxy("127.0.0.1", port + 1, engine)
+    broker.bind(port, "127.0.0.1")
+    th = threading.Thread(target=broker.run, daemon=True)
+    th.start()
+    while not hellos:
+        time.sleep(0.01)
+
+    # Fuzzing client, measure the latency of seeds received
+    client = ClientAgent()
+    latencies, started = [], []
+    client.register_start_callback(lambda *args: started.append(True))
+    client.register_seed_callback(lambda typ, seed: latencies.append(time.perf_counter() - struct.unpack("d", seed[:8])[0]))
+    client.connect("127.0.0.1", port)
+    client.start()
+    client.send_hello([engine_info])
+    upstream.send_start(hellos[0], "prog", tmp / "bins" / Path(binary).name, [], ExecMode.SINGLE_EXEC, FuzzMode.INSTRUMENTED,
+                        CheckMode.CHECK_ALL, CoverageMode.EDGE, engine_info, "", SeedInjectLoc.STDIN)
+    deadline = time.time() + 5
+    while not started and time.time() < deadline:
+        time.sleep(0.01)
+    if not started:
+        print("fuzzing client not started (binary not supported by the engine?)")
+        return
+
+    # CPU used by the whole process when idle
+    t0, c0 = time.perf_counter(), time.process_time()
+    time.sleep(idle)
+    cpu = (time.process_time() - c0) / (time.perf_counter() - t0)
+
+    # Seeds sent one by one at random intervals
+    for _ in range(count):
+        upstream.send_seed(hellos[0], SeedType.INPUT, struct.pack("d", time.perf_counter()) + random.randbytes(32))
+        time.sleep(random.uniform(0, 2 * interval))
+    deadline = time.time() + 5
+    while len(latencies) < count and time.time() < deadline:
+        time.sleep(0.05)
+
+    broker._stop = True
+    broker.wake_main_loop()
+    th.join(5)
+    client.stop()
+    upstream.stop()
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    print(f"seeds: {len(ms)}/{count}  latency p50: {ms[len(ms) // 2]:.2f}ms  p95: {ms[int(len(ms) * 0.95)]:.2f}ms  "
+          f"max: {ms[-1]:.2f}ms  idle cpu: {cpu * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker main loop latency benchmark")
+    parser.add_argument("-n", "--count", type=int, default=200, help="number of seeds")
+    parser.add_argument("-i", "--interval", type=float, default=0.02, help="mean interval between two seeds (seconds)")
+    parser.add_argument("--idle", type=float, default=3, help="duration of the idle CPU measurement (seconds)")
+    parser.add_argument("-e", "--engine", type=str, default="pastistritondse.addon", help="engine module impersonated by the proxy and the client")
+    parser.add_argument("-b", "--binary", type=str, default="/bin/ls", help="binary the fuzzing client is started on")
+    parser.add_argument("-p", "--port", type=int, default=5585, help="port to bind on (and the next one)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    bench(args.port, args.count, args.interval, args.idle, args.engine, args.binary)
+
+'''
+PYTHONPATH=.:engines python3 ./tests/bench_broker_loop.py
+'''
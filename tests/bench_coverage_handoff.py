@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the hand-off of replay coverages to the coverage worker.
+
+Synthetic QBDI traces are merged in a :py:class:`BitmapCoverage` as the
+coverage worker does, either parsing the trace file on the coverage thread
+(former hand-off) or reading the edge list produced by the replay worker.
+The time per trace spent on the (serial) coverage thread, and the time
+spent by replay workers to produce the edge list, are printed.
+"""
+import json
+import time
+import random
+import tempfile
+import argparse
+from pathlib import Path
+
+from tritondse.trace import QBDITrace
+from pastisbroker.bitmap_coverage import BitmapCoverage, EdgeList
+
+
+def mk_trace(edges: int, per_run: int) -> dict:
+    rows = []
+    for _ in range(per_run):
+        src = 0x1000 + min(int(random.expovariate(20 / edges)), edges - 1) * 16
+        taken, not_taken = (src + 8, src + 4) if random.random() < 0.5 else (src + 4, src + 8)
+        rows.append([src, taken, not_taken])
+    return {"coverage_strategy": "EDGE", "covered_instructions": {}, "covered_items": rows,
+            "trace": [], "modules_base": {}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coverage hand-off benchmark")
+    parser.add_argument("-n", "--count", type=int, default=500, help="number of traces")
+    parser.add_argument("-e", "--edges", type=int, default=200000, help="number of edges of the program")
+    parser.add_argument("-r", "--per-run", type=int, default=20000, help="number of branches of a trace")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    tmpdir = Path(tempfile.mkdtemp())
+    files = []
+    for i in range(args.count):
+        files.append(tmpdir / f"{i}.cov")
+        files[-1].write_text(json.dumps(mk_trace(args.edges, args.per_run)))
+
+    # Former hand-off: the coverage file is parsed by the coverage worker
+    cov = BitmapCoverage()
+    t0 = time.perf_counter()
+    for f in files:
+        cov.update(QBDITrace.from_file(str(f)).coverage)
+    before = time.perf_counter() - t0
+
+    # Replay workers parse the trace and send the edge list
+    t0 = time.perf_counter()
+    blobs = [EdgeList.from_trace(json.loads(f.read_text())).to_bytes() for f in files]
+    worker = time.perf_counter() - t0
+    cov2 = BitmapCoverage()
+    t0 = time.perf_counter()
+    for data in blobs:
+        cov2.update(EdgeList.from_bytes(data))
+    after = time.perf_counter() - t0
+
+    for f in files:
+        f.unlink()
+    tmpdir.rmdir()
+    print(f"coverage thread: trace file: {before / args.count * 1e3:7.2f}ms/trace  "
+          f"edge list: {after / args.count * 1e3:7.2f}ms/trace  (replay workers: {worker / args.count * 1e3:7.2f}ms/trace)")
+    print(f"edges covered: {cov.unique_covitem_covered} / {cov2.unique_covitem_covered}  "
+          f"edge list size: {sum(map(len, blobs)) // args.count} bytes/trace")
+
+'''
+PYTHONPATH=. python3 ./tests/bench_coverage_handoff.py
+'''
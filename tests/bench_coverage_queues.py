@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the transport of inputs between the coverage manager and its
+replay workers.
+
+Workers do not replay inputs, they send back a result right away
+(without coverage) so that only the transport is measured. It is compared to the former transport:
+``Manager().Queue()`` proxies carrying the whole :py:class:`ClientInput`
+both ways.
+"""
+import time
+import argparse
+from multiprocessing import Manager
+from multiprocessing.pool import Pool
+
+from libpastis.types import SeedType, SeedInjectLoc
+from pastisbroker.coverage import CoverageManager, ClientInput
+
+
+def mk_input(i: int, size: int) -> ClientInput:
+    return ClientInput(bytes(size), "", "", "", f"{i:032x}", "", SeedType.INPUT, b"cli", "bench", "", "", 0, [])
+
+
+def echo_manager(input_queue, cov_queue) -> None:
+    while True:
+        item = input_queue.get()
+        cov_queue.put((item, f"/tmp/{item.hash}.cov"))
+
+
+def echo_slots() -> None:
+    input_queue, cov_queue, slots = CoverageManager._worker_ctx
+    while True:
+        ticket, slot, length, h, content = input_queue.get()
+        data = slots.read(slot, length) if content is None else content
+        CoverageManager._put_result(cov_queue, slots, ticket, slot, "SUCCESS", 0, None)
+
+
+def bench_manager(count: int, size: int, workers: int) -> float:
+    manager = Manager()
+    in_q, out_q = manager.Queue(), manager.Queue()
+    pool = Pool(workers)
+    for _ in range(workers):
+        pool.apply_async(echo_manager, (in_q, out_q))
+    t0 = time.perf_counter()
+    for i in range(count):
+        in_q.put(mk_input(i, size))
+    for _ in range(count):
+        out_q.get()
+    elapsed = time.perf_counter() - t0
+    pool.terminate()
+    manager.shutdown()
+    return elapsed
+
+
+def bench_slots(count: int, size: int, workers: int) -> float:
+    cm = CoverageManager(workers, 60, True, "/bin/true", [], SeedInjectLoc.STDIN)
+    for _ in range(workers):
+        cm.pool.apply_async(echo_slots)
+    t0 = time.perf_counter()
+    for i in range(count):
+        cm.push_input(mk_input(i, size))
+    for _ in range(count):
+        cm._pop_result(timeout=60)
+    elapsed = time.perf_counter() - t0
+    cm.stop()
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coverage manager queues benchmark")
+    parser.add_argument("-n", "--count", type=int, default=5000, help="number of inputs")
+    parser.add_argument("-s", "--size", type=int, nargs="+", default=[64, 4096, 65536], help="input sizes")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="number of replay workers")
+    args = parser.parse_args()
+
+    for size in args.size:
+        before = bench_manager(args.count, size, args.workers)
+        after = bench_slots(args.count, size, args.workers)
+        print(f"size:{size:>8}  manager queues: {before / args.count * 1e6:8.1f}us/input  "
+              f"shared slots: {after / args.count * 1e6:8.1f}us/input")
+
+'''
+PYTHONPATH=. python3 ./tests/bench_coverage_queues.py
+'''
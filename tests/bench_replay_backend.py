@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the replay backends of the coverage manager.
+
+The inputs of a directory are replayed by a single replay worker of a
+:py:class:`CoverageManager` (results are read directly, not through the
+coverage worker) with each backend.
+The number of inputs replayed per second and whether both backends give
+the same coverage are printed.
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+from libpastis.types import SeedType, SeedInjectLoc
+from pastisbroker.coverage import CoverageManager, ClientInput
+from pastisbroker.replay import ReplayBackend
+
+
+def replay(backend: ReplayBackend, program: str, argv: list, inj: SeedInjectLoc, inputs: list, timeout: int) -> dict:
+    cm = CoverageManager(1, timeout, True, program, argv, inj, replay_backend=backend)
+    cm.pool.apply_async(cm.pool_worker, (program, argv, inj, timeout, backend))
+
+    t0 = time.perf_counter()
+    for i, data in enumerate(inputs):
+        cm.push_input(ClientInput(data, "", "", "", f"{i:032x}", "", SeedType.INPUT, b"", "bench", "", "", 0, []))
+    res = {}
+    for _ in inputs:
+        item, cov = cm._pop_result(timeout=timeout + 60)
+        res[item.hash] = (item.replay_status, set(map(tuple, cov.items.tolist())) if cov is not None else None)
+    elapsed = time.perf_counter() - t0
+    cm.stop()
+
+    fails = sum(1 for st, _ in res.values() if st != "SUCCESS")
+    print(f"{backend.name:>10}: {len(inputs)} inputs in {elapsed:.2f}s  {len(inputs) / elapsed:8.1f} inputs/s/worker  (failed: {fails})")
+    return res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay backends benchmark")
+    parser.add_argument("program", type=str, help="program to replay inputs on")
+    parser.add_argument("corpus", type=str, help="directory of inputs")
+    parser.add_argument("args", type=str, nargs="*", help="program arguments ('@@' replaced by the input file)")
+    parser.add_argument("-n", "--count", type=int, default=200, help="maximum number of inputs to replay")
+    parser.add_argument("-t", "--timeout", type=int, default=10, help="replay timeout (seconds)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    inputs = [x.read_bytes() for x in sorted(Path(args.corpus).iterdir()) if x.is_file()][:args.count]
+    if not inputs:
+        print(f"no input in {args.corpus}")
+        sys.exit(1)
+    inj = SeedInjectLoc.ARGV if CoverageManager.ARGV_PLACEHOLDER in args.args else SeedInjectLoc.STDIN
+    program = str(Path(args.program).absolute())
+
+    results = [replay(b, program, args.args, inj, inputs, args.timeout) for b in ReplayBackend]
+    same = sum(1 for h in results[0] if results[0][h][1] == results[1][h][1])
+    print(f"same coverage: {same}/{len(inputs)}")
+
+'''
+PYTHONPATH=. python3 ./tests/bench_replay_backend.py ./program ./corpus @@
+'''
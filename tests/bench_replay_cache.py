@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the replay cache of the coverage manager.
+
+The inputs of a directory are filtered by a :py:class:`CoverageManager`
+twice with the same cache, as when the broker restarts on a workspace.
+The time taken, the cache counters and the coverage reached are printed
+for each run.
+"""
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from hashlib import md5
+from pathlib import Path
+
+from libpastis import ReplayCache
+from libpastis.types import SeedType, SeedInjectLoc
+from pastisbroker.coverage import CoverageManager, ClientInput
+from pastisbroker.replay import ReplayBackend
+
+
+def filter_inputs(cache: ReplayCache, backend: ReplayBackend, program: str, argv: list, inj: SeedInjectLoc,
+                  inputs: list, workers: int, timeout: int) -> None:
+    cm = CoverageManager(workers, timeout, True, program, argv, inj, replay_backend=backend, cache=cache)
+    cm.start()
+    t0 = time.perf_counter()
+    for data in inputs:
+        cm.push_input(ClientInput(data, "", "", "", md5(data).hexdigest(), "", SeedType.INPUT, b"", "bench", "", "", 0, []))
+    while cm.pending_inputs:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    cm.stop()
+    stats = cache.stats
+    print(f"{len(inputs)} inputs in {elapsed:.2f}s  {len(inputs) / elapsed:8.1f} inputs/s  "
+          f"(hits: {stats['hits']}, misses: {stats['misses']})  edges covered: {cm.covered_items}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay cache benchmark")
+    parser.add_argument("program", type=str, help="program to replay inputs on")
+    parser.add_argument("corpus", type=str, help="directory of inputs")
+    parser.add_argument("args", type=str, nargs="*", help="program arguments ('@@' replaced by the input file)")
+    parser.add_argument("-n", "--count", type=int, default=200, help="maximum number of inputs to replay")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="number of replay workers")
+    parser.add_argument("-t", "--timeout", type=int, default=10, help="replay timeout (seconds)")
+    parser.add_argument("-b", "--backend", type=str, choices=[x.name for x in ReplayBackend], default=ReplayBackend.PROCESS.name)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    inputs = [x.read_bytes() for x in sorted(Path(args.corpus).iterdir()) if x.is_file()][:args.count]
+    if not inputs:
+        print(f"no input in {args.corpus}")
+        sys.exit(1)
+    inj = SeedInjectLoc.ARGV if CoverageManager.ARGV_PLACEHOLDER in args.args else SeedInjectLoc.STDIN
+    program = str(Path(args.program).absolute())
+
+    cache_dir = tempfile.mkdtemp()
+    for _ in range(2):  # second run as after a restart (new manager, same cache directory)
+        filter_inputs(ReplayCache(cache_dir), ReplayBackend[args.backend], program, args.args, inj, inputs,
+                      args.workers, args.timeout)
+
+'''
+PYTHONPATH=. python3 ./tests/bench_replay_cache.py ./program ./corpus @@
+'''
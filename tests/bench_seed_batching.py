@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the broker -> client seed fan-out with and without seed batching.
+
+For each batch size, a client is spawned in a separate process and the broker
+sends it ``--count`` seeds. The script reports the number of seeds per second
+(until the client acknowledged the last one) and the CPU time consumed by the
+broker process.
+"""
+import time
+import logging
+import argparse
+import threading
+from multiprocessing import Process
+from typing import List
+
+import psutil
+
+from libpastis.agent import BrokerAgent, ClientAgent
+from libpastis.types import SeedType, FuzzingEngineInfo, LogLevel, Arch, Platform
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+
+def run_client(port: int, count: int):
+    agent = ClientAgent()
+    received = 0
+
+    def seed_received(typ: SeedType, seed: bytes):
+        nonlocal received
+        received += 1
+        if received == count:
+            agent.send_log(LogLevel.INFO, "done")
+
+    agent.register_seed_callback(seed_received)
+    agent.connect("localhost", port)
+    agent.start()
+    agent.send_hello([FuzzingEngineInfo("BENCH", "v0", "")])
+    while received < count:
+        time.sleep(0.1)
+    time.sleep(0.5)  # let the last message go
+    agent.stop()
+
+
+def bench(port: int, count: int, seed_size: int, batch: int):
+    broker = BrokerAgent(seed_batch_size=batch)
+    hello, done = threading.Event(), threading.Event()
+    client = []
+
+    def hello_received(cli_id: bytes, engines: List[FuzzingEngineInfo], arch: Arch, cpus: int, memory: int,
+                       hostname: str, platform: Platform, running_engine: FuzzingEngineInfo):
+        client.append(cli_id)
+        hello.set()
+
+    broker.register_hello_callback(hello_received)
+    broker.register_log_callback(lambda cli_id, level, message: done.set())
+    broker.bind(port, "127.0.0.1")
+    broker.start()
+
+    proc = Process(target=run_client, args=(port, count))
+    proc.start()
+    hello.wait()
+
+    seed = bytes(seed_size)
+    me = psutil.Process()
+    cpu0, t0 = me.cpu_times(), time.time()
+    for i in range(count):
+        broker.send_seed(client[0], SeedType.INPUT, i.to_bytes(8, "little") + seed)
+    broker.flush_seeds()
+    done.wait()
+    elapsed = time.time() - t0
+    cpu1 = me.cpu_times()
+    cpu = (cpu1.user - cpu0.user) + (cpu1.system - cpu0.system)
+
+    proc.join()
+    broker.stop()
+    broker.socket.close(linger=0)
+    print(f"batch:{batch:>4} seeds:{count} seed_size:{seed_size}  {count / elapsed:>10.0f} msgs/s  "
+          f"broker CPU: {cpu:.2f}s ({cpu / count * 1e6:.1f}us/seed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed batching benchmark")
+    parser.add_argument("-n", "--count", type=int, default=100000, help="number of seeds to send")
+    parser.add_argument("-s", "--size", type=int, default=64, help="size of seeds")
+    parser.add_argument("-p", "--port", type=int, default=5565, help="port to bind on")
+    parser.add_argument("-b", "--batch", type=int, nargs="+", default=[1, 64], help="batch sizes to compare")
+    args = parser.parse_args()
+
+    for i, b in enumerate(args.batch):
+        bench(args.port + i, args.count, args.size, b)
+
+'''
+PYTHONPATH=. python3 ./tests/bench_seed_batching.py -n 100000 -b 1 64
+'''
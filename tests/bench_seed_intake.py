@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the CPU time spent by the broker per seed received.
+
+Seeds are handed to :py:meth:`PastisBroker.seed_received` as if sent by
+fuzzing clients (registered without network connection, seeds sent to them
+are dropped by the socket). Part of the seeds are sent again by another
+client (duplicates). The CPU time of the whole process (i.e: including the
+corpus writer and sending threads) is measured until all seeds are written.
+"""
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+from libpastis.types import SeedType, Arch, Platform
+from pastisbroker import PastisBroker, BrokingMode
+from pastisbroker.client import PastisClient
+
+
+class FakeEngine:
+    NAME = "AFLPP"
+    SHORT_NAME = "AFL"
+
+
+def bench(port: int, count: int, size: int, clients: int, dup: float):
+    tmp = Path(tempfile.mkdtemp())
+    (tmp / "bins").mkdir()
+    broker = PastisBroker(tmp / "ws", tmp / "bins", BrokingMode.FULL, checkpoint_interval=0)
+    broker.bind(port, "127.0.0.1")
+    broker._start_time = time.time()
+    for i in range(clients):
+        cli = PastisClient(i, f"cli{i}".encode(), [], Arch.X86_64, 1, 1, "bench", Platform.LINUX)
+        cli._engine = FakeEngine()
+        broker.clients[cli.netid] = cli
+
+    seeds = [os.urandom(size) for _ in range(count)]
+    dups = random.sample(seeds, int(count * dup))
+    netids = list(broker.clients)
+
+    t0, c0 = time.perf_counter(), time.process_time()
+    for i, seed in enumerate(seeds):
+        broker.seed_received(netids[i % clients], SeedType.INPUT, seed)
+    for i, seed in enumerate(dups):
+        broker.seed_received(netids[(i + 1) % clients], SeedType.INPUT, seed)
+    broker._corpus_writer.flush()
+    while broker.send_queue_depth:
+        time.sleep(0.001)
+    cpu, wall = time.process_time() - c0, time.perf_counter() - t0
+
+    total = count + len(dups)
+    print(f"size:{size:>8}  seeds: {total} ({len(dups)} duplicates)  clients: {clients}  "
+          f"cpu/seed: {cpu / total * 1e6:8.1f}us  wall/seed: {wall / total * 1e6:8.1f}us")
+    broker.stop_broker()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker per-seed CPU benchmark")
+    parser.add_argument("-n", "--count", type=int, default=5000, help="number of distinct seeds")
+    parser.add_argument("-s", "--size", type=int, nargs="+", default=[64, 4096, 65536], help="seed sizes")
+    parser.add_argument("-c", "--clients", type=int, default=4, help="number of clients")
+    parser.add_argument("-d", "--dup", type=float, default=0.3, help="ratio of seeds sent again by another client")
+    parser.add_argument("-p", "--port", type=int, default=5595, help="port to bind on")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # seeds sent to the fake clients are dropped (warnings)
+
+    port = args.port
+    for size in args.size:
+        bench(port, args.count, size, args.clients, args.dup)
+        port += 1
+
+'''
+PYTHONPATH=. python3 ./tests/bench_seed_intake.py
+'''